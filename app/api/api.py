@@ -1,6 +1,6 @@
 from fastapi import APIRouter
 
-from app.api.endpoints import products, cart, orders, recommendations, auth
+from app.api.endpoints import products, cart, orders, recommendations, auth, metrics, analytics
 
 # Tạo một APIRouter chính
 api_router = APIRouter(prefix="/api")
@@ -10,4 +10,6 @@ api_router.include_router(auth.router, prefix="/auth")
 api_router.include_router(products.router)
 api_router.include_router(cart.router)
 api_router.include_router(orders.router)
-api_router.include_router(recommendations.router)
\ No newline at end of file
+api_router.include_router(recommendations.router)
+api_router.include_router(metrics.router)
+api_router.include_router(analytics.router)
\ No newline at end of file
@@ -1,6 +1,8 @@
-from typing import Optional
+from typing import Optional, Tuple
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+import hashlib
+import uuid
 import jwt
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
@@ -8,9 +10,13 @@ from datetime import datetime, timedelta
 from app.api.dependencies.db import get_db
 from app.repositories.user_repository import UserRepository
 from app.core.config import settings
+from app.models.user import User
+from app.services.principal_cache import Principal, principal_cache
 
 # Định nghĩa oauth2_scheme để sử dụng trong các route cần xác thực
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/login")
+# Cho các endpoint công khai: không có header Authorization thì token là None thay vì 401
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/login", auto_error=False)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """
@@ -36,17 +42,115 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     else:
         expire = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     
+    # jti định danh token, dùng làm khóa của cache principal
     to_encode.update({"exp": expire})
+    to_encode.setdefault("jti", uuid.uuid4().hex)
     
     # Tạo JWT token
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     
     return encoded_jwt
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Không thể xác thực thông tin người dùng",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+def _decode_token(token: str) -> Tuple[int, str]:
+    """Giải mã và kiểm tra token, trả về (user_id, khóa cache của token)"""
+    try:
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        user_id = payload.get("sub")
+        if user_id is None:
+            raise _credentials_exception()
+        # Token cũ chưa có jti thì dùng hash của chính token làm khóa
+        token_id = payload.get("jti") or hashlib.sha256(token.encode()).hexdigest()
+        return int(user_id), token_id
+    except (jwt.PyJWTError, ValueError):
+        raise _credentials_exception()
+
+def _load_active_user(db: Session, user_id: int) -> User:
+    user = UserRepository(db).get_by_id(user_id)
+    if user is None or user.is_active is False:
+        raise _credentials_exception()
+    return user
+
+def get_current_principal(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> Principal:
+    """
+    Lấy người dùng đã xác thực (user_id, is_admin) từ token.
+    Dùng cho các endpoint chỉ cần user_id/quyền admin: khi principal của token đã được cache
+    thì không có truy vấn nào (session chỉ được mở kết nối khi thực sự truy vấn).
+    
+    Parameters:
+    -----------
+    token : str
+        JWT token được trích xuất từ header Authorization
+    db : Session
+        Database session (chỉ dùng khi principal chưa có trong cache)
+    
+    Returns:
+    --------
+    Principal
+        Người dùng đã xác thực
+    
+    Raises:
+    -------
+    HTTPException
+        Nếu token không hợp lệ, người dùng không tồn tại hoặc đã bị vô hiệu hóa
+    """
+    user_id, token_id = _decode_token(token)
+    
+    principal = principal_cache.get(token_id, user_id)
+    if principal is None:
+        # Đọc thế hệ trước khi tải: nếu người dùng bị vô hiệu hóa trong lúc tải thì không cache
+        generation = principal_cache.generation()
+        principal = principal_cache.put(token_id, _load_active_user(db, user_id), generation)
+    
+    # Gắn người dùng vào session để định tuyến read-your-writes sau khi ghi
+    db.info["user_id"] = principal.user_id
+    
+    return principal
+
+def get_optional_principal(
+    token: Optional[str] = Depends(optional_oauth2_scheme),
+    db: Session = Depends(get_db)
+) -> Optional[Principal]:
+    """
+    Lấy người dùng đã xác thực nếu request có token hợp lệ, ngược lại trả về None.
+    Dùng cho các endpoint công khai cần biết người xem (ví dụ ghi lượt xem sản phẩm).
+    """
+    if not token:
+        return None
+    try:
+        return get_current_principal(token, db)
+    except HTTPException:
+        # Token hết hạn hoặc không hợp lệ: vẫn phục vụ như khách
+        return None
+
+def get_current_admin(current_user: Principal = Depends(get_current_principal)) -> Principal:
+    """
+    Lấy người dùng đã xác thực và yêu cầu quyền admin.
+    Dùng cho các endpoint/router chỉ dành cho quản trị (báo cáo doanh số, số liệu vận hành).
+    
+    Raises:
+    -------
+    HTTPException
+        401 nếu chưa xác thực, 403 nếu người dùng không phải admin
+    """
+    if not current_user.is_admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Bạn không có quyền thực hiện hành động này"
+        )
+    return current_user
+
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> User:
     """
     Lấy thông tin người dùng hiện tại từ token.
-    Sử dụng làm dependency trong các API endpoint cần xác thực.
+    Sử dụng làm dependency trong các API endpoint cần đối tượng User đầy đủ;
+    endpoint chỉ cần user_id nên dùng `get_current_principal`.
     
     Parameters:
     -----------
@@ -65,28 +169,14 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
     HTTPException
         Nếu token không hợp lệ hoặc người dùng không tồn tại
     """
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Không thể xác thực thông tin người dùng",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-    
-    try:
-        # Giải mã token
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        user_id: str = payload.get("sub")
-        
-        if user_id is None:
-            raise credentials_exception
-        
-    except jwt.PyJWTError:
-        raise credentials_exception
+    user_id, token_id = _decode_token(token)
     
     # Lấy thông tin người dùng từ database
-    user_repo = UserRepository(db)
-    user = user_repo.get_by_id(int(user_id))
+    generation = principal_cache.generation()
+    user = _load_active_user(db, user_id)
+    principal_cache.put(token_id, user, generation)
     
-    if user is None:
-        raise credentials_exception
+    # Gắn người dùng vào session để định tuyến read-your-writes sau khi ghi
+    db.info["user_id"] = user.user_id
     
-    return user
\ No newline at end of file
+    return user
@@ -1,14 +1,34 @@
-from typing import Generator
+from typing import AsyncGenerator, Generator
 
-from app.db.base import SessionLocal
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.base import SessionLocal, AsyncSessionLocal
+from app.db.pool_metrics import session_metrics
 
 def get_db() -> Generator:
     """
     Dependency để cung cấp database session cho route handlers.
     Sử dụng như một FastAPI dependency.
     """
+    started_at = session_metrics.session_opened()
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+        session_metrics.session_closed(started_at)
+
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    """
+    Dependency để cung cấp AsyncSession cho các route handler `async def`.
+    
+    Các service hiện có được gọi qua `await db.run_sync(...)`: code repository/service
+    giữ nguyên, nhưng mọi truy vấn (kể cả lazy load) đi qua driver async và nhường
+    event loop trong lúc chờ DB.
+    """
+    started_at = session_metrics.session_opened()
+    try:
+        async with AsyncSessionLocal() as db:
+            yield db
+    finally:
+        session_metrics.session_closed(started_at)
@@ -0,0 +1,60 @@
+from datetime import date
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+
+from app.api.dependencies.auth import get_current_admin
+from app.api.dependencies.db import get_async_db
+from app.api.schemas.analytics import BestSellersResponse, SalesTrendResponse
+from app.services.principal_cache import Principal
+from app.services.analytics_service import AnalyticsService
+
+# Báo cáo doanh số chỉ dành cho admin và không dùng response cache: cache hit được trả
+# trước khi dependency chạy, nên sẽ bỏ qua kiểm tra quyền
+router = APIRouter(prefix="/analytics", tags=["analytics"])
+
+@router.get("/best-sellers", response_model=BestSellersResponse)
+async def get_best_sellers(
+    start_date: Optional[date] = Query(None),
+    end_date: Optional[date] = Query(None),
+    category_id: Optional[int] = Query(None, gt=0),
+    limit: int = Query(10, gt=0, le=100),
+    order_by: str = Query("units", pattern="^(units|revenue)$"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_admin)
+):
+    """
+    Lấy danh sách sản phẩm bán chạy nhất trong một khoảng ngày (từ bảng doanh số theo ngày).
+    Chỉ admin mới có quyền truy cập.
+    """
+    return await db.run_sync(
+        lambda session: AnalyticsService(session).get_best_sellers(
+            start_date=start_date,
+            end_date=end_date,
+            category_id=category_id,
+            limit=limit,
+            order_by=order_by
+        )
+    )
+
+@router.get("/sales-trend", response_model=SalesTrendResponse)
+async def get_sales_trend(
+    start_date: Optional[date] = Query(None),
+    end_date: Optional[date] = Query(None),
+    product_id: Optional[int] = Query(None, gt=0),
+    category_id: Optional[int] = Query(None, gt=0),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_admin)
+):
+    """
+    Lấy doanh số theo ngày của một sản phẩm, một danh mục hoặc toàn cửa hàng
+    (mặc định 30 ngày gần nhất). Chỉ admin mới có quyền truy cập.
+    """
+    return await db.run_sync(
+        lambda session: AnalyticsService(session).get_sales_trend(
+            start_date=start_date,
+            end_date=end_date,
+            product_id=product_id,
+            category_id=category_id
+        )
+    )
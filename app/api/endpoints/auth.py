@@ -1,32 +1,61 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 from datetime import timedelta
 
 from app.api.dependencies.db import get_db
-from app.api.dependencies.auth import create_access_token, get_current_user
+from app.api.dependencies.auth import create_access_token, get_current_user, get_current_principal
 from app.api.schemas.user import (
     Token, UserCreate, UserResponse, UserUpdate, 
     AddressCreate, AddressResponse, AddressUpdate
 )
 from app.services.user_service import UserService
 from app.core.config import settings
+from app.core.rate_limit import RateLimitExceeded, client_ip, login_rate_limiter
+from app.core.security import PasswordHasherBusy
 from app.models.user import User
+from app.services.principal_cache import Principal
 
 router = APIRouter(tags=["auth"])
 
+
+def _hasher_busy() -> HTTPException:
+    # Hàng đợi băm mật khẩu đầy: trả 503 để client thử lại thay vì xếp hàng vô hạn
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Hệ thống đang bận, vui lòng thử lại sau",
+        headers={"Retry-After": "1"},
+    )
+
+
 @router.post("/login", response_model=Token)
 async def login_for_access_token(
+    request: Request,
     form_data: OAuth2PasswordRequestForm = Depends(),
     db: Session = Depends(get_db)
 ):
     """
     Đăng nhập và lấy token JWT.
     """
+    # Chặn sớm theo IP / số lần sai của email, trước khi tra cứu người dùng hay băm mật khẩu
+    try:
+        await login_rate_limiter.check(client_ip(request), form_data.username)
+    except RateLimitExceeded as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Đăng nhập sai quá nhiều lần, vui lòng thử lại sau",
+            headers={"Retry-After": str(e.retry_after)},
+        )
+
     user_service = UserService(db)
-    user = user_service.authenticate_user(form_data.username, form_data.password)
+    try:
+        user = await user_service.authenticate_user_async(form_data.username, form_data.password)
+    except PasswordHasherBusy:
+        raise _hasher_busy()
     
     if not user:
+        # Chỉ lần đăng nhập sai mới tính vào giới hạn theo email
+        await login_rate_limiter.record_failure(form_data.username)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Email hoặc mật khẩu không chính xác",
@@ -57,7 +86,10 @@ async def register(user_data: UserCreate, db: Session = Depends(get_db)):
         )
     
     # Tạo user mới
-    return user_service.create_user(user_data)
+    try:
+        return await user_service.create_user_async(user_data)
+    except PasswordHasherBusy:
+        raise _hasher_busy()
 
 @router.get("/me", response_model=UserResponse)
 async def get_user_info(current_user: User = Depends(get_current_user)):
@@ -70,18 +102,21 @@ async def get_user_info(current_user: User = Depends(get_current_user)):
 async def update_user_info(
     user_data: UserUpdate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_principal)
 ):
     """
     Cập nhật thông tin người dùng.
     """
     user_service = UserService(db)
-    return user_service.update_user(current_user.user_id, user_data)
+    try:
+        return await user_service.update_user_async(current_user.user_id, user_data)
+    except PasswordHasherBusy:
+        raise _hasher_busy()
 
 @router.get("/me/addresses", response_model=list[AddressResponse])
 async def get_user_addresses(
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_principal)
 ):
     """
     Lấy danh sách địa chỉ của người dùng.
@@ -93,7 +128,7 @@ async def get_user_addresses(
 async def add_user_address(
     address_data: AddressCreate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_principal)
 ):
     """
     Thêm địa chỉ mới cho người dùng.
@@ -106,7 +141,7 @@ async def update_user_address(
     address_id: int,
     address_data: AddressUpdate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_principal)
 ):
     """
     Cập nhật địa chỉ của người dùng.
@@ -118,7 +153,7 @@ async def update_user_address(
 async def delete_user_address(
     address_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_principal)
 ):
     """
     Xóa địa chỉ của người dùng.
@@ -1,33 +1,52 @@
 from fastapi import APIRouter, Depends, HTTPException, Path, status
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.api.dependencies.db import get_db
-from app.api.dependencies.auth import get_current_user
+from app.api.dependencies.db import get_db, get_async_db
+from app.api.dependencies.auth import get_current_principal
+from app.core.serialization import lean_response
 from app.api.schemas.cart import (
-    CartResponse, AddToCartRequest, UpdateCartItemRequest, CartActionResponse
+    CartResponse, CartSummaryResponse, AddToCartRequest, UpdateCartItemRequest, CartActionResponse,
+    BulkCartRequest, BulkCartResponse
 )
 from app.services.cart_service import CartService
-from app.models.user import User
+from app.services.cart_summary import cart_summary_cache
+from app.services.principal_cache import Principal
 
 router = APIRouter(prefix="/cart", tags=["cart"])
 
 @router.get("/", response_model=CartResponse)
 async def get_cart(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_principal)
 ):
     """
     Lấy thông tin giỏ hàng hiện tại của người dùng.
     """
-    cart_service = CartService(db)
-    cart = cart_service.get_cart(current_user.user_id)
-    return cart
+    user_id = current_user.user_id
+    cart = await db.run_sync(lambda session: CartService(session).get_cart(user_id))
+    return lean_response(CartResponse, cart)
+
+@router.get("/summary", response_model=CartSummaryResponse)
+async def get_cart_summary(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_principal)
+):
+    """
+    Lấy số mặt hàng và tổng tiền của giỏ hàng (badge giỏ hàng).
+    Tóm tắt đã cache được trả về mà không cần truy vấn cơ sở dữ liệu.
+    """
+    user_id = current_user.user_id
+    summary = cart_summary_cache.get(user_id)
+    if summary is None:
+        summary = await db.run_sync(lambda session: CartService(session).get_cart_summary(user_id))
+    return summary
 
 @router.post("/add", response_model=CartActionResponse)
 async def add_to_cart(
     item: AddToCartRequest,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_principal)
 ):
     """
     Thêm sản phẩm vào giỏ hàng.
@@ -40,12 +59,45 @@ async def add_to_cart(
     )
     return result
 
+@router.post("/bulk", response_model=BulkCartResponse)
+async def bulk_update_cart(
+    request: BulkCartRequest,
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_principal)
+):
+    """
+    Thêm/đặt số lượng/xóa nhiều sản phẩm trong giỏ hàng trong một transaction
+    (ví dụ gộp giỏ hàng của khách sau khi đăng nhập).
+    """
+    cart_service = CartService(db)
+    result = cart_service.bulk_update_cart(
+        user_id=current_user.user_id,
+        items=[item.model_dump() for item in request.items]
+    )
+    return result
+
+@router.post("/reorder/{order_id}", response_model=BulkCartResponse)
+async def reorder(
+    order_id: int = Path(..., gt=0),
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_principal)
+):
+    """
+    Thêm lại các sản phẩm của một đơn hàng cũ vào giỏ hàng.
+    """
+    cart_service = CartService(db)
+    result = cart_service.reorder(
+        user_id=current_user.user_id,
+        order_id=order_id
+    )
+    return result
+
 @router.put("/items/{product_id}", response_model=CartActionResponse)
 async def update_cart_item(
     product_id: int = Path(..., gt=0),
     item: UpdateCartItemRequest = None,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_principal)
 ):
     """
     Cập nhật số lượng sản phẩm trong giỏ hàng.
@@ -66,7 +118,7 @@ async def update_cart_item(
 async def remove_from_cart(
     product_id: int = Path(..., gt=0),
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_principal)
 ):
     """
     Xóa sản phẩm khỏi giỏ hàng.
@@ -81,7 +133,7 @@ async def remove_from_cart(
 @router.delete("/", response_model=CartActionResponse)
 async def clear_cart(
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_principal)
 ):
     """
     Xóa toàn bộ giỏ hàng.
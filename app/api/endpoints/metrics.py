@@ -0,0 +1,47 @@
+from fastapi import APIRouter, Depends
+
+from app.api.dependencies.auth import get_current_admin
+from app.core.rate_limit import login_rate_limiter
+from app.core.security import password_hasher
+from app.db.pool_metrics import get_pool_stats
+from app.services.event_writer import event_writer
+
+# Số liệu vận hành chỉ dành cho admin
+router = APIRouter(prefix="/metrics", tags=["metrics"], dependencies=[Depends(get_current_admin)])
+
+@router.get("/db-pool")
+async def get_db_pool_metrics():
+    """
+    Số liệu của các connection pool (primary, async, batch) và vòng đời session:
+    thời gian chờ checkout, số kết nối đang dùng, overflow và timeout.
+    Dùng để tinh chỉnh DB_POOL_SIZE / DB_MAX_OVERFLOW khi chạy tải thật.
+    """
+    return get_pool_stats()
+
+
+@router.get("/event-writer")
+async def get_event_writer_metrics():
+    """
+    Số liệu của hàng đợi ghi lượt xem / lịch sử tìm kiếm: số sự kiện đã ghi, bị bỏ qua
+    do hàng đợi đầy, ghi lỗi và đang chờ flush.
+    """
+    return event_writer.stats()
+
+
+@router.get("/password-hasher")
+async def get_password_hasher_metrics():
+    """
+    Số liệu của thread pool băm mật khẩu (bcrypt): số yêu cầu đang chờ, bị từ chối do
+    hàng đợi đầy, số hash được băm lại theo cost factor mới, thời gian chờ và thời gian băm.
+    Dùng để tinh chỉnh PASSWORD_HASH_WORKERS / PASSWORD_HASH_MAX_PENDING.
+    """
+    return password_hasher.stats()
+
+
+@router.get("/login-rate-limit")
+async def get_login_rate_limit_metrics():
+    """
+    Số liệu của bộ giới hạn đăng nhập: số lần được cho qua, bị chặn theo IP / email,
+    số lỗi backend và số khóa đang theo dõi (chỉ với backend trong tiến trình).
+    """
+    return login_rate_limiter.stats()
@@ -2,13 +2,13 @@ from fastapi import APIRouter, Depends, HTTPException, Path, Query, status
 from sqlalchemy.orm import Session
 
 from app.api.dependencies.db import get_db
-from app.api.dependencies.auth import get_current_user
+from app.api.dependencies.auth import get_current_principal
 from app.api.schemas.order import (
     OrderListResponse, OrderDetailResponse, CreateOrderRequest, 
     CreateOrderResponse, CancelOrderResponse
 )
 from app.services.order_service import OrderService
-from app.models.user import User
+from app.services.principal_cache import Principal
 
 router = APIRouter(prefix="/orders", tags=["orders"])
 
@@ -17,7 +17,7 @@ async def get_user_orders(
     page: int = Query(1, gt=0),
     page_size: int = Query(10, gt=0, le=50),
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_principal)
 ):
     """
     Lấy danh sách đơn hàng của người dùng hiện tại.
@@ -34,7 +34,7 @@ async def get_user_orders(
 async def get_order_details(
     order_id: int = Path(..., gt=0),
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_principal)
 ):
     """
     Lấy chi tiết một đơn hàng cụ thể.
@@ -57,7 +57,7 @@ async def get_order_details(
 async def place_order(
     order_data: CreateOrderRequest,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_principal)
 ):
     """
     Đặt đơn hàng mới từ giỏ hàng hiện tại.
@@ -81,7 +81,7 @@ async def place_order(
 async def cancel_order(
     order_id: int = Path(..., gt=0),
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_principal)
 ):
     """
     Hủy đơn hàng nếu đơn hàng vẫn ở trạng thái PENDING.
@@ -1,8 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException, Query, Path, status
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional, List
 
-from app.api.dependencies.db import get_db
+from app.api.dependencies.db import get_db, get_async_db
+from app.api.dependencies.auth import get_optional_principal
+from app.core.response_cache import cache_response, CachedAPIRoute
+from app.core.serialization import lean_response
 # from app.api.dependencies.auth import get_current_user # Bỏ comment nếu cần xác thực
 # from app.models.user import User # Bỏ comment nếu cần User model
 from app.api.schemas.product import (
@@ -12,14 +16,17 @@ from app.api.schemas.product import (
     ProductCreate, 
     ProductUpdate,
     CategorySimpleResponse, 
+    CategoryTree,
     ProductAdminSearchResult
 )
 from app.services.product_service import ProductService
+from app.services.principal_cache import Principal
 # from app.services.category_service import CategoryService # Bỏ comment nếu cần CategoryService
 
 router = APIRouter(
     prefix="/products",
-    tags=["Products"]
+    tags=["Products"],
+    route_class=CachedAPIRoute
 )
 
 @router.post("/", response_model=ProductResponse, status_code=status.HTTP_201_CREATED)
@@ -110,38 +117,45 @@ def delete_existing_product(
     return {"message": "Product deleted successfully (soft delete)", "product_id": product_id}
 
 @router.get("/", response_model=ProductSearchResult)
+@cache_response(namespaces=("products",), ttl_seconds=60)
 async def search_products(
     search_query: Optional[str] = Query(None, description="Từ khóa tìm kiếm"),
     category_id: Optional[int] = Query(None, description="ID danh mục"),
     min_price: Optional[float] = Query(None, description="Giá tối thiểu"),
     max_price: Optional[float] = Query(None, description="Giá tối đa"),
-    order_by: str = Query("created_at", description="Sắp xếp theo: name, price, created_at"),
+    order_by: str = Query("created_at", description="Sắp xếp theo: name, price, created_at, rating"),
     descending: bool = Query(True, description="Sắp xếp giảm dần"),
     page: int = Query(1, gt=0, description="Số trang"),
     page_size: int = Query(20, gt=0, le=100, description="Số sản phẩm mỗi trang"),
-    db: Session = Depends(get_db),
+    include_facets: bool = Query(True, description="Trả về số lượng theo danh mục và histogram giá"),
+    db: AsyncSession = Depends(get_async_db),
     # current_user: Optional[User] = Depends(get_current_user) # Bỏ qua xác thực
 ):
     """
     Tìm kiếm sản phẩm với nhiều bộ lọc khác nhau.
+    Kết quả kèm theo facets: số lượng sản phẩm theo danh mục và histogram giá.
     """
-    product_service = ProductService(db)
     # user_id = current_user.user_id if current_user else None # Bỏ qua user_id
     user_id = None
     
-    result = product_service.search_products(
-        search_query=search_query,
-        category_id=category_id,
-        min_price=min_price,
-        max_price=max_price,
-        order_by=order_by,
-        descending=descending,
-        page=page,
-        page_size=page_size,
-        user_id=user_id
-    )
+    def _search(session: Session):
+        product_service = ProductService(session)
+        return product_service.search_products(
+            search_query=search_query,
+            category_id=category_id,
+            min_price=min_price,
+            max_price=max_price,
+            order_by=order_by,
+            descending=descending,
+            page=page,
+            page_size=page_size,
+            user_id=user_id,
+            include_facets=include_facets
+        )
     
-    return result
+    result = await db.run_sync(_search)
+    
+    return lean_response(ProductSearchResult, result)
 
 @router.get("/mananger", response_model=ProductAdminSearchResult)
 async def search_products_mananger(
@@ -179,19 +193,22 @@ async def search_products_mananger(
 
 
 @router.get("/{product_id}", response_model=ProductResponse) 
+# Request đã đăng nhập không dùng cache để lượt xem luôn được ghi nhận
+@cache_response(namespaces=("product:{product_id}",), skip_when_authenticated=True)
 async def get_product_details_by_id( # Đổi tên hàm để tránh trùng lặp
     product_id: int = Path(..., gt=0, description="ID của sản phẩm"),
-    db: Session = Depends(get_db),
-    # current_user: Optional[User] = Depends(get_current_user) # Bỏ qua xác thực
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Optional[Principal] = Depends(get_optional_principal)
 ):
     """
     Lấy thông tin chi tiết của một sản phẩm.
+    Nếu người dùng đã đăng nhập, lượt xem được ghi lại cho lịch sử và gợi ý theo phiên.
     """
-    product_service = ProductService(db)
-    # user_id = current_user.user_id if current_user else None # Bỏ qua user_id
-    user_id = None
+    user_id = current_user.user_id if current_user else None
     
-    product = product_service.get_product_by_id(product_id, user_id)
+    product = await db.run_sync(
+        lambda session: ProductService(session).get_product_by_id(product_id, user_id)
+    )
     
     if not product:
         raise HTTPException(
@@ -203,24 +220,24 @@ async def get_product_details_by_id( # Đổi tên hàm để tránh trùng lặ
 
 # Giữ lại hàm get_categories trả về danh sách phẳng
 @router.get("/categories/", response_model=List[CategorySimpleResponse], summary="Get Flat List of Categories")
-async def get_flat_categories_list(db: Session = Depends(get_db)):
+@cache_response(namespaces=("categories",))
+async def get_flat_categories_list(db: AsyncSession = Depends(get_async_db)):
     """
     Lấy danh sách tất cả danh mục sản phẩm (dạng phẳng).
     """
-    product_service = ProductService(db)
-    categories = product_service.get_categories() # Hàm này trả về list dict
+    categories = await db.run_sync(
+        lambda session: ProductService(session).get_categories() # Hàm này trả về list dict
+    )
     return categories
 
 
-@router.get("/categories/tree", summary="Get Category Tree (Not Implemented Yet)") 
-async def get_categories_tree(db: Session = Depends(get_db)):
-    """
-    Lấy danh sách danh mục theo cấu trúc cây.
-    (Chức năng này chưa được triển khai đầy đủ, hiện tại có thể trả về lỗi hoặc danh sách phẳng.)
-    """
-    # product_service = ProductService(db)
-    # # Hiện tại ProductService.get_categories() trả về list phẳng.
-    # # Cần một service khác hoặc logic khác để build cây.
-    # # Ví dụ: return category_service.get_category_tree() 
-    # return product_service.get_categories() # Tạm thời trả về danh sách phẳng hoặc lỗi
-    raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED, detail="Get category tree is not implemented yet.")
\ No newline at end of file
+@router.get("/categories/tree", response_model=List[CategoryTree], summary="Get Category Tree")
+@cache_response(namespaces=("categories",))
+async def get_categories_tree(db: AsyncSession = Depends(get_async_db)):
+    """
+    Lấy danh sách danh mục theo cấu trúc cây (các danh mục gốc kèm danh mục con lồng nhau).
+    """
+    tree = await db.run_sync(
+        lambda session: ProductService(session).get_category_tree()
+    )
+    return tree
\ No newline at end of file
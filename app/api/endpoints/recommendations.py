@@ -1,32 +1,44 @@
+import json
 from fastapi import APIRouter, Depends, HTTPException, Path, Query, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional, List
 
-from app.api.dependencies.db import get_db
-from app.api.dependencies.auth import get_current_user
+from app.api.dependencies.db import get_db, get_async_db
+from app.db.base import SessionLocal
+from app.db.routing import use_replica
+from app.core.response_cache import cache_response, CachedAPIRoute
+from app.core.serialization import lean_response
+from app.api.dependencies.auth import get_current_admin, get_current_principal
 from app.api.schemas.recommendation import (
-    SimilarProductsResult, PersonalizedRecommendationsResult, TrainingJobResult,
+    SimilarProductsResult, PersonalizedRecommendationsResult, TrendingProductsResult, TrainingJobResult,
+    BatchRecommendationRequest,
     TrainingHistoryResponse, TrainingJobDetailResponse
 )
 from app.services.recommendation_service import RecommendationService
-from app.models.user import User
+from app.services.principal_cache import Principal
 
-router = APIRouter(prefix="/recommendations", tags=["recommendations"])
+router = APIRouter(prefix="/recommendations", tags=["recommendations"], route_class=CachedAPIRoute)
 
 @router.get("/similar/{product_id}", response_model=SimilarProductsResult)
+@cache_response(namespaces=("recommendations",))
 async def get_similar_products(
     product_id: int = Path(..., gt=0),
     limit: int = Query(10, gt=0, le=50),
-    db: Session = Depends(get_db)
+    mmr_lambda: Optional[float] = Query(None, ge=0, le=1),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Lấy danh sách sản phẩm tương tự với một sản phẩm cụ thể.
     Endpoint này hiển thị trên trang chi tiết sản phẩm.
     """
-    recommendation_service = RecommendationService(db)
-    result = recommendation_service.get_similar_products(
-        product_id=product_id,
-        limit=limit
+    result = await db.run_sync(
+        lambda session: RecommendationService(session).get_similar_products(
+            product_id=product_id,
+            limit=limit,
+            mmr_lambda=mmr_lambda
+        )
     )
     
     if not result["success"]:
@@ -35,30 +47,80 @@ async def get_similar_products(
             detail=result["message"]
         )
     
-    return result
+    return lean_response(SimilarProductsResult, result)
 
 @router.get("/personalized", response_model=PersonalizedRecommendationsResult)
 async def get_personalized_recommendations(
     limit: int = Query(20, gt=0, le=100),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_principal)
 ):
     """
     Lấy danh sách sản phẩm được gợi ý cá nhân hóa cho người dùng hiện tại.
     Endpoint này hiển thị trên trang chính hoặc trang gợi ý riêng.
     """
-    recommendation_service = RecommendationService(db)
-    result = recommendation_service.get_personalized_recommendations(
-        user_id=current_user.user_id,
-        limit=limit
+    result = await db.run_sync(
+        lambda session: RecommendationService(session).get_personalized_recommendations(
+            principal=current_user,
+            limit=limit,
+            min_price=min_price,
+            max_price=max_price
+        )
     )
     
-    return result
+    return lean_response(PersonalizedRecommendationsResult, result)
+
+@router.get("/trending", response_model=TrendingProductsResult)
+async def get_trending_products(
+    kind: str = Query("trending", pattern="^(trending|popular)$"),
+    category_id: Optional[int] = Query(None, gt=0),
+    limit: int = Query(20, gt=0, le=100),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Lấy danh sách sản phẩm trending hoặc phổ biến nhất (không cần đăng nhập).
+    Endpoint này hiển thị trên trang chủ và trang danh mục cho người dùng mới.
+    """
+    result = await db.run_sync(
+        lambda session: RecommendationService(session).get_trending_products(
+            kind=kind,
+            category_id=category_id,
+            limit=limit
+        )
+    )
+    
+    return lean_response(TrendingProductsResult, result)
+
+@router.post("/batch")
+async def get_batch_recommendations(
+    request: BatchRecommendationRequest,
+    current_user: Principal = Depends(get_current_admin)
+):
+    """
+    Lấy gợi ý cho nhiều người dùng cùng lúc, dùng cho các job chiến dịch email/push.
+    Kết quả được stream dạng NDJSON: mỗi dòng là một JSON cho một người dùng.
+    Chỉ admin mới có quyền thực hiện chức năng này.
+    """
+    user_ids, limit = request.user_ids, request.limit
+    
+    def stream_results():
+        # Session riêng sống cùng response stream, không phụ thuộc vòng đời dependency
+        db = SessionLocal()
+        try:
+            with use_replica(db):
+                for result in RecommendationService(db).iter_batch_recommendations(user_ids, limit):
+                    yield json.dumps(result, ensure_ascii=False) + "\n"
+        finally:
+            db.close()
+    
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
 
 @router.post("/train", response_model=TrainingJobResult)
 async def trigger_training_job(
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_principal)
 ):
     """
     Kích hoạt job huấn luyện mô hình gợi ý theo yêu cầu thủ công.
@@ -80,7 +142,7 @@ async def trigger_training_job(
 async def get_training_history(
     limit: int = Query(10, gt=0, le=100),
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_principal)
 ):
     """
     Lấy lịch sử các lần huấn luyện mô hình gợi ý.
@@ -112,7 +174,7 @@ async def get_training_history(
 async def get_training_job_details(
     history_id: int = Path(..., gt=0),
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_principal)
 ):
     """
     Lấy chi tiết của một bản ghi huấn luyện cụ thể.
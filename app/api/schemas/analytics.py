@@ -0,0 +1,30 @@
+from pydantic import BaseModel
+from typing import Optional, List
+from datetime import date
+
+# Schema cho một sản phẩm bán chạy
+class BestSellerItem(BaseModel):
+    product_id: int
+    name: str
+    units: int
+    revenue: float
+    orders: int
+
+# Schema cho danh sách sản phẩm bán chạy
+class BestSellersResponse(BaseModel):
+    start_date: Optional[date] = None
+    end_date: Optional[date] = None
+    items: List[BestSellerItem] = []
+
+# Schema cho doanh số một ngày
+class SalesTrendDay(BaseModel):
+    day: date
+    units: int
+    revenue: float
+    orders: Optional[int] = None  # Không có khi xem toàn cửa hàng
+
+# Schema cho doanh số theo ngày
+class SalesTrendResponse(BaseModel):
+    start_date: date
+    end_date: date
+    days: List[SalesTrendDay] = []
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Literal
 
 # Schema cho thông tin CartItem trả về
 class CartItemResponse(BaseModel):
@@ -22,6 +22,11 @@ class CartResponse(BaseModel):
     total_amount: float
     item_count: int
 
+# Schema cho tóm tắt giỏ hàng (badge trên header)
+class CartSummaryResponse(BaseModel):
+    item_count: int
+    total_amount: float
+
 # Schema cho việc thêm sản phẩm vào giỏ hàng
 class AddToCartRequest(BaseModel):
     product_id: int
@@ -35,4 +40,23 @@ class UpdateCartItemRequest(BaseModel):
 class CartActionResponse(BaseModel):
     success: bool
     message: str
-    cart: Optional[CartResponse] = None
\ No newline at end of file
+    cart: Optional[CartResponse] = None
+
+# Schema cho một thao tác trong cập nhật giỏ hàng hàng loạt
+class BulkCartItem(BaseModel):
+    product_id: int
+    quantity: int = 0
+    action: Literal["add", "set", "remove"] = "add"
+
+# Schema cho việc cập nhật nhiều sản phẩm trong giỏ hàng
+class BulkCartRequest(BaseModel):
+    items: List[BulkCartItem] = Field(min_length=1, max_length=200)
+
+# Schema cho sản phẩm không cập nhật được
+class BulkCartFailedItem(BaseModel):
+    product_id: int
+    message: str
+
+# Schema cho kết quả cập nhật hàng loạt
+class BulkCartResponse(CartActionResponse):
+    failed_items: List[BulkCartFailedItem] = []
@@ -29,6 +29,7 @@ class CategorySimpleResponse(BaseModel):
     id: int
     name: str
     description: Optional[str] = None
+    parent_id: Optional[int] = None
 
     class Config:
         orm_mode = True
@@ -70,15 +71,36 @@ class ProductListItem(BaseModel):
     category_id: int
     category_name: Optional[str] = None
     image_url: Optional[str] = None
+    average_rating: float = 0.0
+    rating_count: int = 0
 
     class Config:
         orm_mode = True
 
+# Schema cho số lượng sản phẩm theo danh mục (facet)
+class CategoryFacet(BaseModel):
+    category_id: int
+    category_name: Optional[str] = None
+    count: int
+
+# Schema cho một khoảng giá trong histogram giá (facet)
+class PriceBucket(BaseModel):
+    min_price: float
+    max_price: Optional[float] = None  # None nghĩa là không giới hạn trên
+    count: int
+
+# Schema cho các facet trả về cùng kết quả tìm kiếm
+class ProductFacets(BaseModel):
+    categories: List[CategoryFacet] = []
+    price_buckets: List[PriceBucket] = []
+    price_range: Dict[str, Optional[float]]
+
 # Schema cho kết quả tìm kiếm sản phẩm
 class ProductSearchResult(BaseModel):
     items: List[ProductListItem]
     pagination: Dict[str, Any]
     filters: Dict[str, Any]
+    facets: Optional[ProductFacets] = None
 
 # Schema cho thông tin Product đầy đủ trả về
 class ProductResponse(ProductBase):
@@ -86,6 +108,10 @@ class ProductResponse(ProductBase):
     category_name: Optional[str] = None
     images: List[ProductImageResponse] = []
     tags: List[str] = []
+    average_rating: float = 0.0
+    rating_count: int = 0
+    # Số lượt đánh giá theo số sao (1-5)
+    rating_histogram: Dict[int, int] = {}
     created_at: datetime
     updated_at: Optional[datetime] = None
 
@@ -31,10 +31,23 @@ class PersonalizedRecommendationsResult(BaseModel):
     message: Optional[str] = None
     user_id: Optional[int] = None
     recommendations: List[RecommendedProductResponse] = []
-    recommendation_type: str  # 'personalized', 'based_on_history', 'latest_products'
+    recommendation_type: str  # 'personalized', 'personalized_session', 'session', 'trending_in_category', 'popular'
     based_on_product_id: Optional[int] = None
     based_on_product_name: Optional[str] = None
 
+# Schema cho kết quả sản phẩm trending/phổ biến
+class TrendingProductsResult(BaseModel):
+    success: bool
+    message: Optional[str] = None
+    category_id: Optional[int] = None
+    recommendations: List[RecommendedProductResponse] = []
+    recommendation_type: str  # 'trending' hoặc 'popular'
+
+# Schema cho yêu cầu lấy gợi ý hàng loạt (chiến dịch email/push)
+class BatchRecommendationRequest(BaseModel):
+    user_ids: List[int] = Field(..., min_length=1, max_length=100000)
+    limit: int = Field(20, gt=0, le=100)
+
 # Schema cho kết quả kích hoạt job huấn luyện
 class TrainingJobResult(BaseModel):
     success: bool
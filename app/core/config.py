@@ -21,11 +21,41 @@ class Settings(BaseSettings):
     DB_PASS: str = os.getenv("DB_PASS", "")
     DB_NAME: str = os.getenv("DB_NAME", "ecom_ai")
     DATABASE_URI: Optional[str] = None
+    # URI cho driver bất đồng bộ (aiomysql/aiosqlite), mặc định suy ra từ DATABASE_URI
+    ASYNC_DATABASE_URI: Optional[str] = None
+    # Read replica (tùy chọn) cho các truy vấn chỉ đọc; không cấu hình thì mọi truy vấn đi vào primary
+    DATABASE_REPLICA_URI: Optional[str] = os.getenv("DATABASE_REPLICA_URI") or None
+    ASYNC_DATABASE_REPLICA_URI: Optional[str] = None
+    # Thời gian (giây) đọc từ primary sau khi người dùng vừa ghi, để tránh độ trễ replication.
+    # Mốc ghi được chia sẻ giữa các worker qua REDIS_URL; không có Redis thì chỉ có hiệu lực
+    # trong worker đã nhận request ghi (chạy nhiều worker thì request sau có thể đọc replica đang trễ)
+    DB_REPLICA_STICKY_SECONDS: int = int(os.getenv("DB_REPLICA_STICKY_SECONDS", "5"))
+    
+    # Cấu hình connection pool cho các request API
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "10"))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+    DB_POOL_RECYCLE: int = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # Giây, nhỏ hơn wait_timeout của MySQL
+    DB_POOL_TIMEOUT: int = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+    # pre-ping thêm một round trip mỗi lần checkout; có thể tắt khi đã đặt DB_POOL_RECYCLE phù hợp
+    DB_POOL_PRE_PING: bool = os.getenv("DB_POOL_PRE_PING", "True").lower() in ("true", "1", "t")
+    
+    # Pool riêng cho các tác vụ batch (huấn luyện mô hình) để không chiếm kết nối của API
+    BATCH_DB_POOL_SIZE: int = int(os.getenv("BATCH_DB_POOL_SIZE", "2"))
+    BATCH_DB_MAX_OVERFLOW: int = int(os.getenv("BATCH_DB_MAX_OVERFLOW", "0"))
+    
+    # Ghi lượt xem / lịch sử tìm kiếm theo lô ở background thay vì trong request
+    EVENT_WRITER_BATCH_SIZE: int = int(os.getenv("EVENT_WRITER_BATCH_SIZE", "500"))
+    EVENT_WRITER_FLUSH_INTERVAL_MS: int = int(os.getenv("EVENT_WRITER_FLUSH_INTERVAL_MS", "1000"))
+    # Số sự kiện tối đa chờ ghi; khi đầy thì sự kiện mới bị bỏ qua để không chặn request
+    EVENT_WRITER_MAX_QUEUE: int = int(os.getenv("EVENT_WRITER_MAX_QUEUE", "10000"))
     
     # Cấu hình JWT
     SECRET_KEY: str = os.getenv("SECRET_KEY", "default-secret-key")
     ACCESS_TOKEN_EXPIRE_MINUTES: int = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "60"))
     ALGORITHM: str = os.getenv("JWT_ALGORITHM", "HS256")  # Adding the missing JWT algorithm
+    # Cache người dùng đã xác thực theo token (bỏ truy vấn bảng users ở mỗi request)
+    PRINCIPAL_CACHE_TTL_SECONDS: int = int(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", "60"))
+    PRINCIPAL_CACHE_MAX_ENTRIES: int = int(os.getenv("PRINCIPAL_CACHE_MAX_ENTRIES", "100000"))
     
     # Cấu hình Admin đầu tiên
     FIRST_ADMIN_EMAIL: str = os.getenv("FIRST_ADMIN_EMAIL", "admin@example.com")
@@ -34,6 +64,95 @@ class Settings(BaseSettings):
     # Training configuration
     TRAINING_HOUR: int = int(os.getenv("TRAINING_HOUR", "1"))  # Default to 1 AM
     
+    # Cấu hình snapshot danh mục sản phẩm (faceted search)
+    CATALOG_SNAPSHOT_TTL_SECONDS: int = int(os.getenv("CATALOG_SNAPSHOT_TTL_SECONDS", "300"))
+    # Các mốc giá (phân tách bằng dấu phẩy) dùng để chia histogram giá
+    CATALOG_PRICE_FACET_EDGES: str = os.getenv(
+        "CATALOG_PRICE_FACET_EDGES", "0,100000,200000,500000,1000000,2000000,5000000,10000000"
+    )
+    # Thời gian giữ cây danh mục trong bộ nhớ (bị xóa ngay khi danh mục thay đổi trong tiến trình)
+    CATEGORY_TREE_TTL_SECONDS: int = int(os.getenv("CATEGORY_TREE_TTL_SECONDS", "600"))
+    
+    # Tổng hợp doanh số theo ngày (bán chạy, xu hướng, tín hiệu mua cho trending)
+    SALES_ROLLUP_INTERVAL_MINUTES: int = int(os.getenv("SALES_ROLLUP_INTERVAL_MINUTES", "5"))
+    # Chỉ tổng hợp đơn đặt trước thời điểm hiện tại ít nhất chừng này giây (chờ transaction commit)
+    SALES_ROLLUP_LAG_SECONDS: int = int(os.getenv("SALES_ROLLUP_LAG_SECONDS", "60"))
+    SALES_ROLLUP_BATCH_SIZE: int = int(os.getenv("SALES_ROLLUP_BATCH_SIZE", "5000"))
+    
+    # Tóm tắt giỏ hàng (số mặt hàng, tổng tiền) giữ trong bộ nhớ cho badge giỏ hàng
+    CART_SUMMARY_TTL_SECONDS: int = int(os.getenv("CART_SUMMARY_TTL_SECONDS", "300"))
+    CART_SUMMARY_MAX_ENTRIES: int = int(os.getenv("CART_SUMMARY_MAX_ENTRIES", "100000"))
+    
+    # Cấu hình bảng xếp hạng popularity/trending (gợi ý cho người dùng mới/ẩn danh)
+    POPULARITY_TTL_SECONDS: int = int(os.getenv("POPULARITY_TTL_SECONDS", "600"))
+    POPULARITY_WINDOW_DAYS: int = int(os.getenv("POPULARITY_WINDOW_DAYS", "90"))
+    # Chu kỳ bán rã (ngày): popular dùng chu kỳ dài, trending dùng chu kỳ ngắn
+    POPULARITY_HALF_LIFE_DAYS: float = float(os.getenv("POPULARITY_HALF_LIFE_DAYS", "14"))
+    TRENDING_HALF_LIFE_DAYS: float = float(os.getenv("TRENDING_HALF_LIFE_DAYS", "2"))
+    POPULARITY_VIEW_WEIGHT: float = float(os.getenv("POPULARITY_VIEW_WEIGHT", "1.0"))
+    POPULARITY_RATING_WEIGHT: float = float(os.getenv("POPULARITY_RATING_WEIGHT", "3.0"))
+    POPULARITY_ORDER_WEIGHT: float = float(os.getenv("POPULARITY_ORDER_WEIGHT", "5.0"))
+    
+    # Thư mục lưu item factors của lần huấn luyện gần nhất (dùng khi phục vụ gợi ý)
+    RECOMMENDATION_MODEL_DIR: str = os.getenv("RECOMMENDATION_MODEL_DIR", "models")
+    
+    # Fold-in cho người dùng mới (chưa có trong lần huấn luyện gần nhất)
+    FOLD_IN_REGULARIZATION: float = float(os.getenv("FOLD_IN_REGULARIZATION", "0.1"))
+    FOLD_IN_CACHE_TTL_SECONDS: int = int(os.getenv("FOLD_IN_CACHE_TTL_SECONDS", "30"))
+    FOLD_IN_CACHE_MAX_USERS: int = int(os.getenv("FOLD_IN_CACHE_MAX_USERS", "10000"))
+    
+    # Re-rank gợi ý: hệ số lấy dư ứng viên và số sản phẩm tối đa mỗi danh mục (0 = không giới hạn)
+    RERANK_OVERFETCH: int = int(os.getenv("RERANK_OVERFETCH", "3"))
+    RERANK_MAX_PER_CATEGORY: int = int(os.getenv("RERANK_MAX_PER_CATEGORY", "5"))
+    
+    # Đa dạng hóa sản phẩm tương tự (MMR): số ứng viên, hệ số λ và số sản phẩm tối đa mỗi danh mục (0 = không giới hạn)
+    SIMILAR_MMR_CANDIDATES: int = int(os.getenv("SIMILAR_MMR_CANDIDATES", "50"))
+    SIMILAR_MMR_LAMBDA: float = float(os.getenv("SIMILAR_MMR_LAMBDA", "0.7"))
+    SIMILAR_MAX_PER_CATEGORY: int = int(os.getenv("SIMILAR_MAX_PER_CATEGORY", "0"))
+    
+    # Cấu hình gợi ý theo phiên (session) từ các lượt xem gần đây
+    SESSION_MAX_VIEWS: int = int(os.getenv("SESSION_MAX_VIEWS", "20"))
+    SESSION_MAX_USERS: int = int(os.getenv("SESSION_MAX_USERS", "100000"))
+    SESSION_TTL_SECONDS: int = int(os.getenv("SESSION_TTL_SECONDS", "1800"))
+    SESSION_HALF_LIFE_SECONDS: float = float(os.getenv("SESSION_HALF_LIFE_SECONDS", "600"))
+    # Tỷ trọng của điểm phiên khi trộn với gợi ý đã huấn luyện (0 = bỏ qua phiên)
+    SESSION_BLEND_WEIGHT: float = float(os.getenv("SESSION_BLEND_WEIGHT", "0.5"))
+    
+    # Cách giữ tồn kho khi đặt hàng: "pessimistic" (SELECT ... FOR UPDATE) hoặc "optimistic"
+    # (UPDATE có điều kiện không khóa trước, thử lại khi deadlock) cho các đợt flash sale
+    CHECKOUT_STOCK_MODE: str = os.getenv("CHECKOUT_STOCK_MODE", "pessimistic").lower()
+    CHECKOUT_MAX_ATTEMPTS: int = int(os.getenv("CHECKOUT_MAX_ATTEMPTS", "5"))
+    CHECKOUT_RETRY_MAX_WAIT_MS: int = int(os.getenv("CHECKOUT_RETRY_MAX_WAIT_MS", "200"))
+
+    # Băm mật khẩu bcrypt: cost factor (đổi giá trị thì hash cũ được băm lại khi đăng nhập),
+    # số thread băm và số yêu cầu tối đa đang chờ trước khi trả 503
+    PASSWORD_BCRYPT_ROUNDS: int = int(os.getenv("PASSWORD_BCRYPT_ROUNDS", "12"))
+    PASSWORD_HASH_WORKERS: int = int(os.getenv("PASSWORD_HASH_WORKERS", "4"))
+    PASSWORD_HASH_MAX_PENDING: int = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "64"))
+
+    # Giới hạn số lần đăng nhập theo IP và số lần đăng nhập sai theo email (cửa sổ trượt), chặn trước khi
+    # tra cứu người dùng hay băm mật khẩu
+    LOGIN_RATE_LIMIT_ENABLED: bool = os.getenv("LOGIN_RATE_LIMIT_ENABLED", "True").lower() in ("true", "1", "t")
+    LOGIN_RATE_LIMIT_IP_ATTEMPTS: int = int(os.getenv("LOGIN_RATE_LIMIT_IP_ATTEMPTS", "20"))
+    LOGIN_RATE_LIMIT_IP_WINDOW_SECONDS: int = int(os.getenv("LOGIN_RATE_LIMIT_IP_WINDOW_SECONDS", "60"))
+    LOGIN_RATE_LIMIT_EMAIL_ATTEMPTS: int = int(os.getenv("LOGIN_RATE_LIMIT_EMAIL_ATTEMPTS", "10"))
+    LOGIN_RATE_LIMIT_EMAIL_WINDOW_SECONDS: int = int(os.getenv("LOGIN_RATE_LIMIT_EMAIL_WINDOW_SECONDS", "900"))
+    LOGIN_RATE_LIMIT_MAX_KEYS: int = int(os.getenv("LOGIN_RATE_LIMIT_MAX_KEYS", "100000"))
+    # Chỉ bật khi chạy sau reverse proxy tin cậy: lấy IP client từ X-Forwarded-For
+    LOGIN_RATE_LIMIT_TRUST_FORWARDED: bool = os.getenv("LOGIN_RATE_LIMIT_TRUST_FORWARDED", "False").lower() in ("true", "1", "t")
+
+    # Cache HTTP response (ETag) cho các endpoint đọc nhiều
+    RESPONSE_CACHE_ENABLED: bool = os.getenv("RESPONSE_CACHE_ENABLED", "True").lower() in ("true", "1", "t")
+    # Không có REDIS_URL thì invalidate (MemoryCacheBackend.bump) chỉ tác động tới tiến trình hiện tại:
+    # các worker khác vẫn trả response cũ cho tới khi hết TTL, nên chạy nhiều worker cần cấu hình Redis
+    RESPONSE_CACHE_TTL_SECONDS: int = int(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "300"))
+    RESPONSE_CACHE_MAX_ENTRIES: int = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "5000"))
+    # Redis (tùy chọn) để chia sẻ cache giữa các worker; không cấu hình thì dùng LRU trong tiến trình
+    REDIS_URL: Optional[str] = os.getenv("REDIS_URL") or None
+
+    # Ghi JSON trực tiếp (orjson) cho các endpoint danh sách lớn thay vì validate lại qua response_model
+    FAST_SERIALIZATION_ENABLED: bool = os.getenv("FAST_SERIALIZATION_ENABLED", "True").lower() in ("true", "1", "t")
+    
     # CORS configuration
     CORS_ORIGINS: List[str] = os.getenv("CORS_ORIGINS", "*").split(",")
     
@@ -44,4 +163,26 @@ class Settings(BaseSettings):
             
         return f"mysql+pymysql://{info.data.get('DB_USER')}:{info.data.get('DB_PASS')}@{info.data.get('DB_HOST')}:{info.data.get('DB_PORT')}/{info.data.get('DB_NAME')}"
 
+    @field_validator("ASYNC_DATABASE_URI", mode="before")
+    def assemble_async_db_connection(cls, v: Optional[str], info: Dict[str, Any]) -> Any:
+        if isinstance(v, str):
+            return v
+        
+        return to_async_uri(info.data.get("DATABASE_URI") or "")
+
+    @field_validator("ASYNC_DATABASE_REPLICA_URI", mode="before")
+    def assemble_async_replica_connection(cls, v: Optional[str], info: Dict[str, Any]) -> Any:
+        if isinstance(v, str):
+            return v
+        
+        replica_uri = info.data.get("DATABASE_REPLICA_URI")
+        return to_async_uri(replica_uri) if replica_uri else None
+
+def to_async_uri(sync_uri: str) -> str:
+    """Đổi driver đồng bộ trong URI sang driver async tương ứng"""
+    scheme, _, rest = sync_uri.partition("://")
+    backend = scheme.split("+")[0]
+    async_drivers = {"mysql": "mysql+aiomysql", "sqlite": "sqlite+aiosqlite"}
+    return f"{async_drivers.get(backend, scheme)}://{rest}"
+
 settings = Settings()
\ No newline at end of file
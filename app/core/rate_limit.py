@@ -0,0 +1,248 @@
+import hashlib
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+
+from fastapi import Request
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# (khóa, số lần tối đa, độ dài cửa sổ tính bằng giây)
+Rule = Tuple[str, int, int]
+
+
+class RateLimitExceeded(Exception):
+    """Vượt quá giới hạn số lần thử trong cửa sổ trượt"""
+
+    def __init__(self, scope: str, retry_after: int):
+        super().__init__(scope)
+        self.scope = scope
+        self.retry_after = retry_after
+
+
+def _sliding_count(previous: int, current: int, elapsed: float, window: int) -> float:
+    # Ước lượng số lần trong cửa sổ trượt: phần còn nằm trong cửa sổ của bucket trước + bucket hiện tại
+    return previous * (window - elapsed) / window + current
+
+
+def _retry_after(previous: int, current: int, limit: int, elapsed: float, window: int) -> int:
+    if current >= limit or previous <= 0:
+        # Phải chờ sang bucket kế tiếp
+        return max(1, math.ceil(window - elapsed))
+    # Thời điểm phần còn lại của bucket trước giảm đủ để số ước lượng xuống dưới giới hạn
+    needed = window * (1 - (limit - current) / previous)
+    return max(1, math.ceil(needed - elapsed))
+
+
+class MemoryRateLimitBackend:
+    """
+    Bộ đếm cửa sổ trượt trong tiến trình: mỗi khóa chỉ giữ [chỉ số bucket, số lần ở bucket
+    hiện tại, số lần ở bucket trước], các khóa ít dùng nhất bị loại khi vượt `max_keys`.
+    """
+
+    shared = False
+
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        self._counters: "OrderedDict[str, List[int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    async def hit(
+        self, rules: List[Rule], now: float, counted: Optional[List[int]] = None
+    ) -> Optional[Tuple[int, int]]:
+        with self._lock:
+            states = []
+            for i, (key, limit, window) in enumerate(rules):
+                bucket = int(now // window)
+                elapsed = now - bucket * window
+                state = self._advance(self._counters.get(key), bucket)
+                if _sliding_count(state[2], state[1], elapsed, window) >= limit:
+                    return i, _retry_after(state[2], state[1], limit, elapsed, window)
+                states.append(state)
+
+            # Chỉ ghi nhận khi mọi giới hạn đều còn chỗ
+            for i in (range(len(rules)) if counted is None else counted):
+                self._record(rules[i][0], states[i])
+            return None
+
+    async def add(self, rules: List[Rule], now: float) -> None:
+        with self._lock:
+            for key, _, window in rules:
+                self._record(key, self._advance(self._counters.get(key), int(now // window)))
+
+    def _record(self, key: str, state: List[int]) -> None:
+        state[1] += 1
+        self._counters[key] = state
+        self._counters.move_to_end(key)
+        while len(self._counters) > self.max_keys:
+            self._counters.popitem(last=False)
+
+    def size(self) -> int:
+        return len(self._counters)
+
+    @staticmethod
+    def _advance(state: Optional[List[int]], bucket: int) -> List[int]:
+        if state is None or state[0] < bucket - 1:
+            return [bucket, 0, 0]
+        if state[0] == bucket - 1:
+            return [bucket, 0, state[1]]
+        return state
+
+
+class RedisRateLimitBackend:
+    """Bộ đếm dùng chung qua Redis: mỗi bucket là một khóa INCR, hết hạn sau hai cửa sổ"""
+
+    shared = True
+
+    def __init__(self, url: str):
+        import redis.asyncio
+
+        self._client = redis.asyncio.Redis.from_url(url)
+
+    async def hit(
+        self, rules: List[Rule], now: float, counted: Optional[List[int]] = None
+    ) -> Optional[Tuple[int, int]]:
+        buckets = [int(now // window) for _, _, window in rules]
+        async with self._client.pipeline(transaction=False) as pipe:
+            for (key, _, _), bucket in zip(rules, buckets):
+                pipe.get(f"rl:{key}:{bucket}")
+                pipe.get(f"rl:{key}:{bucket - 1}")
+            values = [int(v) if v is not None else 0 for v in await pipe.execute()]
+
+        for i, ((_, limit, window), bucket) in enumerate(zip(rules, buckets)):
+            current, previous = values[2 * i], values[2 * i + 1]
+            elapsed = now - bucket * window
+            if _sliding_count(previous, current, elapsed, window) >= limit:
+                return i, _retry_after(previous, current, limit, elapsed, window)
+
+        await self.add(rules if counted is None else [rules[i] for i in counted], now)
+        return None
+
+    async def add(self, rules: List[Rule], now: float) -> None:
+        if not rules:
+            return
+        async with self._client.pipeline(transaction=False) as pipe:
+            for key, _, window in rules:
+                bucket = int(now // window)
+                pipe.incr(f"rl:{key}:{bucket}")
+                pipe.expire(f"rl:{key}:{bucket}", 2 * window)
+            await pipe.execute()
+
+    def size(self) -> Optional[int]:
+        return None
+
+
+class LoginRateLimiter:
+    """
+    Giới hạn số lần đăng nhập theo IP client và số lần đăng nhập sai theo email (cửa sổ trượt).
+
+    Được kiểm tra trước khi tra cứu người dùng hay băm mật khẩu, nên một đợt credential
+    stuffing chỉ tốn vài phép tính trong bộ nhớ cho mỗi lần thử bị chặn. Mọi lần thử được
+    tính vào khóa IP; khóa email chỉ tính các lần sai mật khẩu (`record_failure`), để người
+    dùng đăng nhập đúng nhiều lần không tự khóa tài khoản của mình. Lần thử bị chặn không
+    được tính thêm. Email được băm trước khi làm khóa để không giữ email thô trong bộ nhớ
+    hay Redis. Nếu backend lỗi thì cho qua (fail open) và ghi log.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._lock = threading.Lock()
+        self.allowed = 0
+        self.rejected: Dict[str, int] = {"ip": 0, "email": 0}
+        self.failures = 0
+        self.errors = 0
+
+    @staticmethod
+    def _ip_rule(ip: str) -> Rule:
+        return f"login:ip:{ip}", settings.LOGIN_RATE_LIMIT_IP_ATTEMPTS, settings.LOGIN_RATE_LIMIT_IP_WINDOW_SECONDS
+
+    @staticmethod
+    def _email_rule(email: str) -> Rule:
+        email_key = hashlib.blake2b(email.strip().lower().encode(), digest_size=12).hexdigest()
+        return (
+            f"login:email:{email_key}",
+            settings.LOGIN_RATE_LIMIT_EMAIL_ATTEMPTS,
+            settings.LOGIN_RATE_LIMIT_EMAIL_WINDOW_SECONDS
+        )
+
+    async def check(self, ip: str, email: str) -> None:
+        """
+        Ghi nhận một lần đăng nhập theo IP; ném RateLimitExceeded nếu IP đã vượt giới hạn
+        hoặc email đã có quá nhiều lần đăng nhập sai
+        """
+        if not settings.LOGIN_RATE_LIMIT_ENABLED:
+            return
+
+        scopes = ("ip", "email")
+        try:
+            # Chỉ khóa IP được tính ở đây; khóa email chỉ được kiểm tra
+            result = await self.backend.hit([self._ip_rule(ip), self._email_rule(email)], time.time(), counted=[0])
+        except Exception as e:
+            with self._lock:
+                self.errors += 1
+            logger.error(f"Lỗi khi kiểm tra giới hạn đăng nhập: {str(e)}")
+            return
+
+        with self._lock:
+            if result is None:
+                self.allowed += 1
+                return
+            self.rejected[scopes[result[0]]] += 1
+        raise RateLimitExceeded(scopes[result[0]], result[1])
+
+    async def record_failure(self, email: str) -> None:
+        """Tính một lần đăng nhập sai vào khóa email (gọi sau khi xác thực thất bại)"""
+        if not settings.LOGIN_RATE_LIMIT_ENABLED:
+            return
+
+        try:
+            await self.backend.add([self._email_rule(email)], time.time())
+        except Exception as e:
+            with self._lock:
+                self.errors += 1
+            logger.error(f"Lỗi khi ghi nhận đăng nhập sai: {str(e)}")
+            return
+
+        with self._lock:
+            self.failures += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Số lần đăng nhập được cho qua, bị chặn theo IP / email, số lần sai và số lỗi backend"""
+        with self._lock:
+            return {
+                "enabled": settings.LOGIN_RATE_LIMIT_ENABLED,
+                "shared": self.backend.shared,
+                "allowed": self.allowed,
+                "rejected_ip": self.rejected["ip"],
+                "rejected_email": self.rejected["email"],
+                "failed_attempts": self.failures,
+                "backend_errors": self.errors,
+                "tracked_keys": self.backend.size()
+            }
+
+
+def client_ip(request: Request) -> str:
+    """IP của client; dùng X-Forwarded-For khi LOGIN_RATE_LIMIT_TRUST_FORWARDED được bật"""
+    if settings.LOGIN_RATE_LIMIT_TRUST_FORWARDED:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+
+def _create_backend():
+    if settings.REDIS_URL:
+        try:
+            return RedisRateLimitBackend(settings.REDIS_URL)
+        except ImportError:
+            logger.warning("Chưa cài đặt thư viện redis, giới hạn đăng nhập dùng bộ nhớ trong tiến trình")
+    return MemoryRateLimitBackend(settings.LOGIN_RATE_LIMIT_MAX_KEYS)
+
+
+# Bộ giới hạn đăng nhập dùng chung cho toàn bộ tiến trình
+login_rate_limiter = LoginRateLimiter(_create_backend())
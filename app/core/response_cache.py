@@ -0,0 +1,269 @@
+import base64
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from fastapi import Request, Response
+from fastapi.routing import APIRoute
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class CachePolicy:
+    """Cấu hình cache của một endpoint"""
+
+    def __init__(
+        self,
+        namespaces: Tuple[str, ...],
+        ttl_seconds: int,
+        vary_on_auth: bool,
+        skip_when_authenticated: bool = False
+    ):
+        # Namespace có thể chứa path param, ví dụ "product:{product_id}"
+        self.namespaces = namespaces
+        self.ttl_seconds = ttl_seconds
+        self.vary_on_auth = vary_on_auth
+        self.skip_when_authenticated = skip_when_authenticated
+
+
+# Endpoint function -> CachePolicy, được đăng ký bởi decorator `cache_response`
+_policies: Dict[Callable, CachePolicy] = {}
+
+
+def cache_response(
+    namespaces: Iterable[str] = (),
+    ttl_seconds: Optional[int] = None,
+    vary_on_auth: bool = False,
+    skip_when_authenticated: bool = False
+):
+    """
+    Decorator đánh dấu endpoint GET được cache bởi CachedAPIRoute.
+
+    Parameters:
+    -----------
+    namespaces : Iterable[str]
+        Các namespace dùng để vô hiệu hóa cache (`response_cache.invalidate`)
+    ttl_seconds : int, optional
+        Thời gian sống của cache, mặc định RESPONSE_CACHE_TTL_SECONDS
+    vary_on_auth : bool
+        True nếu response phụ thuộc người dùng (cache riêng theo header Authorization)
+    skip_when_authenticated : bool
+        True nếu endpoint có tác dụng phụ theo người dùng (ví dụ ghi lượt xem): request có
+        header Authorization luôn chạy endpoint, chỉ request của khách được cache
+    """
+    def decorator(func):
+        _policies[func] = CachePolicy(
+            tuple(namespaces),
+            ttl_seconds or settings.RESPONSE_CACHE_TTL_SECONDS,
+            vary_on_auth,
+            skip_when_authenticated
+        )
+        return func
+    return decorator
+
+
+class MemoryCacheBackend:
+    """LRU trong tiến trình, có TTL; phiên bản namespace cũng được giữ trong bộ nhớ"""
+
+    shared = False
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._versions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            if item[0] < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return item[1]
+
+    async def set(self, key: str, entry: Dict[str, Any], ttl_seconds: int) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl_seconds, entry)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    async def versions(self, namespaces: List[str]) -> List[int]:
+        return [self._versions.get(ns, 0) for ns in namespaces]
+
+    def bump(self, namespace: str) -> None:
+        with self._lock:
+            self._versions[namespace] = self._versions.get(namespace, 0) + 1
+
+
+class RedisCacheBackend:
+    """Cache dùng chung qua Redis: entry lưu dạng JSON, phiên bản namespace dùng INCR"""
+
+    shared = True
+
+    def __init__(self, url: str):
+        import redis
+        import redis.asyncio
+
+        self._client = redis.Redis.from_url(url)
+        self._async_client = redis.asyncio.Redis.from_url(url)
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        raw = await self._async_client.get(f"rc:entry:{key}")
+        if raw is None:
+            return None
+        entry = json.loads(raw)
+        entry["body"] = base64.b64decode(entry["body"])
+        return entry
+
+    async def set(self, key: str, entry: Dict[str, Any], ttl_seconds: int) -> None:
+        raw = json.dumps({**entry, "body": base64.b64encode(entry["body"]).decode("ascii")})
+        await self._async_client.set(f"rc:entry:{key}", raw, ex=ttl_seconds)
+
+    async def versions(self, namespaces: List[str]) -> List[int]:
+        if not namespaces:
+            return []
+        values = await self._async_client.mget([f"rc:version:{ns}" for ns in namespaces])
+        return [int(v) if v is not None else 0 for v in values]
+
+    def bump(self, namespace: str) -> None:
+        self._client.incr(f"rc:version:{namespace}")
+
+
+class ResponseCache:
+    """
+    Cache response của các endpoint GET, khóa theo đường dẫn, query string, phạm vi xác thực
+    và phiên bản của các namespace. `invalidate` tăng phiên bản namespace nên mọi khóa cũ
+    không còn được dùng nữa (các entry cũ tự hết hạn theo TTL/LRU).
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    @property
+    def is_shared(self) -> bool:
+        """True nếu cache (và việc vô hiệu hóa) được chia sẻ giữa các worker"""
+        return self.backend.shared
+
+    def invalidate(self, *namespaces: str) -> None:
+        """Vô hiệu hóa mọi response thuộc các namespace cho trước"""
+        for namespace in namespaces:
+            try:
+                self.backend.bump(namespace)
+            except Exception as e:
+                logger.error(f"Không thể vô hiệu hóa cache namespace {namespace}: {str(e)}")
+
+    async def build_key(self, policy: CachePolicy, request: Request) -> str:
+        namespaces = [ns.format(**request.path_params) for ns in policy.namespaces]
+        versions = await self.backend.versions(namespaces)
+        query = "&".join(sorted(request.url.query.split("&")))
+
+        auth_scope = "*"
+        if policy.vary_on_auth:
+            authorization = request.headers.get("authorization")
+            auth_scope = hashlib.sha256(authorization.encode()).hexdigest() if authorization else "anonymous"
+
+        version_part = ",".join(f"{ns}={v}" for ns, v in zip(namespaces, versions))
+        return f"{request.url.path}?{query}|{auth_scope}|{version_part}"
+
+
+class CachedAPIRoute(APIRoute):
+    """
+    Route class phục vụ response từ ResponseCache cho các endpoint có `@cache_response`.
+
+    Cache được kiểm tra trước khi FastAPI giải quyết dependency, nên cache hit không mở
+    database session. Response được cache kèm ETag; nếu client gửi If-None-Match trùng
+    thì trả 304 không có body. Router dùng `APIRouter(route_class=CachedAPIRoute)`.
+    """
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+        policy = _policies.get(self.endpoint)
+        if policy is None:
+            return handler
+
+        async def cached_handler(request: Request) -> Response:
+            if request.method != "GET" or not settings.RESPONSE_CACHE_ENABLED:
+                return await handler(request)
+            if policy.skip_when_authenticated and request.headers.get("authorization"):
+                return await handler(request)
+
+            try:
+                key = await response_cache.build_key(policy, request)
+                entry = await response_cache.backend.get(key)
+            except Exception as e:
+                logger.error(f"Lỗi khi đọc response cache: {str(e)}")
+                return await handler(request)
+
+            if entry is not None:
+                return _build_response(request, entry, policy, "HIT")
+
+            response = await handler(request)
+            # StreamingResponse không có body sẵn, không cache
+            if response.status_code != 200 or not hasattr(response, "body"):
+                return response
+
+            entry = {
+                "headers": [
+                    [k.decode("latin-1"), v.decode("latin-1")] for k, v in response.raw_headers
+                    if k.lower() not in (b"etag", b"cache-control")
+                ],
+                "body": bytes(response.body),
+                "etag": f'"{hashlib.sha1(response.body).hexdigest()}"'
+            }
+            try:
+                await response_cache.backend.set(key, entry, policy.ttl_seconds)
+            except Exception as e:
+                logger.error(f"Lỗi khi ghi response cache: {str(e)}")
+
+            return _build_response(request, entry, policy, "MISS")
+
+        return cached_handler
+
+
+def _build_response(request: Request, entry: Dict[str, Any], policy: CachePolicy, status: str) -> Response:
+    # no-cache: trình duyệt được lưu nhưng phải kiểm tra lại bằng If-None-Match mỗi lần
+    headers = {
+        "ETag": entry["etag"],
+        "Cache-Control": "private, no-cache" if policy.vary_on_auth else "public, no-cache",
+        "X-Cache": status
+    }
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _etag_matches(if_none_match, entry["etag"]):
+        return Response(status_code=304, headers=headers)
+
+    response = Response(content=entry["body"], status_code=200)
+    response.raw_headers = [
+        (k.encode("latin-1"), v.encode("latin-1")) for k, v in entry["headers"]
+    ] + [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers.items()]
+    return response
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return any(tag == etag or tag == f"W/{etag}" for tag in candidates)
+
+
+def _create_backend():
+    if settings.REDIS_URL:
+        try:
+            return RedisCacheBackend(settings.REDIS_URL)
+        except ImportError:
+            logger.warning("Chưa cài đặt thư viện redis, response cache dùng bộ nhớ trong tiến trình")
+    return MemoryCacheBackend(settings.RESPONSE_CACHE_MAX_ENTRIES)
+
+
+# Response cache dùng chung cho toàn bộ tiến trình
+response_cache = ResponseCache(_create_backend())
@@ -0,0 +1,161 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from passlib.context import CryptContext
+
+from app.core.config import settings
+
+# Các mốc (giây) của histogram thời gian chờ trong hàng đợi băm
+QUEUE_BUCKETS = (0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+class PasswordHasherBusy(Exception):
+    """Hàng đợi băm mật khẩu đã đầy"""
+
+
+class PasswordHasher:
+    """
+    Băm và kiểm tra mật khẩu bcrypt trong một thread pool có giới hạn.
+
+    Mỗi lần bcrypt tốn ~100-300 ms CPU; gọi trực tiếp trong endpoint `async def` sẽ chặn
+    event loop và mọi request khác của worker. Thư viện bcrypt nhả GIL khi băm nên thread
+    pool đủ để chạy song song trên nhiều nhân mà không cần process pool. Số yêu cầu đang
+    chờ hoặc đang băm bị giới hạn bởi `max_pending`; vượt quá thì `PasswordHasherBusy`
+    được ném ra ngay để endpoint trả 503 thay vì xếp hàng vô hạn.
+
+    Cost factor lấy từ `rounds`; hash có cost khác được coi là cần cập nhật, nên
+    `verify_and_update` trả về hash mới để lưu lại khi người dùng đăng nhập.
+    """
+
+    def __init__(
+        self,
+        rounds: int = settings.PASSWORD_BCRYPT_ROUNDS,
+        workers: int = settings.PASSWORD_HASH_WORKERS,
+        max_pending: int = settings.PASSWORD_HASH_MAX_PENDING
+    ):
+        self.context = CryptContext(
+            schemes=["bcrypt"],
+            deprecated="auto",
+            bcrypt__default_rounds=rounds,
+            bcrypt__min_rounds=rounds,
+            bcrypt__max_rounds=rounds
+        )
+        self.workers = max(1, workers)
+        self.max_pending = max(self.workers, max_pending)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.peak_pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.rehashed = 0
+        self.queue_seconds_total = 0.0
+        self.queue_seconds_max = 0.0
+        self.hash_seconds_total = 0.0
+        self.hash_seconds_max = 0.0
+        self.queue_buckets = [0] * (len(QUEUE_BUCKETS) + 1)
+
+    def hash(self, password: str) -> str:
+        """Băm mật khẩu ngay trên thread hiện tại (dùng cho script và code đồng bộ)"""
+        return self.context.hash(password)
+
+    def verify_and_update(self, password: str, password_hash: str) -> Tuple[bool, Optional[str]]:
+        """
+        Kiểm tra mật khẩu trên thread hiện tại; trả về (hợp lệ, hash mới nếu cần băm lại)
+        """
+        return self.context.verify_and_update(password, password_hash)
+
+    async def hash_async(self, password: str) -> str:
+        """Băm mật khẩu trong thread pool"""
+        return await self._submit(self.context.hash, password)
+
+    async def verify_and_update_async(
+        self, password: str, password_hash: str
+    ) -> Tuple[bool, Optional[str]]:
+        """Kiểm tra mật khẩu trong thread pool; trả về (hợp lệ, hash mới nếu cần băm lại)"""
+        return await self._submit(self.context.verify_and_update, password, password_hash)
+
+    def record_rehash(self) -> None:
+        """Ghi nhận một hash đã được băm lại theo cost factor mới"""
+        with self._lock:
+            self.rehashed += 1
+
+    def close(self) -> None:
+        """Dừng thread pool, chờ các lượt băm đang chạy hoàn tất"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def stats(self) -> Dict[str, Any]:
+        """Số liệu hàng đợi băm: đang chờ, bị từ chối, thời gian chờ và thời gian băm"""
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "pending": self.pending,
+                "peak_pending": self.peak_pending,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "rehashed": self.rehashed,
+                "queue_seconds_avg": self.queue_seconds_total / self.completed if self.completed else 0.0,
+                "queue_seconds_max": self.queue_seconds_max,
+                "hash_seconds_avg": self.hash_seconds_total / self.completed if self.completed else 0.0,
+                "hash_seconds_max": self.hash_seconds_max,
+                "queue_histogram": {
+                    **{f"le_{bound}": count for bound, count in zip(QUEUE_BUCKETS, self.queue_buckets)},
+                    "inf": self.queue_buckets[-1]
+                }
+            }
+
+    async def _submit(self, func: Callable, *args) -> Any:
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise PasswordHasherBusy()
+            self.pending += 1
+            self.peak_pending = max(self.peak_pending, self.pending)
+            if self._executor is None:
+                # Pool được tạo ở lần băm đầu tiên, nên import module không sinh thread
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password-hasher")
+            executor = self._executor
+
+        submitted_at = time.monotonic()
+        try:
+            future = executor.submit(self._run, submitted_at, func, *args)
+        except BaseException:
+            with self._lock:
+                self.pending -= 1
+            raise
+        return await asyncio.wrap_future(future)
+
+    def _run(self, submitted_at: float, func: Callable, *args) -> Any:
+        started_at = time.monotonic()
+        try:
+            return func(*args)
+        finally:
+            self._record(started_at - submitted_at, time.monotonic() - started_at)
+
+    def _record(self, queue_seconds: float, hash_seconds: float) -> None:
+        with self._lock:
+            self.pending -= 1
+            self.completed += 1
+            self.queue_seconds_total += queue_seconds
+            self.queue_seconds_max = max(self.queue_seconds_max, queue_seconds)
+            self.hash_seconds_total += hash_seconds
+            self.hash_seconds_max = max(self.hash_seconds_max, hash_seconds)
+            self.queue_buckets[self._bucket(queue_seconds)] += 1
+
+    @staticmethod
+    def _bucket(seconds: float) -> int:
+        for i, bound in enumerate(QUEUE_BUCKETS):
+            if seconds <= bound:
+                return i
+        return len(QUEUE_BUCKETS)
+
+
+# Bộ băm mật khẩu dùng chung cho toàn bộ tiến trình
+password_hasher = PasswordHasher()
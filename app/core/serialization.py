@@ -0,0 +1,186 @@
+import json
+import logging
+import typing
+from decimal import Decimal
+from typing import Any, Callable, Dict, Type
+
+from fastapi import Response
+from fastapi.exceptions import ResponseValidationError
+from pydantic import BaseModel, ValidationError
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+    logger.warning("Chưa cài đặt thư viện orjson, response nhanh dùng json của thư viện chuẩn")
+
+
+def _default(value: Any) -> Any:
+    # Kiểu orjson/json không tự chuyển: Decimal từ cột Numeric, số và mảng numpy
+    if isinstance(value, Decimal):
+        return float(value)
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    raise TypeError(f"Không thể chuyển kiểu {type(value).__name__} sang JSON")
+
+
+def dumps(content: Any) -> bytes:
+    """Chuyển nội dung sang JSON bytes bằng orjson (hoặc json nếu chưa cài orjson)"""
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(Response):
+    """Response JSON được ghi trực tiếp bằng `dumps`, không qua validate của response_model"""
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+# Hàm chiếu nội dung theo response model, được biên dịch một lần cho mỗi model
+_shapes: Dict[Type[BaseModel], Callable[[Any], Any]] = {}
+
+
+def _identity(value: Any) -> Any:
+    return value
+
+
+def _to_float(value: Any) -> Any:
+    return float(value) if value is not None else None
+
+
+def _compile(annotation: Any) -> Callable[[Any], Any]:
+    """
+    Tạo hàm chuyển một giá trị theo kiểu khai báo trong schema. Kiểu dữ liệu được tin tưởng
+    (service đã tạo đúng kiểu), chỉ giữ đúng các trường của model, điền giá trị mặc định còn
+    thiếu và đổi Decimal/numpy sang float cho các trường `float`.
+    """
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return _compile_model(annotation)
+    if annotation is float:
+        return _to_float
+
+    origin = typing.get_origin(annotation)
+    args = typing.get_args(annotation)
+    if origin is typing.Union:
+        members = [arg for arg in args if arg is not type(None)]
+        if len(members) == 1:
+            convert = _compile(members[0])
+            if convert is _identity:
+                return _identity
+            return lambda value: convert(value) if value is not None else None
+        return _identity
+    if origin in (list, typing.List) and args:
+        convert = _compile(args[0])
+        if convert is _identity:
+            return _identity
+        return lambda value: [convert(item) for item in value] if value is not None else None
+    if origin in (dict, typing.Dict) and len(args) == 2:
+        convert = _compile(args[1])
+        if convert is _identity:
+            return _identity
+        return lambda value: {k: convert(v) for k, v in value.items()} if value is not None else None
+    return _identity
+
+
+# Đánh dấu trường bắt buộc (không có giá trị mặc định)
+_REQUIRED = object()
+
+
+class MissingFieldError(ValueError):
+    """Nội dung thiếu trường bắt buộc của response model"""
+
+
+def _compile_model(model: Type[BaseModel]) -> Callable[[Any], Any]:
+    """
+    Tạo hàm dựng dict phẳng cho model từ danh sách trường (khóa ra, khóa vào, mặc định, hàm
+    chuyển) tính sẵn một lần. Khóa vào là alias dùng khi validate (thêm tên trường nếu model
+    bật populate_by_name), khóa ra là alias khi serialize như `response_model_by_alias` mặc
+    định của FastAPI.
+    """
+    populate_by_name = model.model_config.get("populate_by_name", False)
+    fields = []
+    for name, info in model.model_fields.items():
+        source = info.validation_alias if isinstance(info.validation_alias, str) else (info.alias or name)
+        fallback = name if populate_by_name and source != name else None
+        default = _REQUIRED if info.is_required() else info.get_default(call_default_factory=True)
+        convert = _compile(info.annotation)
+        fields.append((
+            info.serialization_alias or info.alias or name,
+            source,
+            # Khi có tên dự phòng, chỉ dùng giá trị mặc định sau khi đã thử cả tên trường
+            _REQUIRED if fallback is not None else default,
+            fallback,
+            default,
+            None if convert is _identity else convert
+        ))
+
+    def project(value: Any) -> Any:
+        if value is None:
+            return None
+        if isinstance(value, BaseModel):
+            return value.model_dump(mode="json", by_alias=True)
+        result = {}
+        for key, source, missing, fallback, default, convert in fields:
+            item = value.get(source, missing)
+            if item is _REQUIRED:
+                if fallback is not None:
+                    item = value.get(fallback, default)
+                if item is _REQUIRED:
+                    raise MissingFieldError(f"{model.__name__}: thiếu trường bắt buộc {source!r}")
+            result[key] = item if convert is None else convert(item)
+        return result
+
+    return project
+
+
+def shape_for(model: Type[BaseModel]) -> Callable[[Any], Any]:
+    """Hàm chiếu nội dung theo `model`, biên dịch ở lần gọi đầu tiên"""
+    shape = _shapes.get(model)
+    if shape is None:
+        shape = _shapes[model] = _compile_model(model)
+    return shape
+
+
+def lean_response(model: Type[BaseModel], content: Any) -> Any:
+    """
+    Trả response JSON cho các endpoint danh sách lớn mà không validate lại qua response_model.
+
+    Nội dung (dict do service tạo) được chiếu theo `model` rồi ghi thẳng ra bytes, bỏ qua
+    bước FastAPI dựng lại toàn bộ model lồng nhau cho mỗi phần tử. Endpoint vẫn khai báo
+    `response_model` để giữ tài liệu OpenAPI. Khi FAST_SERIALIZATION_ENABLED tắt, nội dung
+    được trả nguyên để FastAPI validate như bình thường. Nội dung thiếu trường bắt buộc
+    gây ResponseValidationError như khi validate qua response_model.
+
+    Parameters:
+    -----------
+    model : Type[BaseModel]
+        Response model của endpoint
+    content : Any
+        Nội dung do service tạo
+
+    Returns:
+    --------
+    FastJSONResponse hoặc nội dung ban đầu
+    """
+    if not settings.FAST_SERIALIZATION_ENABLED:
+        return content
+    try:
+        return FastJSONResponse(shape_for(model)(content))
+    except MissingFieldError:
+        # Validate lại toàn bộ nội dung để báo cùng lỗi (kèm vị trí trường) mà FastAPI báo
+        # khi nội dung không khớp response_model
+        try:
+            model.model_validate(content)
+        except ValidationError as e:
+            raise ResponseValidationError(e.errors(), body=content)
+        raise
@@ -1,14 +1,80 @@
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
 from app.core.config import settings
+from app.db.pool_metrics import (
+    InstrumentedQueuePool, InstrumentedAsyncAdaptedQueuePool, instrument_engine
+)
+from app.db.routing import RoutingSession, ReplicaRouter
+
+# Tham số pool dùng chung cho engine sync và async của API
+pool_options = {
+    "pool_size": settings.DB_POOL_SIZE,
+    "max_overflow": settings.DB_MAX_OVERFLOW,
+    "pool_recycle": settings.DB_POOL_RECYCLE,
+    "pool_timeout": settings.DB_POOL_TIMEOUT,
+    "pool_pre_ping": settings.DB_POOL_PRE_PING,
+}
 
 # Tạo engine kết nối đến cơ sở dữ liệu MySQL
-engine = create_engine(settings.DATABASE_URI, pool_pre_ping=True)
+engine = create_engine(settings.DATABASE_URI, poolclass=InstrumentedQueuePool, **pool_options)
+instrument_engine(engine, "primary")
+
+# Read replica (nếu có): các SELECT trong khối `use_replica`/`@read_only` được gửi tới đây
+replica_engine = None
+if settings.DATABASE_REPLICA_URI:
+    replica_engine = create_engine(
+        settings.DATABASE_REPLICA_URI, poolclass=InstrumentedQueuePool, **pool_options
+    )
+    instrument_engine(replica_engine, "replica")
+
+# Mốc read-your-writes được chia sẻ giữa các worker qua Redis nếu có cấu hình
+RoutingSession.router = ReplicaRouter(
+    settings.DB_REPLICA_STICKY_SECONDS, settings.REDIS_URL if replica_engine is not None else None
+)
 
 # Tạo SessionLocal để mỗi request sẽ có một session riêng
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+SessionLocal = sessionmaker(
+    autocommit=False, autoflush=False, bind=engine,
+    class_=RoutingSession, info={"replica_bind": replica_engine}
+)
+
+# Engine bất đồng bộ (aiomysql/aiosqlite) cho các endpoint async,
+# để truy vấn DB không chặn event loop
+async_engine = create_async_engine(
+    settings.ASYNC_DATABASE_URI, poolclass=InstrumentedAsyncAdaptedQueuePool, **pool_options
+)
+instrument_engine(async_engine.sync_engine, "async")
+
+async_replica_engine = None
+if settings.ASYNC_DATABASE_REPLICA_URI:
+    async_replica_engine = create_async_engine(
+        settings.ASYNC_DATABASE_REPLICA_URI, poolclass=InstrumentedAsyncAdaptedQueuePool, **pool_options
+    )
+    instrument_engine(async_replica_engine.sync_engine, "async_replica")
+
+# expire_on_commit=False để các object vẫn đọc được sau commit mà không cần lazy load
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, autoflush=False, expire_on_commit=False,
+    sync_session_class=RoutingSession,
+    info={"replica_bind": async_replica_engine.sync_engine if async_replica_engine else None}
+)
+
+# Engine riêng cho job huấn luyện và các tác vụ batch khác
+batch_engine = create_engine(
+    settings.DATABASE_URI,
+    poolclass=InstrumentedQueuePool,
+    pool_size=settings.BATCH_DB_POOL_SIZE,
+    max_overflow=settings.BATCH_DB_MAX_OVERFLOW,
+    pool_recycle=settings.DB_POOL_RECYCLE,
+    pool_timeout=settings.DB_POOL_TIMEOUT,
+    pool_pre_ping=True,  # Job chạy thưa, kết nối dễ bị MySQL đóng giữa hai lần chạy
+)
+instrument_engine(batch_engine, "batch")
+
+BatchSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=batch_engine)
 
 # Tạo Base class cho tất cả các model
 Base = declarative_base()
@@ -19,4 +85,4 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
@@ -0,0 +1,26 @@
+from sqlalchemy.exc import DBAPIError
+
+# Mã lỗi MySQL có thể thử lại: 1213 = deadlock, 1205 = hết thời gian chờ khóa
+TRANSIENT_MYSQL_ERRORS = (1213, 1205)
+
+
+def is_deadlock(exc: BaseException) -> bool:
+    """Lỗi do deadlock giữa các transaction"""
+    if not isinstance(exc, DBAPIError) or exc.orig is None:
+        return False
+    args = getattr(exc.orig, "args", ())
+    return (bool(args) and args[0] == 1213) or "deadlock" in str(exc.orig).lower()
+
+
+def is_transient_error(exc: BaseException) -> bool:
+    """
+    Lỗi tạm thời của cơ sở dữ liệu, transaction có thể chạy lại từ đầu:
+    deadlock, hết thời gian chờ khóa (MySQL) hoặc database bị khóa (SQLite)
+    """
+    if not isinstance(exc, DBAPIError) or exc.orig is None:
+        return False
+    args = getattr(exc.orig, "args", ())
+    if args and args[0] in TRANSIENT_MYSQL_ERRORS:
+        return True
+    message = str(exc.orig).lower()
+    return "deadlock" in message or "lock wait timeout" in message or "database is locked" in message
@@ -1,5 +1,7 @@
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
+from datetime import datetime
 import logging
 from sqlalchemy.orm import Session
 
@@ -8,6 +10,8 @@ from app.recommendations.training.job import TrainingJob
 from app.db.base import engine, SessionLocal
 from app.repositories.user_repository import UserRepository
 from app.services.user_service import UserService
+from app.repositories.interaction_repository import ProductRatingStatsRepository
+from app.services.sales_rollup import sales_rollup
 
 # Cấu hình logging
 logging.basicConfig(level=logging.INFO)
@@ -19,19 +23,20 @@ scheduler = BackgroundScheduler()
 def init_scheduler():
     """Khởi tạo scheduler cho việc huấn luyện mô hình định kỳ"""
     
+    # Cấu hình job huấn luyện mô hình chạy hàng ngày vào giờ đã cấu hình (mặc định: 1 giờ sáng)
+    # (thêm cả khi scheduler đã chạy sẵn cho job tổng hợp doanh số)
+    scheduler.add_job(
+        TrainingJob.run,
+        trigger=CronTrigger(hour=settings.TRAINING_HOUR),
+        id='training_job',
+        name='Huấn luyện mô hình gợi ý',
+        replace_existing=True
+    )
+    
     if not scheduler.running:
-        # Cấu hình job huấn luyện mô hình chạy hàng ngày vào giờ đã cấu hình (mặc định: 1 giờ sáng)
-        scheduler.add_job(
-            TrainingJob.run,
-            trigger=CronTrigger(hour=settings.TRAINING_HOUR),
-            id='training_job',
-            name='Huấn luyện mô hình gợi ý',
-            replace_existing=True
-        )
-        
         # Khởi động scheduler
         scheduler.start()
-        logger.info(f"Scheduler đã được khởi tạo và sẽ chạy huấn luyện vào lúc {settings.TRAINING_HOUR}:00 mỗi ngày")
+    logger.info(f"Scheduler đã được khởi tạo và sẽ chạy huấn luyện vào lúc {settings.TRAINING_HOUR}:00 mỗi ngày")
     
     return scheduler
 
@@ -69,4 +74,38 @@ def create_first_admin():
     
     finally:
         if 'db' in locals():
-            db.close()
\ No newline at end of file
+            db.close()
+
+def init_rating_stats():
+    """
+    Khởi tạo bảng tổng hợp đánh giá từ bảng ratings nếu bảng còn trống
+    (lần đầu triển khai); sau đó bảng được cập nhật cộng dồn khi có đánh giá mới
+    """
+    db = SessionLocal()
+    try:
+        repo = ProductRatingStatsRepository(db)
+        if repo.is_empty():
+            count = repo.rebuild_all()
+            logger.info(f"Đã khởi tạo tổng hợp đánh giá cho {count} sản phẩm")
+    except Exception as e:
+        logger.error(f"Lỗi khi khởi tạo tổng hợp đánh giá: {e}")
+    finally:
+        db.close()
+
+def init_sales_rollup():
+    """
+    Lên lịch tổng hợp doanh số định kỳ. Lần chạy đầu (lần đầu triển khai: backfill toàn bộ
+    đơn cũ) chạy ngay trên scheduler để không chặn khởi động ứng dụng.
+    Nhiều worker cùng chạy vẫn an toàn vì mỗi lô khóa watermark.
+    """
+    scheduler.add_job(
+        sales_rollup.run,
+        trigger=IntervalTrigger(minutes=settings.SALES_ROLLUP_INTERVAL_MINUTES),
+        next_run_time=datetime.now(),
+        id='sales_rollup_job',
+        name='Tổng hợp doanh số theo ngày',
+        replace_existing=True
+    )
+    if not scheduler.running:
+        scheduler.start()
+    logger.info(f"Đã lên lịch tổng hợp doanh số mỗi {settings.SALES_ROLLUP_INTERVAL_MINUTES} phút")
@@ -0,0 +1,176 @@
+import threading
+import time
+from typing import Dict, Any, Optional
+
+from sqlalchemy import exc
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+
+# Các mốc (giây) của histogram thời gian chờ lấy kết nối
+WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+
+class PoolMetrics:
+    """
+    Bộ đếm cho một connection pool: thời gian chờ checkout, số kết nối đang dùng,
+    số lần phải mở kết nối overflow và số lần timeout.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.pool = None
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.overflow_events = 0
+        self.timeouts = 0
+        self.peak_in_use = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.wait_buckets = [0] * (len(WAIT_BUCKETS) + 1)
+
+    def record_checkout(self, wait_seconds: float, overflowed: bool, in_use: int) -> None:
+        """Ghi nhận một lần lấy kết nối thành công"""
+        with self._lock:
+            self.checkouts += 1
+            self.wait_seconds_total += wait_seconds
+            self.wait_seconds_max = max(self.wait_seconds_max, wait_seconds)
+            self.wait_buckets[self._bucket(wait_seconds)] += 1
+            self.peak_in_use = max(self.peak_in_use, in_use)
+            if overflowed:
+                self.overflow_events += 1
+
+    def record_timeout(self, wait_seconds: float) -> None:
+        """Ghi nhận một lần chờ kết nối bị timeout"""
+        with self._lock:
+            self.timeouts += 1
+            self.wait_seconds_total += wait_seconds
+            self.wait_seconds_max = max(self.wait_seconds_max, wait_seconds)
+            self.wait_buckets[-1] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Trả về trạng thái hiện tại của pool và các bộ đếm"""
+        with self._lock:
+            attempts = self.checkouts + self.timeouts
+            result = {
+                "checkouts": self.checkouts,
+                "overflow_events": self.overflow_events,
+                "timeouts": self.timeouts,
+                "peak_in_use": self.peak_in_use,
+                "wait_seconds_avg": self.wait_seconds_total / attempts if attempts else 0.0,
+                "wait_seconds_max": self.wait_seconds_max,
+                "wait_histogram": {
+                    **{f"le_{bound}": count for bound, count in zip(WAIT_BUCKETS, self.wait_buckets)},
+                    "gt_max": self.wait_buckets[-1]
+                }
+            }
+
+        pool = self.pool
+        if pool is not None:
+            result.update({
+                "pool_size": pool.size(),
+                "in_use": pool.checkedout(),
+                "idle": pool.checkedin(),
+                "overflow": max(pool.overflow(), 0)
+            })
+        return result
+
+    @staticmethod
+    def _bucket(seconds: float) -> int:
+        for i, bound in enumerate(WAIT_BUCKETS):
+            if seconds <= bound:
+                return i
+        return len(WAIT_BUCKETS)
+
+
+class SessionMetrics:
+    """Bộ đếm vòng đời session theo request: số session đang mở và thời gian giữ session"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.active = 0
+        self.duration_seconds_total = 0.0
+        self.duration_seconds_max = 0.0
+
+    def session_opened(self) -> float:
+        with self._lock:
+            self.opened += 1
+            self.active += 1
+        return time.perf_counter()
+
+    def session_closed(self, started_at: float) -> None:
+        duration = time.perf_counter() - started_at
+        with self._lock:
+            self.active -= 1
+            self.duration_seconds_total += duration
+            self.duration_seconds_max = max(self.duration_seconds_max, duration)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            closed = self.opened - self.active
+            return {
+                "opened": self.opened,
+                "active": self.active,
+                "duration_seconds_avg": self.duration_seconds_total / closed if closed else 0.0,
+                "duration_seconds_max": self.duration_seconds_max
+            }
+
+
+class _InstrumentedPoolMixin:
+    """Đo thời gian chờ trong `_do_get` của QueuePool để ghi vào PoolMetrics"""
+
+    metrics: Optional[PoolMetrics] = None
+
+    def _do_get(self):
+        start = time.perf_counter()
+        overflow_before = self._overflow
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            if self.metrics is not None:
+                self.metrics.record_timeout(time.perf_counter() - start)
+            raise
+
+        if self.metrics is not None:
+            # _overflow bắt đầu từ -pool_size, dương nghĩa là đang dùng kết nối vượt pool_size
+            overflowed = self._overflow > overflow_before and self._overflow > 0
+            self.metrics.record_checkout(time.perf_counter() - start, overflowed, self.checkedout())
+        return connection
+
+    def recreate(self):
+        # Pool được tạo lại khi engine.dispose(), giữ nguyên bộ đếm
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        if self.metrics is not None:
+            self.metrics.pool = pool
+        return pool
+
+
+class InstrumentedQueuePool(_InstrumentedPoolMixin, QueuePool):
+    pass
+
+
+class InstrumentedAsyncAdaptedQueuePool(_InstrumentedPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+# Bộ đếm theo tên engine: "primary", "async", "batch"...
+pool_metrics: Dict[str, PoolMetrics] = {}
+session_metrics = SessionMetrics()
+
+
+def instrument_engine(engine, name: str) -> PoolMetrics:
+    """Gắn PoolMetrics vào pool của một engine (sync hoặc async)"""
+    pool = engine.pool
+    metrics = PoolMetrics(name)
+    metrics.pool = pool
+    pool.metrics = metrics
+    pool_metrics[name] = metrics
+    return metrics
+
+
+def get_pool_stats() -> Dict[str, Any]:
+    """Tổng hợp số liệu của tất cả pool và session"""
+    return {
+        "pools": {name: metrics.snapshot() for name, metrics in pool_metrics.items()},
+        "sessions": session_metrics.snapshot()
+    }
@@ -0,0 +1,204 @@
+import functools
+import inspect
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+
+class ReplicaRouter:
+    """
+    Theo dõi thời điểm ghi gần nhất của từng người dùng để đảm bảo read-your-writes:
+    trong `sticky_seconds` sau khi ghi, các truy vấn đọc của người dùng đó đi vào primary
+    thay vì replica (có thể đang trễ replication).
+
+    Khi có `redis_url`, mốc ghi được lưu thêm trong Redis (khóa hết hạn sau `sticky_seconds`)
+    để mọi worker đều thấy; không có Redis thì chỉ worker đã nhận request ghi mới biết. Nếu
+    Redis lỗi thì coi như người dùng vừa ghi (đọc từ primary).
+    """
+
+    def __init__(self, sticky_seconds: int, redis_url: Optional[str] = None):
+        self.sticky_seconds = sticky_seconds
+        self._sticky_until: Dict[int, float] = {}
+        self._lock = threading.Lock()
+        self._redis = None
+        if redis_url:
+            try:
+                import redis
+
+                self._redis = redis.Redis.from_url(redis_url)
+            except ImportError:
+                logger.warning("Chưa cài đặt thư viện redis, read-your-writes chỉ có hiệu lực trong từng worker")
+
+    @property
+    def shared(self) -> bool:
+        """True nếu mốc ghi được chia sẻ giữa các worker"""
+        return self._redis is not None
+
+    def mark_write(self, user_id: Optional[int]) -> None:
+        """Ghi nhận người dùng vừa ghi dữ liệu"""
+        if user_id is None or self.sticky_seconds <= 0:
+            return
+        now = time.monotonic()
+        with self._lock:
+            self._sticky_until[user_id] = now + self.sticky_seconds
+            # Dọn các mục đã hết hạn để dict không phình to theo số người dùng
+            if len(self._sticky_until) > 10000:
+                self._sticky_until = {
+                    uid: until for uid, until in self._sticky_until.items() if until > now
+                }
+        if self._redis is not None:
+            try:
+                self._redis.set(f"rw:{user_id}", 1, ex=self.sticky_seconds)
+            except Exception as e:
+                logger.error(f"Không thể ghi mốc read-your-writes vào Redis: {str(e)}")
+
+    def is_sticky(self, user_id: Optional[int]) -> bool:
+        """Kiểm tra người dùng có đang phải đọc từ primary hay không"""
+        if user_id is None or self.sticky_seconds <= 0:
+            return False
+        until = self._sticky_until.get(user_id)
+        if until is not None and until > time.monotonic():
+            return True
+        if self._redis is None:
+            return False
+        try:
+            return bool(self._redis.exists(f"rw:{user_id}"))
+        except Exception as e:
+            logger.error(f"Không thể đọc mốc read-your-writes từ Redis: {str(e)}")
+            return True
+
+
+class RoutingSession(Session):
+    """
+    Session định tuyến truy vấn giữa primary và read replica.
+
+    Một câu SELECT chỉ được gửi tới replica khi tất cả điều kiện sau thỏa mãn:
+    - session đang ở chế độ chỉ đọc (`use_replica` / `@read_only`)
+    - có replica được cấu hình (`info["replica_bind"]`)
+    - session chưa ghi gì và không đang flush
+    - câu lệnh không có FOR UPDATE
+    - người dùng hiện tại không vừa ghi dữ liệu (read-your-writes)
+    Mọi trường hợp khác đi vào primary.
+    """
+
+    router: Optional[ReplicaRouter] = None
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        replica = self.info.get("replica_bind")
+        if (
+            replica is not None
+            and self.info.get("read_only")
+            and not self.info.get("wrote")
+            and not self._flushing
+            and clause is not None
+            and getattr(clause, "is_select", False)
+            and getattr(clause, "_for_update_arg", None) is None
+            and not self._is_sticky()
+        ):
+            return replica
+        return super().get_bind(mapper, clause=clause, **kw)
+
+    def _is_sticky(self) -> bool:
+        # Chỉ tra một lần cho mỗi người dùng trong session (với Redis là một round trip);
+        # các lần ghi của chính session đã được xử lý qua info["wrote"]
+        if self.router is None:
+            return False
+        user_id = self.info.get("user_id")
+        checked = self.info.get("sticky")
+        if checked is None or checked[0] != user_id:
+            checked = self.info["sticky"] = (user_id, self.router.is_sticky(user_id))
+        return checked[1]
+
+
+def _mark_wrote(session: Session) -> None:
+    session.info["wrote"] = True
+    if RoutingSession.router is not None:
+        RoutingSession.router.mark_write(session.info.get("user_id"))
+
+
+@event.listens_for(RoutingSession, "after_flush")
+def _after_flush(session, flush_context):
+    _mark_wrote(session)
+
+
+@event.listens_for(RoutingSession, "do_orm_execute")
+def _after_bulk_write(orm_execute_state):
+    # query.update()/delete() và insert() chạy thẳng, không qua flush
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        _mark_wrote(orm_execute_state.session)
+
+
+@contextmanager
+def use_replica(db, user_id: Optional[int] = None):
+    """
+    Cho phép các SELECT trong khối lệnh được đọc từ replica.
+
+    Parameters:
+    -----------
+    db : Session
+        Session hiện tại (RoutingSession)
+    user_id : int, optional
+        Người dùng của request, dùng để kiểm tra read-your-writes
+    """
+    previous = (db.info.get("read_only"), db.info.get("user_id"))
+    db.info["read_only"] = True
+    if user_id is not None:
+        db.info["user_id"] = user_id
+    try:
+        yield db
+    finally:
+        db.info["read_only"], user = previous
+        # Không để user_id của khối lệnh còn lại trong session (lần ghi sau sẽ bị gán nhầm người dùng)
+        if user is None:
+            db.info.pop("user_id", None)
+        else:
+            db.info["user_id"] = user
+
+
+@contextmanager
+def use_primary(db):
+    """
+    Buộc các truy vấn trong khối lệnh đọc từ primary, kể cả khi đang nằm trong `use_replica`
+    (ví dụ dữ liệu dùng chung cho cả tiến trình không được dựng từ replica đang trễ).
+    """
+    previous = db.info.get("read_only")
+    db.info["read_only"] = False
+    try:
+        yield db
+    finally:
+        db.info["read_only"] = previous
+
+
+def read_only(func=None, *, user_arg: Optional[str] = None):
+    """
+    Decorator cho các phương thức chỉ đọc của service (có thuộc tính `self.db`).
+
+    Parameters:
+    -----------
+    user_arg : str, optional
+        Tên tham số chứa user_id (hoặc đối tượng có thuộc tính user_id, ví dụ Principal)
+        của phương thức, để người dùng vừa ghi dữ liệu vẫn đọc từ primary
+    """
+    def decorator(method):
+        signature = inspect.signature(method)
+
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            user_id = None
+            if user_arg is not None:
+                bound = signature.bind_partial(self, *args, **kwargs)
+                user_id = bound.arguments.get(user_arg)
+                user_id = getattr(user_id, "user_id", user_id)
+            with use_replica(self.db, user_id):
+                return method(self, *args, **kwargs)
+
+        return wrapper
+
+    return decorator(func) if func is not None else decorator
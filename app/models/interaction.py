@@ -55,6 +55,32 @@ class Rating(Base):
     user = relationship("User", back_populates="ratings")
     product = relationship("Product", back_populates="ratings")
 
+class ProductRatingStats(Base):
+    """Tổng hợp đánh giá của một sản phẩm, được cập nhật cộng dồn mỗi khi có đánh giá mới/sửa"""
+    __tablename__ = "product_rating_stats"
+    
+    product_id = Column(Integer, ForeignKey("products.product_id"), primary_key=True)
+    rating_sum = Column(Integer, nullable=False, default=0)
+    rating_count = Column(Integer, nullable=False, default=0)
+    # Số lượt đánh giá theo từng mức sao
+    count_1 = Column(Integer, nullable=False, default=0)
+    count_2 = Column(Integer, nullable=False, default=0)
+    count_3 = Column(Integer, nullable=False, default=0)
+    count_4 = Column(Integer, nullable=False, default=0)
+    count_5 = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # Relationships
+    product = relationship("Product", back_populates="rating_stats")
+    
+    @property
+    def average(self) -> float:
+        return self.rating_sum / self.rating_count if self.rating_count else 0.0
+    
+    @property
+    def histogram(self) -> dict:
+        return {star: getattr(self, f"count_{star}") or 0 for star in range(1, 6)}
+
 class SearchHistory(Base):
     __tablename__ = "search_history"
     
@@ -1,5 +1,5 @@
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, Float, JSON, ForeignKey, DateTime, Enum
+from sqlalchemy import Column, Integer, String, Float, JSON, ForeignKey, DateTime, Date, Enum, Index
 from sqlalchemy.orm import relationship
 import enum
 
@@ -45,4 +45,36 @@ class OrderItem(Base):
     
     # Relationships
     order = relationship("Order", back_populates="order_items")
-    product = relationship("Product", back_populates="order_items")
\ No newline at end of file
+    product = relationship("Product", back_populates="order_items")
+
+class ProductSalesDaily(Base):
+    """Doanh số theo ngày của từng sản phẩm (không tính đơn đã hủy), được cộng dồn bởi SalesRollupAggregator"""
+    __tablename__ = "product_sales_daily"
+    
+    day = Column(Date, primary_key=True)
+    product_id = Column(Integer, ForeignKey("products.product_id"), primary_key=True)
+    units = Column(Integer, nullable=False, default=0)
+    revenue = Column(Float, nullable=False, default=0.0)
+    orders = Column(Integer, nullable=False, default=0)
+    
+    __table_args__ = (
+        Index('idx_product_sales_product_day', product_id, day),
+    )
+
+class CategorySalesDaily(Base):
+    """Doanh số theo ngày của từng danh mục (theo danh mục của sản phẩm tại thời điểm tổng hợp)"""
+    __tablename__ = "category_sales_daily"
+    
+    day = Column(Date, primary_key=True)
+    category_id = Column(Integer, ForeignKey("categories.category_id"), primary_key=True)
+    units = Column(Integer, nullable=False, default=0)
+    revenue = Column(Float, nullable=False, default=0.0)
+    orders = Column(Integer, nullable=False, default=0)
+
+class SalesRollupWatermark(Base):
+    """order_id lớn nhất đã được cộng vào các bảng doanh số theo ngày"""
+    __tablename__ = "sales_rollup_watermarks"
+    
+    name = Column(String(50), primary_key=True)
+    last_order_id = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
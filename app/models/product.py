@@ -18,6 +18,8 @@ class Category(Base):
     category_id = Column(Integer, primary_key=True, index=True)
     name = Column(String(100), nullable=False)
     description = Column(Text)
+    # Danh mục cha (NULL nếu là danh mục gốc)
+    parent_id = Column(Integer, ForeignKey("categories.category_id"), nullable=True, index=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -45,6 +47,7 @@ class Product(Base):
     cart_items = relationship("CartItem", back_populates="product")
     view_history = relationship("ViewHistory", back_populates="product")
     ratings = relationship("Rating", back_populates="product")
+    rating_stats = relationship("ProductRatingStats", back_populates="product", uselist=False)
     
     # Many-to-many relationship with tags
     tags = relationship("Tag", secondary=product_tag, back_populates="products")
@@ -1,11 +1,14 @@
 from typing import List, Optional, Dict, Any, Tuple
 from datetime import datetime
 from sqlalchemy.orm import Session
-from sqlalchemy import desc
+from sqlalchemy import desc, func, literal, union_all, select
 
 from app.repositories import BaseRepository
 from app.models.recommendation import ProductSimilarity, UserRecommendation
 from app.models.user import User
+from app.models.interaction import ViewHistory, Rating
+from app.models.order import Order, OrderItem, OrderStatus
+from app.repositories.order_repository import SalesRollupRepository
 
 class ProductSimilarityRepository(BaseRepository[ProductSimilarity]):
     def __init__(self, db: Session):
@@ -44,14 +47,14 @@ class UserRecommendationRepository(BaseRepository[UserRecommendation]):
     def __init__(self, db: Session):
         super().__init__(db, UserRecommendation)
     
-    def get_recommendations_for_user(self, user: User, limit: int = 20) -> List[Tuple[int, float]]:
+    def get_recommendations_for_user(self, user_id: int, limit: int = 20) -> List[Tuple[int, float]]:
         """
         Lấy danh sách ID sản phẩm được gợi ý cho người dùng
         
         Parameters:
         -----------
-        user : User
-            Đối tượng User cần lấy gợi ý
+        user_id : int
+            ID của người dùng cần lấy gợi ý
         limit : int
             Số lượng gợi ý tối đa cần trả về
         
@@ -64,13 +67,33 @@ class UserRecommendationRepository(BaseRepository[UserRecommendation]):
             UserRecommendation.product_id, 
             UserRecommendation.recommendation_score
         ).filter(
-            UserRecommendation.user_id == user.user_id
+            UserRecommendation.user_id == user_id
         ).order_by(
             UserRecommendation.rank
         ).limit(limit).all()
         
         return [(r.product_id, r.recommendation_score) for r in results]
     
+    def get_recommendations_for_users(self, user_ids: List[int], limit: int = 20) -> Dict[int, List[Tuple[int, float]]]:
+        """Lấy top `limit` gợi ý của nhiều người dùng trong một truy vấn"""
+        if not user_ids:
+            return {}
+        results = self.db.query(
+            UserRecommendation.user_id,
+            UserRecommendation.product_id,
+            UserRecommendation.recommendation_score
+        ).filter(
+            UserRecommendation.user_id.in_(user_ids),
+            UserRecommendation.rank <= limit
+        ).order_by(
+            UserRecommendation.user_id, UserRecommendation.rank
+        ).all()
+        
+        recommendations: Dict[int, List[Tuple[int, float]]] = {}
+        for r in results:
+            recommendations.setdefault(r.user_id, []).append((r.product_id, r.recommendation_score))
+        return recommendations
+    
     def batch_upsert(self, recommendation_data: List[Dict[str, Any]]) -> None:
         """Cập nhật hoặc chèn hàng loạt dữ liệu gợi ý sản phẩm cho người dùng"""
         # Xóa tất cả gợi ý hiện có trước khi chèn mới
@@ -90,4 +113,118 @@ class UserRecommendationRepository(BaseRepository[UserRecommendation]):
     def delete_all(self) -> None:
         """Xóa tất cả dữ liệu gợi ý"""
         self.db.query(UserRecommendation).delete()
-        self.db.commit()
\ No newline at end of file
+        self.db.commit()
+
+class PopularitySignalRepository:
+    """Truy vấn tín hiệu phổ biến (xem, đánh giá, mua) để tính bảng xếp hạng popularity/trending"""
+    
+    def __init__(self, db: Session):
+        self.db = db
+    
+    def get_daily_signals(
+        self,
+        since: datetime,
+        view_weight: float,
+        rating_weight: float,
+        order_weight: float
+    ) -> List[Tuple[int, Any, float]]:
+        """
+        Lấy tổng trọng số tương tác theo (sản phẩm, ngày) trong một truy vấn UNION ALL duy nhất
+        
+        Parameters:
+        -----------
+        since : datetime
+            Chỉ lấy tương tác từ thời điểm này
+        view_weight, rating_weight, order_weight : float
+            Trọng số cho mỗi lượt xem, mỗi điểm đánh giá (chia 5) và mỗi sản phẩm được mua
+        
+        Returns:
+        --------
+        List[Tuple[int, Any, float]]
+            Danh sách (product_id, ngày, tổng trọng số)
+        """
+        views = select(
+            ViewHistory.product_id.label("product_id"),
+            func.date(ViewHistory.view_timestamp).label("day"),
+            (func.count() * literal(view_weight)).label("weight")
+        ).where(
+            ViewHistory.view_timestamp >= since
+        ).group_by(ViewHistory.product_id, func.date(ViewHistory.view_timestamp))
+        
+        ratings = select(
+            Rating.product_id.label("product_id"),
+            func.date(Rating.created_at).label("day"),
+            (func.sum(Rating.score) * literal(rating_weight / 5.0)).label("weight")
+        ).where(
+            Rating.created_at >= since
+        ).group_by(Rating.product_id, func.date(Rating.created_at))
+        
+        # Lượt mua lấy từ bảng doanh số theo ngày (cộng các đơn chưa được tổng hợp)
+        purchases = SalesRollupRepository(self.db).daily_units_selects(since.date(), order_weight)
+        
+        signals = union_all(views, ratings, *purchases).subquery()
+        rows = self.db.execute(
+            select(signals.c.product_id, signals.c.day, signals.c.weight)
+        ).all()
+        
+        return [(r.product_id, r.day, float(r.weight or 0)) for r in rows]
+
+class UserInteractionRepository:
+    """Truy vấn tương tác của một người dùng để tính vector người dùng (fold-in) khi phục vụ gợi ý"""
+    
+    def __init__(self, db: Session):
+        self.db = db
+    
+    def get_interaction_summary(self, user_id: int) -> List[Tuple[int, int, Optional[float], bool]]:
+        """
+        Lấy tóm tắt tương tác theo sản phẩm của người dùng trong một truy vấn UNION ALL
+        
+        Returns:
+        --------
+        List[Tuple[int, int, Optional[float], bool]]
+            Danh sách (product_id, số lượt xem, điểm đánh giá cao nhất, đã mua hay chưa)
+        """
+        views = select(
+            ViewHistory.product_id.label("product_id"),
+            func.count().label("views"),
+            literal(None).label("rating"),
+            literal(0).label("purchased")
+        ).where(
+            ViewHistory.user_id == user_id
+        ).group_by(ViewHistory.product_id)
+        
+        ratings = select(
+            Rating.product_id.label("product_id"),
+            literal(0).label("views"),
+            func.max(Rating.score).label("rating"),
+            literal(0).label("purchased")
+        ).where(
+            Rating.user_id == user_id
+        ).group_by(Rating.product_id)
+        
+        purchases = select(
+            OrderItem.product_id.label("product_id"),
+            literal(0).label("views"),
+            literal(None).label("rating"),
+            literal(1).label("purchased")
+        ).join(
+            Order, Order.order_id == OrderItem.order_id
+        ).where(
+            Order.user_id == user_id,
+            Order.status != OrderStatus.CANCELLED
+        ).group_by(OrderItem.product_id)
+        
+        interactions = union_all(views, ratings, purchases).subquery()
+        rows = self.db.execute(
+            select(
+                interactions.c.product_id,
+                func.sum(interactions.c.views),
+                func.max(interactions.c.rating),
+                func.max(interactions.c.purchased)
+            ).group_by(interactions.c.product_id)
+        ).all()
+        
+        return [
+            (r[0], int(r[1] or 0), float(r[2]) if r[2] is not None else None, bool(r[3]))
+            for r in rows
+        ]
@@ -0,0 +1,67 @@
+from typing import List, Optional
+
+import numpy as np
+
+
+def mmr_rerank(
+    relevance: np.ndarray,
+    vectors: np.ndarray,
+    limit: int,
+    mmr_lambda: float = 0.7,
+    categories: Optional[np.ndarray] = None,
+    max_per_category: Optional[int] = None
+) -> List[int]:
+    """
+    Sắp xếp lại ứng viên bằng Maximal Marginal Relevance (MMR).
+
+    Ở mỗi bước chọn ứng viên có điểm `λ * relevance - (1 - λ) * max(sim với các mục đã chọn)`,
+    nên các sản phẩm gần như trùng lặp với mục đã chọn bị đẩy xuống. Ma trận tương tự giữa
+    các ứng viên được tính một lần (n x n, n ~ 50) bằng một phép nhân ma trận.
+
+    Parameters:
+    -----------
+    relevance : np.ndarray
+        Điểm liên quan của từng ứng viên (n,)
+    vectors : np.ndarray
+        Vector đặc trưng đã chuẩn hóa của ứng viên (n, k); dòng toàn 0 nếu không có vector
+    limit : int
+        Số ứng viên cần chọn
+    mmr_lambda : float
+        1.0 = chỉ theo độ liên quan, càng nhỏ càng ưu tiên đa dạng
+    categories : np.ndarray, optional
+        Danh mục của từng ứng viên, dùng với `max_per_category`
+    max_per_category : int, optional
+        Số ứng viên tối đa được chọn từ một danh mục
+
+    Returns:
+    --------
+    List[int]
+        Chỉ số các ứng viên được chọn theo thứ tự
+    """
+    n = len(relevance)
+    if n == 0 or limit <= 0:
+        return []
+
+    similarity = vectors @ vectors.T
+    max_similarity = np.zeros(n, dtype=np.float64)
+    available = np.ones(n, dtype=bool)
+    category_counts = {}
+    selected: List[int] = []
+
+    while len(selected) < limit and available.any():
+        # Chưa chọn gì thì chỉ xét độ liên quan
+        penalty = max_similarity if selected else 0.0
+        scores = np.where(available, mmr_lambda * relevance - (1 - mmr_lambda) * penalty, -np.inf)
+        best = int(np.argmax(scores))
+        available[best] = False
+
+        if categories is not None and max_per_category is not None:
+            category = int(categories[best])
+            if category_counts.get(category, 0) >= max_per_category:
+                continue
+            category_counts[category] = category_counts.get(category, 0) + 1
+
+        selected.append(best)
+        max_similarity = np.maximum(max_similarity, similarity[:, best])
+
+    return selected
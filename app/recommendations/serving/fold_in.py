@@ -0,0 +1,122 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Tuple, Optional
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.recommendations.repositories.recommendation_repository import UserInteractionRepository
+from app.recommendations.serving.model_store import ModelStore, model_store
+from app.recommendations.training.data_preprocessor import DataPreprocessor
+
+# Số gợi ý được tính và lưu cache cho mỗi người dùng
+FOLD_IN_TOP_K = 100
+
+
+class FoldInRecommender:
+    """
+    Gợi ý cá nhân hóa cho người dùng chưa có trong lần huấn luyện gần nhất.
+
+    Vector người dùng được giải bằng ridge least squares trên item factors cố định:
+    u = (VᵀV + λI)⁻¹ Vᵀx, với x là điểm tương tác của người dùng (cùng cách tính điểm như
+    DataPreprocessor). Toàn bộ catalog được chấm điểm bằng một phép nhân V·u rồi lấy top-k.
+    Kết quả được cache theo người dùng trong `ttl_seconds` và theo phiên bản mô hình.
+    """
+
+    def __init__(
+        self,
+        store: ModelStore = model_store,
+        regularization: float = settings.FOLD_IN_REGULARIZATION,
+        ttl_seconds: int = settings.FOLD_IN_CACHE_TTL_SECONDS,
+        max_users: int = settings.FOLD_IN_CACHE_MAX_USERS
+    ):
+        self.store = store
+        self.regularization = regularization
+        self.ttl_seconds = ttl_seconds
+        self.max_users = max_users
+        # user_id -> (phiên bản mô hình, thời điểm hết hạn, danh sách gợi ý)
+        self._cache: "OrderedDict[int, Tuple[str, float, List[Tuple[int, float]]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def recommend(self, db: Session, user_id: int, limit: int = 20) -> List[Tuple[int, float]]:
+        """
+        Gợi ý sản phẩm bằng fold-in từ các tương tác hiện có của người dùng
+
+        Parameters:
+        -----------
+        db : Session
+            Database session (chỉ dùng khi cache hết hạn)
+        user_id : int
+            ID của người dùng
+        limit : int
+            Số lượng sản phẩm tối đa
+
+        Returns:
+        --------
+        List[Tuple[int, float]]
+            Danh sách (product_id, điểm dự đoán) giảm dần; rỗng nếu chưa có mô hình hoặc tương tác
+        """
+        model = self.store.get()
+        if model is None:
+            return []
+
+        now = time.monotonic()
+        with self._lock:
+            cached = self._cache.get(user_id)
+            if cached is not None and cached[0] == model.trained_at and cached[1] > now:
+                self._cache.move_to_end(user_id)
+                return cached[2][:limit]
+
+        ranked = self._fold_in(db, model, user_id)
+
+        with self._lock:
+            self._cache[user_id] = (model.trained_at, now + self.ttl_seconds, ranked)
+            self._cache.move_to_end(user_id)
+            while len(self._cache) > self.max_users:
+                self._cache.popitem(last=False)
+        return ranked[:limit]
+
+    def invalidate(self, user_id: Optional[int] = None) -> None:
+        """Xóa cache của một người dùng (hoặc toàn bộ)"""
+        with self._lock:
+            if user_id is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(user_id, None)
+
+    def _fold_in(self, db: Session, model, user_id: int) -> List[Tuple[int, float]]:
+        rows, values = [], []
+        for product_id, views, rating, purchased in UserInteractionRepository(db).get_interaction_summary(user_id):
+            row = model.index.get(product_id)
+            if row is None:
+                continue
+            # Giống DataPreprocessor: lấy điểm lớn nhất trong các loại tương tác
+            score = max(
+                views * DataPreprocessor.VIEW_SCORE,
+                rating or 0.0,
+                DataPreprocessor.PURCHASE_SCORE if purchased else 0.0
+            )
+            if score > 0:
+                rows.append(row)
+                values.append(score)
+
+        if not rows:
+            return []
+
+        rows = np.asarray(rows, dtype=np.int64)
+        x = np.asarray(values, dtype=np.float32)
+        n_factors = model.factors.shape[1]
+        user_vector = np.linalg.solve(
+            model.gram + self.regularization * np.eye(n_factors, dtype=np.float32),
+            model.factors[rows].T @ x
+        )
+
+        scores = model.factors @ user_vector
+        top = model.top_k(scores, FOLD_IN_TOP_K, exclude_rows=rows)
+        return [(int(model.product_ids[i]), float(scores[i])) for i in top]
+
+
+# Fold-in recommender dùng chung cho toàn bộ tiến trình
+fold_in_recommender = FoldInRecommender()
@@ -0,0 +1,137 @@
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Any, Optional, Iterable
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.response_cache import response_cache
+
+logger = logging.getLogger(__name__)
+
+MODEL_FILENAME = "item_factors.npz"
+
+
+class ItemFactorModel:
+    """
+    Item factors của một lần huấn luyện, giữ trong bộ nhớ để phục vụ gợi ý thời gian thực.
+    Đối tượng không bị thay đổi sau khi tạo; lần huấn luyện mới tạo ra một đối tượng mới.
+    """
+
+    def __init__(self, product_ids: np.ndarray, factors: np.ndarray, trained_at: str):
+        self.product_ids = product_ids.astype(np.int64)
+        self.factors = factors.astype(np.float32)
+        self.trained_at = trained_at
+        norms = np.linalg.norm(self.factors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        # Vector đã chuẩn hóa để tính cosine bằng một phép nhân ma trận
+        self.unit_factors = self.factors / norms
+        self.index = {int(pid): i for i, pid in enumerate(self.product_ids)}
+        # Ma trận Gram VᵀV (k x k) dùng cho fold-in người dùng mới
+        self.gram = self.factors.T @ self.factors
+
+    def __len__(self) -> int:
+        return len(self.product_ids)
+
+    def rows(self, product_ids: Iterable[int]) -> np.ndarray:
+        """Chỉ số dòng của các sản phẩm có trong mô hình (bỏ qua sản phẩm chưa được huấn luyện)"""
+        return np.array(
+            [self.index[pid] for pid in product_ids if pid in self.index], dtype=np.int64
+        )
+
+    def top_k(self, scores: np.ndarray, k: int, exclude_rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Lấy chỉ số k dòng có điểm cao nhất (argpartition rồi mới sắp xếp phần đầu)"""
+        if exclude_rows is not None and len(exclude_rows):
+            scores = scores.copy()
+            scores[exclude_rows] = -np.inf
+        k = min(k, int(np.isfinite(scores).sum()))
+        if k <= 0:
+            return np.array([], dtype=np.int64)
+        top = np.argpartition(-scores, k - 1)[:k]
+        return top[np.argsort(-scores[top])]
+
+
+class ModelStore:
+    """
+    Lưu và nạp item factors của mô hình gợi ý.
+
+    TrainingJob gọi `publish` sau mỗi lần huấn luyện: factors được ghi ra file (ghi file tạm
+    rồi đổi tên để không bao giờ đọc phải file ghi dở) và thay thế mô hình trong bộ nhớ.
+    Các worker khác phát hiện file mới qua mtime và tự nạp lại.
+    """
+
+    def __init__(self, model_dir: str = settings.RECOMMENDATION_MODEL_DIR, check_interval: float = 5.0):
+        self.path = os.path.join(model_dir, MODEL_FILENAME)
+        self.check_interval = check_interval
+        self._model: Optional[ItemFactorModel] = None
+        self._mtime: Optional[float] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self) -> Optional[ItemFactorModel]:
+        """Lấy mô hình hiện tại, nạp lại từ file nếu có phiên bản mới hơn"""
+        now = time.monotonic()
+        if now - self._checked_at >= self.check_interval:
+            self._checked_at = now
+            try:
+                mtime = os.path.getmtime(self.path)
+            except OSError:
+                mtime = None
+            if mtime is not None and mtime != self._mtime:
+                self._load(mtime)
+        return self._model
+
+    def publish(self, model_result: Dict[str, Any]) -> Optional[ItemFactorModel]:
+        """
+        Lưu item factors từ kết quả huấn luyện và đưa vào phục vụ ngay
+
+        Parameters:
+        -----------
+        model_result : Dict[str, Any]
+            Kết quả của MatrixFactorizationTrainer.train
+        """
+        item_factors = model_result.get('item_factors')
+        if item_factors is None or len(item_factors) == 0:
+            logger.warning("Không có item factors để lưu vào model store")
+            return None
+
+        reverse_product_map = model_result['reverse_product_map']
+        product_ids = np.array([reverse_product_map[i] for i in range(len(item_factors))], dtype=np.int64)
+        trained_at = datetime.utcnow().isoformat()
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp.npz"
+        np.savez(tmp_path, product_ids=product_ids, factors=item_factors, trained_at=trained_at)
+        os.replace(tmp_path, self.path)
+
+        model = ItemFactorModel(product_ids, np.asarray(item_factors), trained_at)
+        with self._lock:
+            self._model = model
+            self._mtime = os.path.getmtime(self.path)
+        # Gợi ý sản phẩm tương tự đã cache được tính từ mô hình cũ
+        response_cache.invalidate("recommendations")
+        logger.info(f"Đã lưu item factors của {len(model)} sản phẩm vào {self.path}")
+        return model
+
+    def _load(self, mtime: float) -> None:
+        try:
+            with np.load(self.path) as data:
+                model = ItemFactorModel(data['product_ids'], data['factors'], str(data['trained_at']))
+        except Exception as e:
+            logger.error(f"Không thể nạp item factors từ {self.path}: {str(e)}")
+            return
+
+        with self._lock:
+            self._model = model
+            self._mtime = mtime
+        # Với cache dùng chung, worker đã publish mô hình vô hiệu hóa cache một lần là đủ
+        if not response_cache.is_shared:
+            response_cache.invalidate("recommendations")
+        logger.info(f"Đã nạp item factors của {len(model)} sản phẩm (huấn luyện lúc {model.trained_at})")
+
+
+# Model store dùng chung cho toàn bộ tiến trình
+model_store = ModelStore()
@@ -0,0 +1,207 @@
+import logging
+import threading
+import time
+from datetime import datetime, date, timedelta
+from typing import Dict, List, Tuple, Optional, Iterable
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.recommendations.repositories.recommendation_repository import PopularitySignalRepository
+from app.services.catalog_snapshot import catalog_snapshot
+
+logger = logging.getLogger(__name__)
+
+# Các loại bảng xếp hạng được tính trong một lần duyệt dữ liệu
+RANKING_KINDS = ("popular", "trending")
+
+
+class PopularityRanking:
+    """
+    Bảng xếp hạng sản phẩm đã sắp xếp sẵn (toàn bộ và theo từng danh mục).
+    Đối tượng không bị thay đổi sau khi tạo nên có thể đọc đồng thời không cần khóa.
+    """
+
+    def __init__(self, product_ids: np.ndarray, scores: np.ndarray, category_ids: np.ndarray):
+        self.product_ids = product_ids
+        self.scores = scores
+        self.by_category: Dict[int, np.ndarray] = {
+            int(cid): np.flatnonzero(category_ids == cid) for cid in np.unique(category_ids)
+        }
+
+    def top(
+        self,
+        limit: int,
+        category_id: Optional[int] = None,
+        exclude: Optional[Iterable[int]] = None
+    ) -> List[Tuple[int, float]]:
+        """Lấy `limit` sản phẩm đứng đầu, có thể lọc theo danh mục và loại trừ một số sản phẩm"""
+        if category_id is not None:
+            rows = self.by_category.get(category_id)
+            if rows is None:
+                return []
+        else:
+            rows = np.arange(len(self.product_ids))
+
+        if exclude:
+            rows = rows[~np.isin(self.product_ids[rows], np.fromiter(exclude, dtype=np.int64))]
+
+        rows = rows[:limit]
+        return [(int(pid), float(score)) for pid, score in zip(self.product_ids[rows], self.scores[rows])]
+
+
+class PopularityEngine:
+    """
+    Tính điểm phổ biến có suy giảm theo thời gian từ lượt xem, đánh giá và đơn hàng.
+
+    Mỗi tương tác đóng góp `trọng số * 0.5 ** (tuổi / chu kỳ bán rã)`. Bảng "popular" dùng
+    chu kỳ bán rã dài, "trending" dùng chu kỳ ngắn để ưu tiên sản phẩm đang tăng nhanh.
+    Cả hai được tính từ cùng một truy vấn gộp theo ngày và được giữ trong bộ nhớ
+    `ttl_seconds` giây, nên mỗi lần gợi ý chỉ là một phép tra cứu mảng.
+
+    Chỉ một thread tính lại tại một thời điểm: khi bảng xếp hạng hết hạn, một request tính
+    lại còn các request khác tiếp tục dùng bảng cũ, thay vì cùng chạy truy vấn gộp 90 ngày.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: int = settings.POPULARITY_TTL_SECONDS,
+        window_days: int = settings.POPULARITY_WINDOW_DAYS,
+        half_lives: Optional[Dict[str, float]] = None
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.window_days = window_days
+        self.half_lives = half_lives or {
+            "popular": settings.POPULARITY_HALF_LIFE_DAYS,
+            "trending": settings.TRENDING_HALF_LIFE_DAYS
+        }
+        self._rankings: Optional[Dict[str, PopularityRanking]] = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+        self._rebuild_lock = threading.Lock()
+
+    def _expired(self) -> bool:
+        return time.monotonic() - self._loaded_at > self.ttl_seconds
+
+    def get(self, db: Session) -> Dict[str, PopularityRanking]:
+        """
+        Lấy các bảng xếp hạng hiện tại. Nếu chưa có thì tính (các request đồng thời chờ một
+        lần tính); nếu đã hết hạn thì một request tính lại, các request khác dùng bảng cũ.
+        """
+        rankings = self._rankings
+        if rankings is not None and not self._expired():
+            return rankings
+
+        if rankings is None:
+            with self._rebuild_lock:
+                # Thread khác có thể vừa tính xong trong lúc chờ
+                rankings = self._rankings
+                if rankings is None:
+                    rankings = self._rebuild(db)
+            return rankings
+
+        if not self._rebuild_lock.acquire(blocking=False):
+            return rankings
+        try:
+            # Thread khác có thể vừa tính xong trước khi lấy được khóa
+            rankings = self._rankings
+            return rankings if rankings is not None and not self._expired() else self._rebuild(db)
+        finally:
+            self._rebuild_lock.release()
+
+    def rebuild(self, db: Session) -> Dict[str, PopularityRanking]:
+        """Tính lại toàn bộ bảng xếp hạng từ cơ sở dữ liệu"""
+        with self._rebuild_lock:
+            return self._rebuild(db)
+
+    def _rebuild(self, db: Session) -> Dict[str, PopularityRanking]:
+        today = datetime.utcnow().date()
+        rows = PopularitySignalRepository(db).get_daily_signals(
+            since=datetime.combine(today - timedelta(days=self.window_days), datetime.min.time()),
+            view_weight=settings.POPULARITY_VIEW_WEIGHT,
+            rating_weight=settings.POPULARITY_RATING_WEIGHT,
+            order_weight=settings.POPULARITY_ORDER_WEIGHT
+        )
+
+        # Chỉ xếp hạng sản phẩm đang hoạt động, lấy danh mục từ snapshot danh mục
+        columns = catalog_snapshot.get(db)
+        positions, ages, weights = [], [], []
+        for product_id, day, weight in rows:
+            row = columns.index.get(product_id)
+            if row is None:
+                continue
+            positions.append(row)
+            ages.append((today - self._to_date(day)).days)
+            weights.append(weight)
+
+        positions = np.asarray(positions, dtype=np.int64)
+        ages = np.maximum(np.asarray(ages, dtype=np.float64), 0.0)
+        weights = np.asarray(weights, dtype=np.float64)
+        # Sản phẩm chưa có tương tác được xếp sau cùng theo thứ tự mới nhất
+        recency = np.nan_to_num(columns.created_at, nan=0.0)
+
+        rankings = {}
+        for kind in RANKING_KINDS:
+            scores = np.zeros(len(columns), dtype=np.float64)
+            np.add.at(scores, positions, weights * 0.5 ** (ages / self.half_lives[kind]))
+            order = np.lexsort((-recency, -scores))
+            rankings[kind] = PopularityRanking(
+                columns.product_ids[order], scores[order], columns.category_ids[order]
+            )
+
+        with self._lock:
+            self._rankings = rankings
+            self._loaded_at = time.monotonic()
+
+        logger.info(f"Đã tính lại bảng xếp hạng phổ biến từ {len(rows)} nhóm tương tác")
+        return rankings
+
+    def invalidate(self) -> None:
+        """Đánh dấu bảng xếp hạng cần tính lại ở lần đọc tiếp theo"""
+        with self._lock:
+            self._rankings = None
+
+    def top(
+        self,
+        db: Session,
+        kind: str = "popular",
+        limit: int = 20,
+        category_id: Optional[int] = None,
+        exclude: Optional[Iterable[int]] = None
+    ) -> List[Tuple[int, float]]:
+        """
+        Lấy danh sách sản phẩm phổ biến nhất
+
+        Parameters:
+        -----------
+        db : Session
+            Database session (chỉ dùng khi cần tính lại)
+        kind : str
+            'popular' hoặc 'trending'
+        limit : int
+            Số sản phẩm tối đa
+        category_id : int, optional
+            Chỉ lấy sản phẩm trong danh mục này
+        exclude : Iterable[int], optional
+            Các sản phẩm cần loại trừ (ví dụ: đã xem/đã mua)
+
+        Returns:
+        --------
+        List[Tuple[int, float]]
+            Danh sách (product_id, điểm) theo thứ tự giảm dần
+        """
+        return self.get(db)[kind].top(limit, category_id=category_id, exclude=exclude)
+
+    @staticmethod
+    def _to_date(day) -> date:
+        # DATE() trả về date trên MySQL nhưng trả về chuỗi trên SQLite
+        if isinstance(day, datetime):
+            return day.date()
+        if isinstance(day, date):
+            return day
+        return date.fromisoformat(str(day))
+
+
+# Engine dùng chung cho toàn bộ tiến trình
+popularity_engine = PopularityEngine()
@@ -0,0 +1,103 @@
+from typing import List, Tuple, Optional, Iterable
+
+import numpy as np
+
+from app.services.catalog_snapshot import CatalogColumns
+
+
+class BusinessRuleReranker:
+    """
+    Bước re-rank áp dụng các quy tắc nghiệp vụ lên danh sách ứng viên đã over-fetch.
+
+    Ứng viên chính được xét trước, ứng viên dự phòng (ví dụ: sản phẩm phổ biến) được nối
+    vào sau để bù khi bộ lọc loại bớt. Trạng thái sản phẩm (đang bán, tồn kho, giá, danh mục)
+    lấy từ snapshot dạng cột nên mọi bộ lọc là các phép toán mảng NumPy, không truy vấn DB.
+    """
+
+    def rerank(
+        self,
+        columns: CatalogColumns,
+        candidates: List[Tuple[int, float]],
+        limit: int,
+        fallback: Optional[List[Tuple[int, float]]] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        max_per_category: Optional[int] = None,
+        require_in_stock: bool = True,
+        exclude: Optional[Iterable[int]] = None
+    ) -> List[Tuple[int, float]]:
+        """
+        Lọc và sắp xếp lại ứng viên, trả về tối đa `limit` sản phẩm
+
+        Parameters:
+        -----------
+        columns : CatalogColumns
+            Snapshot các sản phẩm đang hoạt động
+        candidates : List[Tuple[int, float]]
+            Ứng viên chính (product_id, điểm) theo thứ tự ưu tiên
+        limit : int
+            Số lượng sản phẩm cần trả về
+        fallback : List[Tuple[int, float]], optional
+            Ứng viên dự phòng để bù cho đủ `limit`
+        min_price, max_price : float, optional
+            Khoảng giá cho phép
+        max_per_category : int, optional
+            Số sản phẩm tối đa của một danh mục (đa dạng hóa kết quả)
+        require_in_stock : bool
+            Loại các sản phẩm đã hết hàng
+        exclude : Iterable[int], optional
+            Các sản phẩm không được gợi ý
+
+        Returns:
+        --------
+        List[Tuple[int, float]]
+            Danh sách (product_id, điểm) sau khi re-rank
+        """
+        pool = list(candidates) + list(fallback or [])
+        if not pool or limit <= 0:
+            return []
+
+        ids = np.fromiter((product_id for product_id, _ in pool), dtype=np.int64, count=len(pool))
+        scores = np.fromiter((score for _, score in pool), dtype=np.float64, count=len(pool))
+
+        # Giữ lần xuất hiện đầu tiên của mỗi sản phẩm (ứng viên chính được ưu tiên)
+        _, first = np.unique(ids, return_index=True)
+        keep = np.zeros(len(ids), dtype=bool)
+        keep[first] = True
+
+        # Sản phẩm không có trong snapshot là đã ngừng hoạt động hoặc đã bị xóa
+        rows = np.fromiter((columns.index.get(int(pid), -1) for pid in ids), dtype=np.int64, count=len(ids))
+        keep &= rows >= 0
+        safe_rows = np.where(rows >= 0, rows, 0)
+
+        if require_in_stock:
+            keep &= columns.stock_quantities[safe_rows] > 0
+        if min_price is not None:
+            keep &= columns.prices[safe_rows] >= min_price
+        if max_price is not None:
+            keep &= columns.prices[safe_rows] <= max_price
+        if exclude:
+            keep &= ~np.isin(ids, np.fromiter(exclude, dtype=np.int64))
+
+        selected = np.flatnonzero(keep)
+        if max_per_category is not None and len(selected):
+            ranks = self._rank_within_group(columns.category_ids[safe_rows[selected]])
+            selected = selected[ranks < max_per_category]
+
+        selected = selected[:limit]
+        return [(int(ids[i]), float(scores[i])) for i in selected]
+
+    @staticmethod
+    def _rank_within_group(groups: np.ndarray) -> np.ndarray:
+        """Thứ tự xuất hiện (0, 1, 2...) của mỗi phần tử trong nhóm của nó, giữ nguyên thứ tự gốc"""
+        order = np.argsort(groups, kind="stable")
+        sorted_groups = groups[order]
+        starts = np.flatnonzero(np.r_[True, sorted_groups[1:] != sorted_groups[:-1]])
+        group_start = starts[np.searchsorted(starts, np.arange(len(groups)), side="right") - 1]
+        ranks = np.empty(len(groups), dtype=np.int64)
+        ranks[order] = np.arange(len(groups)) - group_start
+        return ranks
+
+
+# Reranker dùng chung (không có trạng thái)
+reranker = BusinessRuleReranker()
@@ -0,0 +1,113 @@
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Deque, List, Tuple, Optional
+
+import numpy as np
+
+from app.core.config import settings
+from app.recommendations.serving.model_store import ModelStore, model_store
+
+
+class SessionRecommender:
+    """
+    Gợi ý theo phiên từ các lượt xem gần đây, không cần huấn luyện lại.
+
+    Mỗi người dùng có một ring buffer (deque có `maxlen`) chứa các lượt xem gần nhất.
+    Khi gợi ý, item factors của các sản phẩm vừa xem được trộn với trọng số giảm dần
+    theo thời gian thành một vector phiên, rồi chấm điểm toàn bộ catalog bằng một phép
+    nhân ma trận-vector. Số người dùng được giữ tối đa `max_users` (LRU).
+    """
+
+    def __init__(
+        self,
+        store: ModelStore = model_store,
+        max_views: int = settings.SESSION_MAX_VIEWS,
+        max_users: int = settings.SESSION_MAX_USERS,
+        ttl_seconds: int = settings.SESSION_TTL_SECONDS,
+        half_life_seconds: float = settings.SESSION_HALF_LIFE_SECONDS
+    ):
+        self.store = store
+        self.max_views = max_views
+        self.max_users = max_users
+        self.ttl_seconds = ttl_seconds
+        self.half_life_seconds = half_life_seconds
+        self._sessions: "OrderedDict[int, Deque[Tuple[int, float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def record_view(self, user_id: int, product_id: int) -> None:
+        """Ghi nhận một lượt xem vào phiên của người dùng"""
+        now = time.time()
+        with self._lock:
+            views = self._sessions.get(user_id)
+            if views is None:
+                views = self._sessions[user_id] = deque(maxlen=self.max_views)
+            else:
+                self._sessions.move_to_end(user_id)
+            views.append((product_id, now))
+            while len(self._sessions) > self.max_users:
+                self._sessions.popitem(last=False)
+
+    def recent_views(self, user_id: int) -> List[Tuple[int, float]]:
+        """Các lượt xem (product_id, timestamp) còn hiệu lực trong phiên, mới nhất trước"""
+        with self._lock:
+            views = self._sessions.get(user_id)
+            if not views:
+                return []
+            snapshot = list(views)
+
+        cutoff = time.time() - self.ttl_seconds
+        return [(pid, ts) for pid, ts in reversed(snapshot) if ts >= cutoff]
+
+    def recommend(
+        self,
+        user_id: int,
+        limit: int = 20,
+        exclude: Optional[List[int]] = None
+    ) -> List[Tuple[int, float]]:
+        """
+        Gợi ý sản phẩm dựa trên phiên hiện tại của người dùng
+
+        Parameters:
+        -----------
+        user_id : int
+            ID của người dùng
+        limit : int
+            Số lượng sản phẩm tối đa
+        exclude : List[int], optional
+            Các sản phẩm không được gợi ý (ngoài các sản phẩm vừa xem)
+
+        Returns:
+        --------
+        List[Tuple[int, float]]
+            Danh sách (product_id, điểm cosine) giảm dần; rỗng nếu không có phiên hoặc mô hình
+        """
+        views = self.recent_views(user_id)
+        model = self.store.get()
+        if not views or model is None:
+            return []
+
+        # Trọng số của mỗi lượt xem giảm một nửa sau mỗi `half_life_seconds`
+        now = time.time()
+        weights = {}
+        for product_id, ts in views:
+            row = model.index.get(product_id)
+            if row is not None:
+                weights[row] = weights.get(row, 0.0) + 0.5 ** ((now - ts) / self.half_life_seconds)
+        if not weights:
+            return []
+
+        rows = np.fromiter(weights.keys(), dtype=np.int64)
+        profile = np.asarray(list(weights.values()), dtype=np.float32) @ model.unit_factors[rows]
+        norm = np.linalg.norm(profile)
+        if norm == 0:
+            return []
+
+        scores = model.unit_factors @ (profile / norm)
+        exclude_rows = rows if not exclude else np.concatenate([rows, model.rows(exclude)])
+        top = model.top_k(scores, limit, exclude_rows)
+        return [(int(model.product_ids[i]), float(scores[i])) for i in top]
+
+
+# Session recommender dùng chung cho toàn bộ tiến trình
+session_recommender = SessionRecommender()
@@ -12,6 +12,10 @@ class DataPreprocessor:
     trước khi đưa vào huấn luyện.
     """
     
+    # Điểm của mỗi lượt xem và của một lần mua (rating giữ nguyên 1-5)
+    VIEW_SCORE = 0.5
+    PURCHASE_SCORE = 5.0
+    
     def __init__(self):
         # Lưu trữ ánh xạ giữa ID gốc và chỉ số sử dụng trong ma trận
         self.user_id_map = {}  # {user_id: matrix_index}
@@ -52,7 +56,7 @@ class DataPreprocessor:
 
         if not raw_data['views'].empty:
             views_grouped = raw_data['views'].groupby(['user_id', 'product_id']).size().reset_index(name='view_count')
-            views_grouped['score'] = views_grouped['view_count'] * 0.5
+            views_grouped['score'] = views_grouped['view_count'] * self.VIEW_SCORE
             views_grouped = views_grouped.drop('view_count', axis=1)
             
 
@@ -61,7 +65,7 @@ class DataPreprocessor:
 
         if not raw_data['purchases'].empty:
             purchases_grouped = raw_data['purchases'].groupby(['user_id', 'product_id'])['quantity'].sum().reset_index()
-            purchases_grouped['score'] = 5.0  
+            purchases_grouped['score'] = self.PURCHASE_SCORE
             
 
             combined_df = pd.concat([combined_df, purchases_grouped[['user_id', 'product_id', 'score']]], ignore_index=True)
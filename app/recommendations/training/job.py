@@ -4,12 +4,13 @@ from datetime import datetime
 from typing import Optional, Dict, Any
 from sqlalchemy.orm import Session
 
-from app.db.base import SessionLocal
+from app.db.base import BatchSessionLocal
 from app.recommendations.training.data_loader import DataLoader
 from app.recommendations.training.data_preprocessor import DataPreprocessor
 from app.recommendations.training.model_trainer import MatrixFactorizationTrainer, ModelEvaluator
 from app.recommendations.training.result_writer import RecommendationResultWriter
 from app.recommendations.repositories.recommendation_repository import ProductSimilarityRepository, UserRecommendationRepository
+from app.recommendations.serving.model_store import model_store
 from app.repositories.training_history_repository import TrainingHistoryRepository
 
 logger = logging.getLogger(__name__)
@@ -22,6 +23,7 @@ class TrainingJob:
     3. Huấn luyện mô hình
     4. Đánh giá mô hình (tùy chọn)
     5. Lưu kết quả vào cơ sở dữ liệu
+    6. Đưa item factors vào model store để phục vụ gợi ý thời gian thực
     """
     
     @classmethod
@@ -33,8 +35,8 @@ class TrainingJob:
         start_time = time.time()
         logger.info("=== BẮT ĐẦU QUÁ TRÌNH HUẤN LUYỆN MÔ HÌNH GỢI Ý ===")
         
-        # Tạo session database mới
-        db = SessionLocal()
+        # Tạo session database mới từ pool batch, tách biệt với pool của API
+        db = BatchSessionLocal()
         
         # Tạo bản ghi lịch sử huấn luyện
         history_repo = TrainingHistoryRepository(db)
@@ -73,6 +75,9 @@ class TrainingJob:
             )
             result_writer.calculate_and_save_results(model_result)
             
+            # 6. Đưa item factors mới vào phục vụ gợi ý thời gian thực
+            model_store.publish(model_result)
+            
             # Cập nhật bản ghi lịch sử huấn luyện thành công
             history_repo.update_training_job(
                 history_id=history.history_id,
@@ -131,7 +136,7 @@ class TrainingJob:
         """
         should_close_db = False
         if db is None:
-            db = SessionLocal()
+            db = BatchSessionLocal()
             should_close_db = True
         
         # Tạo bản ghi lịch sử huấn luyện
@@ -166,6 +171,9 @@ class TrainingJob:
             )
             result_writer.calculate_and_save_results(model_result)
             
+            # 6. Đưa item factors mới vào phục vụ gợi ý thời gian thực
+            model_store.publish(model_result)
+            
             # Cập nhật bản ghi lịch sử huấn luyện thành công
             history_repo.update_training_job(
                 history_id=history.history_id,
@@ -74,14 +74,10 @@ class MatrixFactorizationTrainer(RecommendationModelTrainer):
         
 
         self.model = TruncatedSVD(n_components=n_factors, n_iter=self.n_iterations, random_state=42)
-        item_factors = self.model.fit_transform(interaction_matrix)
-        
-
-        sigma = np.diag(self.model.singular_values_)
-        VT = self.model.components_
-        
-
-        user_factors = interaction_matrix.dot(VT.T).dot(np.linalg.inv(sigma))
+        # X ≈ U·Σ·Vᵀ: fit_transform trả về U·Σ (mỗi dòng là một user),
+        # components_ là Vᵀ nên item factors là components_.T (mỗi dòng là một sản phẩm)
+        user_factors = self.model.fit_transform(interaction_matrix)
+        item_factors = self.model.components_.T
         
         logger.info(f"Hoàn thành huấn luyện mô hình. Kích thước ma trận user factors: {user_factors.shape}, item factors: {item_factors.shape}")
         
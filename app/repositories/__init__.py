@@ -1,5 +1,5 @@
 from sqlalchemy.orm import Session
-from typing import Generic, TypeVar, Type, List, Optional, Any, Dict, Union
+from typing import Generic, TypeVar, Type, List, Optional, Any, Dict, Union, Callable, Sequence
 
 from app.db.base import Base
 
@@ -52,4 +52,30 @@ class BaseRepository(Generic[ModelType]):
         obj = self.db.query(self.model).get(id)
         self.db.delete(obj)
         self.db.commit()
-        return obj
\ No newline at end of file
+        return obj
+
+
+def upsert_statement(
+    db: Session,
+    model: Type[ModelType],
+    rows: List[Dict[str, Any]],
+    key_columns: Sequence[Any],
+    update: Callable[[Any], Dict[str, Any]]
+):
+    """
+    Tạo câu INSERT nhiều dòng, cập nhật dòng đã tồn tại theo khóa duy nhất, tùy dialect:
+    ON DUPLICATE KEY UPDATE (MySQL) hoặc ON CONFLICT DO UPDATE (PostgreSQL/SQLite).
+    
+    `update` nhận bảng giá trị mới (`inserted`/`excluded`) và trả về dict cột -> biểu thức.
+    """
+    dialect = db.get_bind().dialect.name
+    if dialect == "mysql":
+        from sqlalchemy.dialects.mysql import insert as dialect_insert
+        stmt = dialect_insert(model).values(rows)
+        return stmt.on_duplicate_key_update(**update(stmt.inserted))
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    stmt = dialect_insert(model).values(rows)
+    return stmt.on_conflict_do_update(index_elements=list(key_columns), set_=update(stmt.excluded))
@@ -1,10 +1,13 @@
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 from datetime import datetime
 from sqlalchemy.orm import Session
-from sqlalchemy import desc
+from sqlalchemy import desc, insert, delete, func, case, select
+from sqlalchemy.exc import IntegrityError
 
-from app.repositories import BaseRepository
-from app.models.interaction import CartItem, ViewHistory, Rating, SearchHistory
+from app.repositories import BaseRepository, upsert_statement
+from app.models.interaction import CartItem, ViewHistory, Rating, SearchHistory, ProductRatingStats
+from app.models.product import Product
+from app.repositories.product_repository import ProductImageRepository
 
 class CartRepository(BaseRepository[CartItem]):
     def __init__(self, db: Session):
@@ -14,6 +17,34 @@ class CartRepository(BaseRepository[CartItem]):
         """Lấy tất cả sản phẩm trong giỏ hàng của người dùng"""
         return self.db.query(CartItem).filter(CartItem.user_id == user_id).all()
     
+    def get_cart_rows(self, user_id: int) -> List[Any]:
+        """Lấy giỏ hàng kèm thông tin sản phẩm đang hoạt động và ảnh chính trong một truy vấn"""
+        image_url = ProductImageRepository.primary_image_url(CartItem.product_id)
+        
+        return self.db.query(
+            CartItem.cart_item_id,
+            CartItem.product_id,
+            CartItem.quantity,
+            Product.name,
+            Product.price,
+            Product.stock_quantity,
+            image_url.label("image_url")
+        ).join(Product, Product.product_id == CartItem.product_id).filter(
+            CartItem.user_id == user_id,
+            Product.is_active == True
+        ).order_by(CartItem.cart_item_id).all()
+    
+    def get_summary(self, user_id: int) -> Dict[str, Any]:
+        """Số mặt hàng và tổng tiền của các sản phẩm đang hoạt động trong giỏ hàng (một truy vấn)"""
+        item_count, total_amount = self.db.query(
+            func.count(CartItem.cart_item_id),
+            func.coalesce(func.sum(Product.price * CartItem.quantity), 0.0)
+        ).join(Product, Product.product_id == CartItem.product_id).filter(
+            CartItem.user_id == user_id,
+            Product.is_active == True
+        ).one()
+        return {"item_count": item_count, "total_amount": float(total_amount)}
+    
     def get_by_user_and_product(self, user_id: int, product_id: int) -> Optional[CartItem]:
         """Tìm một sản phẩm cụ thể trong giỏ hàng của người dùng"""
         return self.db.query(CartItem).filter(
@@ -66,12 +97,41 @@ class CartRepository(BaseRepository[CartItem]):
             return True
         return False
     
-    def clear_cart(self, user_id: int) -> bool:
-        """Xóa toàn bộ giỏ hàng của người dùng"""
+    def clear_cart(self, user_id: int, commit: bool = True) -> bool:
+        """Xóa toàn bộ giỏ hàng của người dùng (commit=False khi nằm trong transaction đặt hàng)"""
         self.db.query(CartItem).filter(CartItem.user_id == user_id).delete()
-        self.db.commit()
+        if commit:
+            self.db.commit()
         return True
     
+    def bulk_set_quantities(self, user_id: int, quantities: Dict[int, int], commit: bool = True) -> None:
+        """
+        Đặt số lượng cho nhiều sản phẩm trong giỏ hàng: một câu INSERT ... ON DUPLICATE KEY UPDATE
+        trên khóa idx_cart_user_product cho các sản phẩm có số lượng > 0, một câu DELETE cho các
+        sản phẩm có số lượng <= 0, và một lần commit
+        """
+        now = datetime.utcnow()
+        rows = [
+            {"user_id": user_id, "product_id": product_id, "quantity": quantity,
+             "created_at": now, "updated_at": now}
+            for product_id, quantity in quantities.items() if quantity > 0
+        ]
+        removed = [product_id for product_id, quantity in quantities.items() if quantity <= 0]
+        
+        if rows:
+            self.db.execute(upsert_statement(
+                self.db, CartItem, rows, [CartItem.user_id, CartItem.product_id],
+                lambda new: {"quantity": new.quantity, "updated_at": new.updated_at}
+            ))
+        if removed:
+            self.db.execute(
+                delete(CartItem)
+                .where(CartItem.user_id == user_id, CartItem.product_id.in_(removed))
+                .execution_options(synchronize_session=False)
+            )
+        if commit:
+            self.db.commit()
+    
     def count_items(self, user_id: int) -> int:
         """Đếm số lượng mặt hàng trong giỏ hàng"""
         return self.db.query(CartItem).filter(CartItem.user_id == user_id).count()
@@ -98,6 +158,12 @@ class ViewHistoryRepository(BaseRepository[ViewHistory]):
         self.db.refresh(view)
         return view
     
+    def add_views(self, views: List[Dict[str, Any]]) -> None:
+        """Thêm nhiều lượt xem bằng một câu INSERT nhiều dòng"""
+        if views:
+            self.db.execute(insert(ViewHistory), views)
+            self.db.commit()
+    
     def get_product_view_count(self, product_id: int) -> int:
         """Đếm tổng số lượt xem của một sản phẩm"""
         return self.db.query(ViewHistory).filter(ViewHistory.product_id == product_id).count()
@@ -126,9 +192,26 @@ class RatingRepository(BaseRepository[Rating]):
             Rating.product_id == product_id
         ).first()
     
-    def create_or_update_rating(self, user_id: int, product_id: int, score: int, comment: Optional[str] = None) -> Rating:
-        """Tạo đánh giá mới hoặc cập nhật đánh giá hiện có"""
-        rating = self.get_by_user_and_product(user_id, product_id)
+    def lock_by_user_and_product(self, user_id: int, product_id: int) -> Optional[Rating]:
+        """
+        Tìm đánh giá của người dùng cho một sản phẩm và khóa dòng (SELECT ... FOR UPDATE).
+        populate_existing để đọc điểm mới nhất kể cả khi đánh giá đã có trong session.
+        """
+        return self.db.query(Rating).filter(
+            Rating.user_id == user_id,
+            Rating.product_id == product_id
+        ).with_for_update().populate_existing().first()
+    
+    def create_or_update_rating(
+        self, user_id: int, product_id: int, score: int, comment: Optional[str] = None
+    ) -> Tuple[Rating, Optional[int]]:
+        """
+        Tạo đánh giá mới hoặc cập nhật đánh giá hiện có, trả về (đánh giá, điểm cũ).
+        Điểm cũ là None nếu đây là đánh giá mới. Dòng đánh giá được khóa trước khi đọc điểm
+        cũ, nên hai lần sửa đồng thời không cùng trừ vào một cột histogram.
+        """
+        rating = self.lock_by_user_and_product(user_id, product_id)
+        old_score = rating.score if rating else None
         
         if rating:
             rating.score = score
@@ -143,21 +226,21 @@ class RatingRepository(BaseRepository[Rating]):
             )
         
         self.db.add(rating)
+        # Cập nhật bảng tổng hợp trong cùng transaction với đánh giá
+        ProductRatingStatsRepository(self.db).apply_delta(product_id, old_score, score)
         self.db.commit()
         self.db.refresh(rating)
-        return rating
+        return rating, old_score
     
     def get_average_rating(self, product_id: int) -> float:
-        """Tính điểm đánh giá trung bình của một sản phẩm"""
-        from sqlalchemy import func
-        result = self.db.query(func.avg(Rating.score).label('average')).filter(
-            Rating.product_id == product_id
-        ).scalar()
-        return float(result) if result else 0.0
+        """Điểm đánh giá trung bình của một sản phẩm (đọc từ bảng tổng hợp)"""
+        stats = ProductRatingStatsRepository(self.db).get_by_product_id(product_id)
+        return stats.average if stats else 0.0
     
     def get_rating_count(self, product_id: int) -> int:
-        """Đếm số lượng đánh giá của một sản phẩm"""
-        return self.db.query(Rating).filter(Rating.product_id == product_id).count()
+        """Số lượng đánh giá của một sản phẩm (đọc từ bảng tổng hợp)"""
+        stats = ProductRatingStatsRepository(self.db).get_by_product_id(product_id)
+        return stats.rating_count if stats else 0
     
     def get_by_date_range(self, start_date: datetime, end_date: datetime) -> List[Rating]:
         """Lấy đánh giá trong một khoảng thời gian (dùng cho huấn luyện mô hình)"""
@@ -166,6 +249,82 @@ class RatingRepository(BaseRepository[Rating]):
             Rating.created_at <= end_date
         ).all()
 
+class ProductRatingStatsRepository(BaseRepository[ProductRatingStats]):
+    def __init__(self, db: Session):
+        super().__init__(db, ProductRatingStats)
+    
+    def get_by_product_id(self, product_id: int) -> Optional[ProductRatingStats]:
+        """Lấy tổng hợp đánh giá của một sản phẩm"""
+        return self.db.query(ProductRatingStats).filter(ProductRatingStats.product_id == product_id).first()
+    
+    def apply_delta(self, product_id: int, old_score: Optional[int], new_score: int) -> None:
+        """
+        Cộng dồn thay đổi của một đánh giá vào bảng tổng hợp (không commit).
+        old_score là None nếu đây là đánh giá mới. Dùng UPDATE col = col + delta nên các
+        transaction đồng thời không ghi đè lên nhau.
+        """
+        if old_score == new_score:
+            return
+        
+        self._ensure_row(product_id)
+        
+        values = {ProductRatingStats.rating_sum: ProductRatingStats.rating_sum + new_score - (old_score or 0)}
+        if old_score is None:
+            values[ProductRatingStats.rating_count] = ProductRatingStats.rating_count + 1
+        elif 1 <= old_score <= 5:
+            old_column = getattr(ProductRatingStats, f"count_{old_score}")
+            values[old_column] = old_column - 1
+        if 1 <= new_score <= 5:
+            new_column = getattr(ProductRatingStats, f"count_{new_score}")
+            values[new_column] = new_column + 1
+        values[ProductRatingStats.updated_at] = datetime.utcnow()
+        
+        self.db.query(ProductRatingStats).filter(
+            ProductRatingStats.product_id == product_id
+        ).update(values, synchronize_session=False)
+    
+    def _ensure_row(self, product_id: int) -> None:
+        """Tạo dòng tổng hợp rỗng nếu sản phẩm chưa có (bỏ qua nếu transaction khác vừa tạo)"""
+        exists = self.db.query(ProductRatingStats.product_id).filter(
+            ProductRatingStats.product_id == product_id
+        ).first()
+        if exists:
+            return
+        try:
+            with self.db.begin_nested():
+                self.db.add(ProductRatingStats(
+                    product_id=product_id, rating_sum=0, rating_count=0,
+                    count_1=0, count_2=0, count_3=0, count_4=0, count_5=0
+                ))
+        except IntegrityError:
+            pass
+    
+    def rebuild_all(self) -> int:
+        """Tính lại toàn bộ bảng tổng hợp từ bảng ratings (dùng để khởi tạo/đối soát), trả về số sản phẩm"""
+        columns = [
+            Rating.product_id,
+            func.sum(Rating.score),
+            func.count(Rating.rating_id),
+        ] + [
+            func.sum(case((Rating.score == star, 1), else_=0)) for star in range(1, 6)
+        ]
+        self.db.execute(delete(ProductRatingStats))
+        result = self.db.execute(
+            insert(ProductRatingStats).from_select(
+                [
+                    "product_id", "rating_sum", "rating_count",
+                    "count_1", "count_2", "count_3", "count_4", "count_5"
+                ],
+                select(*columns).group_by(Rating.product_id)
+            )
+        )
+        self.db.commit()
+        return result.rowcount
+    
+    def is_empty(self) -> bool:
+        """Bảng tổng hợp chưa có dữ liệu"""
+        return self.db.query(ProductRatingStats.product_id).first() is None
+
 class SearchHistoryRepository(BaseRepository[SearchHistory]):
     def __init__(self, db: Session):
         super().__init__(db, SearchHistory)
@@ -182,6 +341,12 @@ class SearchHistoryRepository(BaseRepository[SearchHistory]):
         self.db.refresh(search)
         return search
     
+    def add_searches(self, searches: List[Dict[str, Any]]) -> None:
+        """Thêm nhiều truy vấn tìm kiếm bằng một câu INSERT nhiều dòng"""
+        if searches:
+            self.db.execute(insert(SearchHistory), searches)
+            self.db.commit()
+    
     def get_by_user_id(self, user_id: int, limit: int = 10) -> List[SearchHistory]:
         """Lấy lịch sử tìm kiếm của người dùng, sắp xếp theo thời gian mới nhất"""
         return self.db.query(SearchHistory).filter(
@@ -190,7 +355,6 @@ class SearchHistoryRepository(BaseRepository[SearchHistory]):
     
     def get_popular_searches(self, limit: int = 10) -> List[Dict[str, Any]]:
         """Lấy các từ khóa tìm kiếm phổ biến"""
-        from sqlalchemy import func
         results = self.db.query(
             SearchHistory.query, 
             func.count(SearchHistory.query).label('count')
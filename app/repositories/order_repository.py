@@ -1,10 +1,14 @@
-from typing import List, Optional, Dict, Any
-from datetime import datetime
+from typing import List, Optional, Dict, Any, Tuple
+from datetime import datetime, date, timedelta
 from sqlalchemy.orm import Session
-from sqlalchemy import desc
+from sqlalchemy import desc, insert, func, select, literal
 
-from app.repositories import BaseRepository
-from app.models.order import Order, OrderItem, OrderStatus
+from app.repositories import BaseRepository, upsert_statement
+from app.models.order import (
+    Order, OrderItem, OrderStatus, ProductSalesDaily, CategorySalesDaily, SalesRollupWatermark
+)
+from app.models.product import Product
+from app.repositories.product_repository import ProductImageRepository
 
 class OrderRepository(BaseRepository[Order]):
     def __init__(self, db: Session):
@@ -14,33 +18,65 @@ class OrderRepository(BaseRepository[Order]):
         """Lấy đơn hàng theo ID"""
         return self.db.query(Order).filter(Order.order_id == order_id).first()
     
+    def lock_by_id(self, order_id: int) -> Optional[Order]:
+        """
+        Lấy đơn hàng và khóa dòng (SELECT ... FOR UPDATE) đến hết transaction.
+        populate_existing để đọc lại trạng thái mới nhất kể cả khi đơn đã có trong session.
+        """
+        return self.db.query(Order).filter(
+            Order.order_id == order_id
+        ).with_for_update().populate_existing().first()
+    
     def get_by_user_id(self, user_id: int, skip: int = 0, limit: int = 10) -> List[Order]:
         """Lấy danh sách đơn hàng của người dùng"""
         return self.db.query(Order).filter(
             Order.user_id == user_id
         ).order_by(desc(Order.order_date)).offset(skip).limit(limit).all()
     
+    def get_by_user_id_with_item_counts(self, user_id: int, skip: int = 0, limit: int = 10) -> List[Any]:
+        """
+        Lấy một trang đơn hàng của người dùng kèm số mặt hàng của từng đơn trong một truy vấn
+        (số mặt hàng lấy từ subquery GROUP BY order_id, giới hạn trong các đơn của người dùng)
+        """
+        item_counts = select(
+            OrderItem.order_id,
+            func.count(OrderItem.order_item_id).label("item_count")
+        ).join(Order, Order.order_id == OrderItem.order_id).where(
+            Order.user_id == user_id
+        ).group_by(OrderItem.order_id).subquery()
+        
+        return self.db.query(
+            Order,
+            func.coalesce(item_counts.c.item_count, 0).label("item_count")
+        ).outerjoin(item_counts, item_counts.c.order_id == Order.order_id).filter(
+            Order.user_id == user_id
+        ).order_by(desc(Order.order_date)).offset(skip).limit(limit).all()
+    
     def count_by_user_id(self, user_id: int) -> int:
         """Đếm tổng số đơn hàng của người dùng"""
         return self.db.query(Order).filter(Order.user_id == user_id).count()
     
-    def create_order(self, order_data: Dict[str, Any]) -> Order:
-        """Tạo đơn hàng mới"""
+    def create_order(self, order_data: Dict[str, Any], commit: bool = True) -> Order:
+        """Tạo đơn hàng mới (commit=False: chỉ flush để lấy order_id, commit trong transaction đặt hàng)"""
         order = Order(**order_data)
         self.db.add(order)
+        if not commit:
+            self.db.flush()
+            return order
         self.db.commit()
         self.db.refresh(order)
         return order
     
-    def update_status(self, order_id: int, status: OrderStatus) -> Optional[Order]:
-        """Cập nhật trạng thái đơn hàng"""
+    def update_status(self, order_id: int, status: OrderStatus, commit: bool = True) -> Optional[Order]:
+        """Cập nhật trạng thái đơn hàng (commit=False khi nằm trong transaction hủy đơn)"""
         order = self.get_by_id(order_id)
         if order:
             order.status = status
             order.updated_at = datetime.utcnow()
             self.db.add(order)
-            self.db.commit()
-            self.db.refresh(order)
+            if commit:
+                self.db.commit()
+                self.db.refresh(order)
         return order
     
     def get_orders_by_status(self, status: OrderStatus, skip: int = 0, limit: int = 20) -> List[Order]:
@@ -51,7 +87,7 @@ class OrderRepository(BaseRepository[Order]):
     
     def get_recent_orders(self, days: int = 30) -> List[Order]:
         """Lấy danh sách đơn hàng trong khoảng thời gian gần đây (dùng cho huấn luyện mô hình)"""
-        start_date = datetime.utcnow() - datetime.timedelta(days=days)
+        start_date = datetime.utcnow() - timedelta(days=days)
         return self.db.query(Order).filter(
             Order.order_date >= start_date
         ).order_by(Order.order_date).all()
@@ -64,6 +100,19 @@ class OrderItemRepository(BaseRepository[OrderItem]):
         """Lấy tất cả các mục trong đơn hàng"""
         return self.db.query(OrderItem).filter(OrderItem.order_id == order_id).all()
     
+    def get_lines_with_products(self, order_id: int) -> List[Any]:
+        """
+        Lấy các mục của đơn hàng kèm tên sản phẩm và ảnh chính trong một truy vấn
+        (LEFT JOIN: sản phẩm đã bị xóa vẫn giữ dòng, tên và ảnh là None)
+        """
+        return self.db.query(
+            OrderItem,
+            Product.name.label("product_name"),
+            ProductImageRepository.primary_image_url(OrderItem.product_id).label("image_url")
+        ).outerjoin(Product, Product.product_id == OrderItem.product_id).filter(
+            OrderItem.order_id == order_id
+        ).order_by(OrderItem.order_item_id).all()
+    
     def create_order_item(self, order_item_data: Dict[str, Any]) -> OrderItem:
         """Tạo mục đơn hàng mới"""
         order_item = OrderItem(**order_item_data)
@@ -71,6 +120,12 @@ class OrderItemRepository(BaseRepository[OrderItem]):
         # Không commit ở đây vì sẽ được commit trong transaction tạo đơn hàng
         return order_item
     
+    def bulk_insert(self, order_items_data: List[Dict[str, Any]]) -> None:
+        """Thêm nhiều mục đơn hàng bằng một câu INSERT nhiều dòng (không tạo object ORM)"""
+        if order_items_data:
+            self.db.execute(insert(OrderItem), order_items_data)
+        # Không commit ở đây vì sẽ được commit trong transaction tạo đơn hàng
+    
     def create_batch(self, order_items_data: List[Dict[str, Any]]) -> List[OrderItem]:
         """Tạo nhiều mục đơn hàng cùng lúc"""
         order_items = [OrderItem(**item_data) for item_data in order_items_data]
@@ -78,28 +133,229 @@ class OrderItemRepository(BaseRepository[OrderItem]):
         # Không commit ở đây vì sẽ được commit trong transaction tạo đơn hàng
         return order_items
     
-    def get_best_selling_products(self, limit: int = 10) -> List[Dict[str, Any]]:
-        """Lấy danh sách sản phẩm bán chạy nhất"""
-        from sqlalchemy import func
-        from app.models.product import Product
+    def get_best_selling_products(
+        self,
+        limit: int = 10,
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None
+    ) -> List[Dict[str, Any]]:
+        """Lấy danh sách sản phẩm bán chạy nhất trong khoảng ngày (đọc từ bảng doanh số theo ngày)"""
+        return [
+            {
+                "product_id": r["product_id"],
+                "name": r["name"],
+                "total_quantity": r["units"]
+            } for r in SalesRollupRepository(self.db).get_best_sellers(start_date, end_date, limit=limit)
+        ]
+
+class SalesRollupRepository:
+    """Bảng doanh số theo ngày (sản phẩm, danh mục) và watermark của lần tổng hợp gần nhất"""
+    
+    WATERMARK_NAME = "orders"
+    
+    def __init__(self, db: Session):
+        self.db = db
+    
+    def lock_watermark(self) -> SalesRollupWatermark:
+        """Lấy và khóa (FOR UPDATE) watermark, tạo mới nếu chưa có"""
+        watermark = self.db.query(SalesRollupWatermark).filter(
+            SalesRollupWatermark.name == self.WATERMARK_NAME
+        ).with_for_update().first()
+        if watermark is None:
+            watermark = SalesRollupWatermark(name=self.WATERMARK_NAME, last_order_id=0)
+            self.db.add(watermark)
+            self.db.flush()
+        return watermark
+    
+    def get_last_order_id(self) -> int:
+        """order_id lớn nhất đã được tổng hợp (0 nếu chưa tổng hợp lần nào)"""
+        last_order_id = self.db.query(SalesRollupWatermark.last_order_id).filter(
+            SalesRollupWatermark.name == self.WATERMARK_NAME
+        ).scalar()
+        return last_order_id or 0
+    
+    def get_batch_upper_bound(self, after_order_id: int, placed_before: datetime, batch_size: int) -> Optional[int]:
+        """
+        order_id lớn nhất của lô tiếp theo: tối đa `batch_size` đơn có order_id > `after_order_id`
+        và được đặt trước `placed_before`; None nếu không có đơn mới
+        """
+        batch = select(Order.order_id).where(
+            Order.order_id > after_order_id,
+            Order.order_date < placed_before
+        ).order_by(Order.order_id).limit(batch_size).subquery()
+        return self.db.query(func.max(batch.c.order_id)).scalar()
+    
+    def aggregate_orders(self, after_order_id: int, upto_order_id: int) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """
+        Gộp các đơn chưa hủy có order_id trong (`after_order_id`, `upto_order_id`] theo
+        (ngày, sản phẩm) và (ngày, danh mục)
+        """
+        conditions = (
+            Order.order_id > after_order_id,
+            Order.order_id <= upto_order_id,
+            Order.status != OrderStatus.CANCELLED
+        )
+        return self._aggregate(conditions)
+    
+    def aggregate_order(self, order_id: int) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """Phần đóng góp của một đơn hàng vào các bảng doanh số (dùng khi hủy đơn)"""
+        return self._aggregate((Order.order_id == order_id,))
+    
+    def _aggregate(self, conditions) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        day = func.date(Order.order_date)
+        units = func.sum(OrderItem.quantity)
+        revenue = func.sum(OrderItem.quantity * OrderItem.price_at_purchase)
+        orders = func.count(func.distinct(Order.order_id))
         
-        results = self.db.query(
-            OrderItem.product_id,
-            func.sum(OrderItem.quantity).label('total_quantity'),
-            Product.name
-        ).join(
-            Product, OrderItem.product_id == Product.product_id
-        ).group_by(
-            OrderItem.product_id,
-            Product.name
-        ).order_by(
-            desc('total_quantity')
-        ).limit(limit).all()
+        product_rows = self.db.query(
+            day.label("day"), OrderItem.product_id, units, revenue, orders
+        ).join(Order, Order.order_id == OrderItem.order_id).filter(
+            *conditions
+        ).group_by(day, OrderItem.product_id).all()
+        
+        category_rows = self.db.query(
+            day.label("day"), Product.category_id, units, revenue, orders
+        ).join(Order, Order.order_id == OrderItem.order_id).join(
+            Product, Product.product_id == OrderItem.product_id
+        ).filter(
+            *conditions, Product.category_id.isnot(None)
+        ).group_by(day, Product.category_id).all()
+        
+        return (
+            [
+                {"day": _to_date(r[0]), "product_id": r[1], "units": int(r[2] or 0),
+                 "revenue": float(r[3] or 0), "orders": int(r[4] or 0)}
+                for r in product_rows
+            ],
+            [
+                {"day": _to_date(r[0]), "category_id": r[1], "units": int(r[2] or 0),
+                 "revenue": float(r[3] or 0), "orders": int(r[4] or 0)}
+                for r in category_rows
+            ]
+        )
+    
+    def add_rows(self, product_rows: List[Dict[str, Any]], category_rows: List[Dict[str, Any]], sign: int = 1) -> None:
+        """Cộng (sign=1) hoặc trừ (sign=-1) doanh số vào các bảng theo ngày bằng một câu upsert mỗi bảng"""
+        for model, key, rows in (
+            (ProductSalesDaily, ProductSalesDaily.product_id, product_rows),
+            (CategorySalesDaily, CategorySalesDaily.category_id, category_rows)
+        ):
+            if not rows:
+                continue
+            if sign < 0:
+                rows = [{**r, "units": -r["units"], "revenue": -r["revenue"], "orders": -r["orders"]} for r in rows]
+            self.db.execute(upsert_statement(
+                self.db, model, rows, [model.day, key],
+                lambda new, model=model: {
+                    "units": model.units + new.units,
+                    "revenue": model.revenue + new.revenue,
+                    "orders": model.orders + new.orders
+                }
+            ))
+    
+    def clear(self) -> None:
+        """Xóa toàn bộ bảng doanh số và đặt lại watermark (dùng khi tổng hợp lại từ đầu)"""
+        self.db.query(ProductSalesDaily).delete(synchronize_session=False)
+        self.db.query(CategorySalesDaily).delete(synchronize_session=False)
+        self.lock_watermark().last_order_id = 0
+    
+    def get_best_sellers(
+        self,
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None,
+        category_id: Optional[int] = None,
+        limit: int = 10,
+        order_by: str = "units"
+    ) -> List[Dict[str, Any]]:
+        """Sản phẩm bán chạy nhất trong khoảng ngày [start_date, end_date], có thể lọc theo danh mục"""
+        units = func.sum(ProductSalesDaily.units).label("units")
+        revenue = func.sum(ProductSalesDaily.revenue).label("revenue")
+        orders = func.sum(ProductSalesDaily.orders).label("orders")
+        
+        query = self.db.query(
+            ProductSalesDaily.product_id, Product.name, units, revenue, orders
+        ).join(Product, Product.product_id == ProductSalesDaily.product_id)
+        if start_date is not None:
+            query = query.filter(ProductSalesDaily.day >= start_date)
+        if end_date is not None:
+            query = query.filter(ProductSalesDaily.day <= end_date)
+        if category_id is not None:
+            query = query.filter(Product.category_id == category_id)
+        
+        rows = query.group_by(ProductSalesDaily.product_id, Product.name).having(
+            func.sum(ProductSalesDaily.units) > 0
+        ).order_by(desc(revenue if order_by == "revenue" else units)).limit(limit).all()
         
         return [
-            {
-                "product_id": r.product_id, 
-                "name": r.name, 
-                "total_quantity": r.total_quantity
-            } for r in results
-        ]
\ No newline at end of file
+            {"product_id": r.product_id, "name": r.name, "units": int(r.units),
+             "revenue": float(r.revenue), "orders": int(r.orders)}
+            for r in rows
+        ]
+    
+    def get_daily_trend(
+        self,
+        start_date: date,
+        end_date: date,
+        product_id: Optional[int] = None,
+        category_id: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """Doanh số theo từng ngày của một sản phẩm, một danh mục hoặc toàn cửa hàng"""
+        if category_id is not None:
+            model, filters = CategorySalesDaily, [CategorySalesDaily.category_id == category_id]
+        else:
+            model = ProductSalesDaily
+            filters = [ProductSalesDaily.product_id == product_id] if product_id is not None else []
+        
+        rows = self.db.query(
+            model.day,
+            func.sum(model.units).label("units"),
+            func.sum(model.revenue).label("revenue"),
+            func.sum(model.orders).label("orders")
+        ).filter(
+            model.day >= start_date, model.day <= end_date, *filters
+        ).group_by(model.day).order_by(model.day).all()
+        
+        # Số đơn toàn cửa hàng không cộng được từ bảng sản phẩm (một đơn có nhiều sản phẩm)
+        count_orders = product_id is not None or category_id is not None
+        return [
+            {"day": _to_date(r.day), "units": int(r.units or 0), "revenue": float(r.revenue or 0),
+             "orders": int(r.orders or 0) if count_orders else None}
+            for r in rows
+        ]
+    
+    def daily_units_selects(self, since: date, weight: float) -> List[Any]:
+        """
+        Các câu SELECT (product_id, day, weight) số sản phẩm bán ra theo ngày từ `since`, để ghép
+        UNION ALL: bảng doanh số cho các đơn đã tổng hợp và các đơn mới hơn watermark đọc trực tiếp
+        """
+        rolled_up = select(
+            ProductSalesDaily.product_id.label("product_id"),
+            ProductSalesDaily.day.label("day"),
+            (ProductSalesDaily.units * literal(weight)).label("weight")
+        ).where(ProductSalesDaily.day >= since, ProductSalesDaily.units > 0)
+        
+        last_order_id = select(func.coalesce(func.max(SalesRollupWatermark.last_order_id), 0)).where(
+            SalesRollupWatermark.name == self.WATERMARK_NAME
+        ).scalar_subquery()
+        pending = select(
+            OrderItem.product_id.label("product_id"),
+            func.date(Order.order_date).label("day"),
+            (func.sum(OrderItem.quantity) * literal(weight)).label("weight")
+        ).join(
+            Order, Order.order_id == OrderItem.order_id
+        ).where(
+            Order.order_id > last_order_id,
+            Order.order_date >= since,
+            Order.status != OrderStatus.CANCELLED
+        ).group_by(OrderItem.product_id, func.date(Order.order_date))
+        
+        return [rolled_up, pending]
+
+
+def _to_date(day) -> date:
+    # DATE() trả về date trên MySQL nhưng trả về chuỗi trên SQLite
+    if isinstance(day, datetime):
+        return day.date()
+    if isinstance(day, date):
+        return day
+    return date.fromisoformat(str(day))
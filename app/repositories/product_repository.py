@@ -1,9 +1,11 @@
-from typing import List, Optional, Dict, Any
-from sqlalchemy.orm import Session
-from sqlalchemy import desc, func, and_
+from typing import List, Optional, Dict, Any, Tuple, Iterable
+from datetime import datetime
+from sqlalchemy.orm import Session, selectinload, joinedload
+from sqlalchemy import desc, func, and_, case, update, select
 
 from app.repositories import BaseRepository
 from app.models.product import Product, Category, ProductImage, Tag
+from app.models.interaction import ProductRatingStats
 
 class ProductRepository(BaseRepository[Product]):
     def __init__(self, db: Session):
@@ -18,6 +20,7 @@ class ProductRepository(BaseRepository[Product]):
         skip: int = 0, 
         limit: int = 20,
         category_id: Optional[int] = None,
+        category_ids: Optional[Iterable[int]] = None,
         search_query: Optional[str] = None,
         min_price: Optional[float] = None,
         max_price: Optional[float] = None,
@@ -31,6 +34,9 @@ class ProductRepository(BaseRepository[Product]):
         if category_id is not None:
             query = query.filter(Product.category_id == category_id)
         
+        if category_ids is not None:
+            query = query.filter(Product.category_id.in_(list(category_ids)))
+        
         if search_query:
             search_filter = f"%{search_query}%"
             query = query.filter(Product.name.ilike(search_filter))
@@ -63,6 +69,7 @@ class ProductRepository(BaseRepository[Product]):
         skip: int = 0, 
         limit: int = 100,
         category_id: Optional[int] = None,
+        category_ids: Optional[Iterable[int]] = None,
         search_query: Optional[str] = None,
         min_price: Optional[float] = None,
         max_price: Optional[float] = None,
@@ -76,6 +83,9 @@ class ProductRepository(BaseRepository[Product]):
         if category_id is not None:
             query = query.filter(Product.category_id == category_id)
         
+        if category_ids is not None:
+            query = query.filter(Product.category_id.in_(list(category_ids)))
+        
         if search_query:
             search_filter = f"%{search_query}%"
             query = query.filter(Product.name.ilike(search_filter))
@@ -106,6 +116,7 @@ class ProductRepository(BaseRepository[Product]):
         self,
         *,
         category_id: Optional[int] = None,
+        category_ids: Optional[Iterable[int]] = None,
         search_query: Optional[str] = None,
         min_price: Optional[float] = None,
         max_price: Optional[float] = None
@@ -117,6 +128,9 @@ class ProductRepository(BaseRepository[Product]):
         if category_id is not None:
             query = query.filter(Product.category_id == category_id)
         
+        if category_ids is not None:
+            query = query.filter(Product.category_id.in_(list(category_ids)))
+        
         if search_query:
             search_filter = f"%{search_query}%"
             query = query.filter(Product.name.ilike(search_filter))
@@ -133,6 +147,7 @@ class ProductRepository(BaseRepository[Product]):
         self,
         *,
         category_id: Optional[int] = None,
+        category_ids: Optional[Iterable[int]] = None,
         search_query: Optional[str] = None,
         min_price: Optional[float] = None,
         max_price: Optional[float] = None
@@ -144,6 +159,9 @@ class ProductRepository(BaseRepository[Product]):
         if category_id is not None:
             query = query.filter(Product.category_id == category_id)
         
+        if category_ids is not None:
+            query = query.filter(Product.category_id.in_(list(category_ids)))
+        
         if search_query:
             search_filter = f"%{search_query}%"
             query = query.filter(Product.name.ilike(search_filter))
@@ -179,6 +197,51 @@ class ProductRepository(BaseRepository[Product]):
         # Không commit ở đây vì sẽ commit trong transaction của đặt hàng
         return True
     
+    def lock_for_checkout(self, product_ids: List[int]) -> List[Product]:
+        """
+        Khóa (SELECT ... FOR UPDATE) tất cả sản phẩm của đơn hàng trong một truy vấn.
+        Khóa theo thứ tự product_id để các đơn hàng đồng thời luôn lấy khóa cùng một thứ tự (tránh deadlock).
+        """
+        if not product_ids:
+            return []
+        return self.db.query(Product).filter(
+            Product.product_id.in_(product_ids)
+        ).order_by(Product.product_id).with_for_update().all()
+    
+    def get_for_checkout(self, product_ids: List[int]) -> List[Product]:
+        """Đọc tất cả sản phẩm của đơn hàng trong một truy vấn, không khóa (checkout optimistic)"""
+        if not product_ids:
+            return []
+        return self.db.query(Product).filter(Product.product_id.in_(product_ids)).all()
+    
+    def decrease_stock_bulk(self, quantities: Dict[int, int]) -> bool:
+        """
+        Giảm tồn kho của nhiều sản phẩm bằng một câu UPDATE ... CASE có điều kiện.
+        Trả về False nếu có sản phẩm không đủ hàng (không commit, caller rollback).
+        """
+        if not quantities:
+            return True
+        delta = case(quantities, value=Product.product_id)
+        result = self.db.execute(
+            update(Product)
+            .where(Product.product_id.in_(list(quantities)), Product.stock_quantity >= delta)
+            .values(stock_quantity=Product.stock_quantity - delta)
+            .execution_options(synchronize_session=False)
+        )
+        return result.rowcount == len(quantities)
+    
+    def increase_stock_bulk(self, quantities: Dict[int, int]) -> None:
+        """Cộng lại tồn kho của nhiều sản phẩm bằng một câu UPDATE ... CASE (không commit)"""
+        if not quantities:
+            return
+        delta = case(quantities, value=Product.product_id)
+        self.db.execute(
+            update(Product)
+            .where(Product.product_id.in_(list(quantities)))
+            .values(stock_quantity=Product.stock_quantity + delta)
+            .execution_options(synchronize_session=False)
+        )
+    
     def get_by_ids(self, product_ids: List[int]) -> List[Product]:
         """Lấy nhiều sản phẩm theo danh sách ID"""
         if not product_ids:
@@ -188,6 +251,56 @@ class ProductRepository(BaseRepository[Product]):
             Product.is_active == True
         ).all()
     
+    def get_detail(self, product_id: int) -> Optional[Product]:
+        """
+        Lấy sản phẩm kèm danh mục, ảnh, tổng hợp đánh giá (JOIN trong cùng một truy vấn)
+        và tags (một truy vấn phụ).
+        Tags không JOIN chung để tránh nhân số dòng ảnh x tags.
+        """
+        return self.db.query(Product).options(
+            joinedload(Product.category),
+            joinedload(Product.images),
+            joinedload(Product.rating_stats),
+            selectinload(Product.tags)
+        ).filter(Product.product_id == product_id).one_or_none()
+    
+    def get_by_ids_with_images(self, product_ids: List[int]) -> List[Product]:
+        """Lấy nhiều sản phẩm theo danh sách ID, tải sẵn ảnh trong một truy vấn phụ (tránh N+1)"""
+        if not product_ids:
+            return []
+        return self.db.query(Product).options(
+            selectinload(Product.images)
+        ).filter(
+            Product.product_id.in_(product_ids),
+            Product.is_active == True
+        ).all()
+    
+    def get_catalog_columns(self) -> List[Tuple[int, int, float, Optional[datetime], int, Optional[int], Optional[int]]]:
+        """
+        Lấy các cột (product_id, category_id, price, created_at, stock_quantity, rating_sum, rating_count)
+        của sản phẩm đang hoạt động; tổng hợp đánh giá lấy bằng LEFT JOIN bảng product_rating_stats
+        """
+        return self.db.query(
+            Product.product_id,
+            Product.category_id,
+            Product.price,
+            Product.created_at,
+            Product.stock_quantity,
+            ProductRatingStats.rating_sum,
+            ProductRatingStats.rating_count
+        ).outerjoin(
+            ProductRatingStats, ProductRatingStats.product_id == Product.product_id
+        ).filter(Product.is_active == True).all()
+    
+    def get_active_ids_by_name(self, search_query: str) -> List[int]:
+        """Lấy ID các sản phẩm đang hoạt động có tên khớp với từ khóa tìm kiếm"""
+        search_filter = f"%{search_query}%"
+        rows = self.db.query(Product.product_id).filter(
+            Product.is_active == True,
+            Product.name.ilike(search_filter)
+        ).all()
+        return [r.product_id for r in rows]
+    
     def create_product(self, product_data: Dict[str, Any]) -> Product:
         """Tạo sản phẩm mới"""
         # Đảm bảo category_id tồn tại nếu được cung cấp
@@ -247,6 +360,15 @@ class CategoryRepository(BaseRepository[Category]):
     def get_subcategories(self, parent_id: int) -> List[Category]:
         """Lấy danh sách danh mục con của một danh mục cha"""
         return self.db.query(Category).filter(Category.parent_id == parent_id).all()
+    
+    def get_hierarchy_rows(self) -> List[Any]:
+        """Lấy (category_id, name, description, parent_id) của mọi danh mục trong một truy vấn"""
+        return self.db.query(
+            Category.category_id,
+            Category.name,
+            Category.description,
+            Category.parent_id
+        ).all()
 
 class ProductImageRepository(BaseRepository[ProductImage]):
     def __init__(self, db: Session):
@@ -258,6 +380,18 @@ class ProductImageRepository(BaseRepository[ProductImage]):
             ProductImage.product_id == product_id
         ).order_by(ProductImage.display_order, ProductImage.is_primary.desc()).all()
     
+    @staticmethod
+    def primary_image_url(product_id_column):
+        """
+        Subquery tương quan lấy URL ảnh chính của sản phẩm có ID `product_id_column`
+        (ưu tiên is_primary, sau đó theo display_order), dùng để JOIN ảnh vào truy vấn danh sách
+        """
+        return select(ProductImage.image_url).where(
+            ProductImage.product_id == product_id_column
+        ).order_by(
+            ProductImage.is_primary.desc(), ProductImage.display_order, ProductImage.image_id
+        ).limit(1).correlate_except(ProductImage).scalar_subquery()
+    
     def get_primary_image(self, product_id: int) -> Optional[ProductImage]:
         """Lấy hình ảnh chính của sản phẩm"""
         return self.db.query(ProductImage).filter(
@@ -14,6 +14,12 @@ class UserRepository(BaseRepository[User]):
     def get_by_email(self, email: str) -> Optional[User]:
         return self.db.query(User).filter(User.email == email).first()
     
+    def get_existing_ids(self, user_ids: List[int]) -> List[int]:
+        """Lọc ra các user_id có tồn tại trong danh sách cho trước"""
+        if not user_ids:
+            return []
+        return [r.user_id for r in self.db.query(User.user_id).filter(User.user_id.in_(user_ids)).all()]
+    
     def get_active_users(self, skip: int = 0, limit: int = 100) -> List[User]:
         return self.db.query(User).filter(User.is_active == True).offset(skip).limit(limit).all()
     
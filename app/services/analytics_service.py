@@ -0,0 +1,86 @@
+from typing import Dict, Any, Optional
+from datetime import date, datetime, timedelta
+from sqlalchemy.orm import Session
+
+from app.repositories.order_repository import SalesRollupRepository
+from app.db.routing import read_only
+
+class AnalyticsService:
+    """Service đọc số liệu bán hàng từ các bảng doanh số theo ngày"""
+    
+    def __init__(self, db: Session):
+        self.db = db
+        self.rollup_repo = SalesRollupRepository(db)
+    
+    @read_only
+    def get_best_sellers(
+        self,
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None,
+        category_id: Optional[int] = None,
+        limit: int = 10,
+        order_by: str = "units"
+    ) -> Dict[str, Any]:
+        """
+        Lấy danh sách sản phẩm bán chạy nhất trong một khoảng ngày
+        
+        Parameters:
+        -----------
+        start_date, end_date : date, optional
+            Khoảng ngày (tính cả hai đầu); bỏ trống để không giới hạn
+        category_id : int, optional
+            Chỉ lấy sản phẩm thuộc danh mục này
+        limit : int
+            Số sản phẩm tối đa
+        order_by : str
+            'units' (số lượng bán) hoặc 'revenue' (doanh thu)
+            
+        Returns:
+        --------
+        Dict[str, Any]
+            Khoảng ngày và danh sách sản phẩm kèm số lượng, doanh thu, số đơn
+        """
+        items = self.rollup_repo.get_best_sellers(
+            start_date, end_date, category_id=category_id, limit=limit, order_by=order_by
+        )
+        return {
+            "start_date": start_date,
+            "end_date": end_date,
+            "items": items
+        }
+    
+    @read_only
+    def get_sales_trend(
+        self,
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None,
+        product_id: Optional[int] = None,
+        category_id: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Lấy doanh số theo từng ngày của một sản phẩm, một danh mục hoặc toàn cửa hàng
+        
+        Parameters:
+        -----------
+        start_date, end_date : date, optional
+            Khoảng ngày, mặc định 30 ngày gần nhất
+        product_id : int, optional
+            Sản phẩm cần xem
+        category_id : int, optional
+            Danh mục cần xem (ưu tiên hơn product_id)
+            
+        Returns:
+        --------
+        Dict[str, Any]
+            Khoảng ngày và doanh số của từng ngày có phát sinh đơn hàng
+        """
+        end_date = end_date or datetime.utcnow().date()
+        start_date = start_date or end_date - timedelta(days=29)
+        days = self.rollup_repo.get_daily_trend(
+            start_date, end_date, product_id=product_id, category_id=category_id
+        )
+        return {
+            "start_date": start_date,
+            "end_date": end_date,
+            "days": days
+        }
@@ -3,6 +3,9 @@ from sqlalchemy.orm import Session
 
 from app.repositories.interaction_repository import CartRepository
 from app.repositories.product_repository import ProductRepository
+from app.repositories.order_repository import OrderRepository, OrderItemRepository
+from app.db.routing import read_only
+from app.services.cart_summary import cart_summary_cache
 
 class CartService:
     """Service xử lý logic nghiệp vụ cho giỏ hàng"""
@@ -11,7 +14,10 @@ class CartService:
         self.db = db
         self.cart_repo = CartRepository(db)
         self.product_repo = ProductRepository(db)
+        self.order_repo = OrderRepository(db)
+        self.order_item_repo = OrderItemRepository(db)
     
+    @read_only(user_arg="user_id")
     def get_cart(self, user_id: int) -> Dict[str, Any]:
         """
         Lấy thông tin giỏ hàng của người dùng
@@ -26,53 +32,59 @@ class CartService:
         Dict[str, Any]
             Thông tin giỏ hàng bao gồm danh sách sản phẩm và tổng tiền
         """
-        # Lấy các mục trong giỏ hàng
-        cart_items = self.cart_repo.get_by_user_id(user_id)
-        
-        # Lấy danh sách ID sản phẩm
-        product_ids = [item.product_id for item in cart_items]
-        
-        # Lấy thông tin chi tiết sản phẩm
-        products = self.product_repo.get_by_ids(product_ids)
-        
-        # Tạo map sản phẩm để dễ truy cập
-        product_map = {p.product_id: p for p in products}
+        # Lấy giỏ hàng kèm sản phẩm đang hoạt động và ảnh chính trong một truy vấn
+        rows = self.cart_repo.get_cart_rows(user_id)
         
         # Tính tổng tiền và format kết quả
         total_amount = 0.0
         items = []
         
-        for cart_item in cart_items:
-            product = product_map.get(cart_item.product_id)
+        for row in rows:
+            # Tính giá tiền của mục này
+            item_total = row.price * row.quantity
+            total_amount += item_total
             
-            if product and product.is_active:
-                # Tính giá tiền của mục này
-                item_total = product.price * cart_item.quantity
-                total_amount += item_total
-                
-                # Lấy ảnh chính của sản phẩm
-                primary_image = next((img.image_url for img in product.images if img.is_primary), 
-                                    (product.images[0].image_url if product.images else None))
-                
-                # Thêm vào danh sách kết quả
-                items.append({
-                    "cart_item_id": cart_item.cart_item_id,
-                    "product_id": product.product_id,
-                    "name": product.name,
-                    "price": product.price,
-                    "quantity": cart_item.quantity,
-                    "subtotal": item_total,
-                    "image_url": primary_image,
-                    "stock_quantity": product.stock_quantity,
-                    "is_in_stock": product.stock_quantity >= cart_item.quantity
-                })
+            # Thêm vào danh sách kết quả
+            items.append({
+                "cart_item_id": row.cart_item_id,
+                "product_id": row.product_id,
+                "name": row.name,
+                "price": row.price,
+                "quantity": row.quantity,
+                "subtotal": item_total,
+                "image_url": row.image_url,
+                "stock_quantity": row.stock_quantity,
+                "is_in_stock": row.stock_quantity >= row.quantity
+            })
         
+        cart_summary_cache.set(user_id, len(items), total_amount)
         return {
             "items": items,
             "total_amount": total_amount,
             "item_count": len(items)
         }
     
+    @read_only(user_arg="user_id")
+    def get_cart_summary(self, user_id: int) -> Dict[str, Any]:
+        """
+        Lấy số mặt hàng và tổng tiền của giỏ hàng (dùng cho badge giỏ hàng)
+        
+        Parameters:
+        -----------
+        user_id : int
+            ID của người dùng
+            
+        Returns:
+        --------
+        Dict[str, Any]
+            item_count và total_amount, lấy từ cache nếu có, nếu không thì bằng một truy vấn tổng hợp
+        """
+        summary = cart_summary_cache.get(user_id)
+        if summary is None:
+            summary = self.cart_repo.get_summary(user_id)
+            cart_summary_cache.set(user_id, summary["item_count"], summary["total_amount"])
+        return summary
+    
     def add_to_cart(self, user_id: int, product_id: int, quantity: int = 1) -> Dict[str, Any]:
         """
         Thêm sản phẩm vào giỏ hàng
@@ -100,8 +112,9 @@ class CartService:
         if product.stock_quantity < quantity:
             return {"success": False, "message": f"Số lượng sản phẩm trong kho không đủ (hiện có {product.stock_quantity})"}
         
-        # Thêm vào giỏ hàng
-        self.cart_repo.add_item(user_id, product_id, quantity)
+        # Thêm vào giỏ hàng (mặt hàng mới nếu số lượng sau khi thêm đúng bằng số lượng vừa thêm)
+        cart_item = self.cart_repo.add_item(user_id, product_id, quantity)
+        cart_summary_cache.apply(user_id, 1 if cart_item.quantity == quantity else 0, product.price * quantity)
         
         # Trả về giỏ hàng đã cập nhật
         updated_cart = self.get_cart(user_id)
@@ -134,9 +147,14 @@ class CartService:
         if not cart_item:
             return {"success": False, "message": "Sản phẩm không có trong giỏ hàng"}
         
+        old_quantity = cart_item.quantity
+        
         # Xử lý trường hợp xóa khỏi giỏ hàng
         if quantity <= 0:
+            product = self.product_repo.get_by_id(product_id)
             self.cart_repo.remove_item(user_id, product_id)
+            if product and product.is_active:
+                cart_summary_cache.apply(user_id, -1, -product.price * old_quantity)
             updated_cart = self.get_cart(user_id)
             return {
                 "success": True,
@@ -155,6 +173,7 @@ class CartService:
         
         # Cập nhật số lượng
         self.cart_repo.update_quantity(user_id, product_id, quantity)
+        cart_summary_cache.apply(user_id, 0, product.price * (quantity - old_quantity))
         
         # Trả về giỏ hàng đã cập nhật
         updated_cart = self.get_cart(user_id)
@@ -188,9 +207,12 @@ class CartService:
         # Lấy tên sản phẩm để hiển thị trong thông báo
         product = self.product_repo.get_by_id(product_id)
         product_name = product.name if product else "Sản phẩm"
+        old_quantity = cart_item.quantity
         
         # Xóa khỏi giỏ hàng
         self.cart_repo.remove_item(user_id, product_id)
+        if product and product.is_active:
+            cart_summary_cache.apply(user_id, -1, -product.price * old_quantity)
         
         # Trả về giỏ hàng đã cập nhật
         updated_cart = self.get_cart(user_id)
@@ -200,6 +222,111 @@ class CartService:
             "cart": updated_cart
         }
     
+    def bulk_update_cart(self, user_id: int, items: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Thay đổi nhiều sản phẩm trong giỏ hàng cùng lúc (gộp giỏ hàng khách, đặt lại đơn cũ).
+        
+        Giỏ hàng hiện tại và các sản phẩm được đọc bằng hai truy vấn, số lượng cuối cùng được
+        tính và kiểm tra trong bộ nhớ, sau đó ghi bằng một câu upsert (và một câu DELETE nếu có
+        sản phẩm bị xóa) trong một lần commit. Sản phẩm không hợp lệ được bỏ qua và trả về
+        trong `failed_items`, các sản phẩm còn lại vẫn được cập nhật.
+        
+        Parameters:
+        -----------
+        user_id : int
+            ID của người dùng
+        items : List[Dict[str, Any]]
+            Các thao tác theo thứ tự, mỗi thao tác gồm product_id, quantity và action:
+            "add" (cộng thêm), "set" (đặt số lượng, <= 0 là xóa) hoặc "remove" (xóa)
+            
+        Returns:
+        --------
+        Dict[str, Any]
+            Kết quả thao tác, danh sách sản phẩm không hợp lệ và giỏ hàng cập nhật
+        """
+        if not items:
+            return {"success": False, "message": "Không có sản phẩm nào để cập nhật"}
+        
+        # 1. Số lượng hiện tại trong giỏ hàng và các sản phẩm đang hoạt động (hai truy vấn)
+        current = {item.product_id: item.quantity for item in self.cart_repo.get_by_user_id(user_id)}
+        product_ids = list({item["product_id"] for item in items})
+        products = {p.product_id: p for p in self.product_repo.get_by_ids(product_ids)}
+        
+        # 2. Tính số lượng cuối cùng của từng sản phẩm theo thứ tự các thao tác
+        quantities = {}
+        for item in items:
+            product_id = item["product_id"]
+            action = item.get("action", "add")
+            if action == "remove":
+                quantities[product_id] = 0
+            elif action == "set":
+                quantities[product_id] = item["quantity"]
+            else:
+                quantities[product_id] = quantities.get(product_id, current.get(product_id, 0)) + item["quantity"]
+        
+        # 3. Kiểm tra trạng thái và tồn kho trong bộ nhớ
+        failed_items = []
+        changes = {}
+        for product_id, quantity in quantities.items():
+            if quantity > 0:
+                product = products.get(product_id)
+                if not product:
+                    failed_items.append({"product_id": product_id, "message": "Sản phẩm không tồn tại hoặc không còn hoạt động"})
+                    continue
+                if product.stock_quantity < quantity:
+                    failed_items.append({
+                        "product_id": product_id,
+                        "message": f"Số lượng sản phẩm trong kho không đủ (hiện có {product.stock_quantity})"
+                    })
+                    continue
+            elif product_id not in current:
+                continue
+            if quantity != current.get(product_id, 0):
+                changes[product_id] = quantity
+        
+        # 4. Ghi toàn bộ thay đổi trong một transaction
+        try:
+            self.cart_repo.bulk_set_quantities(user_id, changes)
+        except Exception as e:
+            self.db.rollback()
+            return {"success": False, "message": f"Lỗi khi cập nhật giỏ hàng: {str(e)}"}
+        
+        # Trả về giỏ hàng đã cập nhật (get_cart tính lại tóm tắt giỏ hàng)
+        cart_summary_cache.invalidate(user_id)
+        updated_cart = self.get_cart(user_id)
+        return {
+            "success": not failed_items or bool(changes),
+            "message": f"Đã cập nhật {len(changes)} sản phẩm trong giỏ hàng",
+            "cart": updated_cart,
+            "failed_items": failed_items
+        }
+    
+    def reorder(self, user_id: int, order_id: int) -> Dict[str, Any]:
+        """
+        Thêm lại toàn bộ sản phẩm của một đơn hàng cũ vào giỏ hàng
+        
+        Parameters:
+        -----------
+        user_id : int
+            ID của người dùng
+        order_id : int
+            ID của đơn hàng cần đặt lại
+            
+        Returns:
+        --------
+        Dict[str, Any]
+            Kết quả thao tác (như bulk_update_cart)
+        """
+        order = self.order_repo.get_by_id(order_id)
+        if not order or order.user_id != user_id:
+            return {"success": False, "message": "Đơn hàng không tồn tại"}
+        
+        order_items = self.order_item_repo.get_by_order_id(order_id)
+        return self.bulk_update_cart(user_id, [
+            {"product_id": item.product_id, "quantity": item.quantity, "action": "add"}
+            for item in order_items
+        ])
+    
     def clear_cart(self, user_id: int) -> Dict[str, Any]:
         """
         Xóa toàn bộ giỏ hàng của người dùng
@@ -215,6 +342,7 @@ class CartService:
             Kết quả thao tác
         """
         self.cart_repo.clear_cart(user_id)
+        cart_summary_cache.set(user_id, 0, 0.0)
         
         return {
             "success": True,
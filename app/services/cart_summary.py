@@ -0,0 +1,74 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+
+from app.core.config import settings
+
+
+class CartSummaryCache:
+    """
+    Tóm tắt giỏ hàng (số mặt hàng, tổng tiền) của từng người dùng, giữ trong bộ nhớ tiến trình.
+
+    Được ghi khi giỏ hàng được đọc đầy đủ và cập nhật cộng dồn khi thêm/sửa/xóa sản phẩm, nên
+    badge giỏ hàng trên header không cần truy vấn. Giới hạn `max_entries` người dùng (LRU) và
+    hết hạn sau `ttl_seconds` để đồng bộ với thay đổi từ worker khác hoặc thay đổi giá sản phẩm.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = settings.CART_SUMMARY_MAX_ENTRIES,
+        ttl_seconds: int = settings.CART_SUMMARY_TTL_SECONDS
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[int, Tuple[float, int, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """Tóm tắt đã cache của người dùng, None nếu chưa có hoặc đã hết hạn"""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            expires_at, item_count, total_amount = entry
+            if expires_at < time.monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return {"item_count": item_count, "total_amount": total_amount}
+
+    def set(self, user_id: int, item_count: int, total_amount: float) -> None:
+        """Ghi tóm tắt vừa tính từ cơ sở dữ liệu"""
+        with self._lock:
+            self._entries[user_id] = (time.monotonic() + self.ttl_seconds, item_count, total_amount)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def apply(self, user_id: int, item_delta: int, amount_delta: float) -> None:
+        """Cộng dồn thay đổi vào tóm tắt đã cache; chưa có trong cache thì bỏ qua (lần đọc sau sẽ tính lại)"""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return
+            expires_at, item_count, total_amount = entry
+            self._entries[user_id] = (
+                expires_at,
+                max(item_count + item_delta, 0),
+                max(total_amount + amount_delta, 0.0)
+            )
+
+    def invalidate(self, user_id: int) -> None:
+        """Xóa tóm tắt của một người dùng"""
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self) -> None:
+        """Xóa toàn bộ tóm tắt (ví dụ khi giá hoặc trạng thái sản phẩm thay đổi)"""
+        with self._lock:
+            self._entries.clear()
+
+
+# Cache tóm tắt giỏ hàng dùng chung cho toàn bộ tiến trình
+cart_summary_cache = CartSummaryCache()
@@ -0,0 +1,360 @@
+import threading
+import time
+import numpy as np
+from typing import List, Dict, Any, Optional, Iterable
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.routing import use_primary
+from app.models.product import Product
+from app.repositories.product_repository import ProductRepository, CategoryRepository
+
+
+class CatalogColumns:
+    """
+    Dữ liệu dạng cột (columnar) của các sản phẩm đang hoạt động.
+    Đối tượng này không bị thay đổi sau khi tạo (copy-on-write), nên các request
+    đang đọc luôn thấy một phiên bản nhất quán ngay cả khi snapshot được cập nhật.
+    """
+
+    def __init__(
+        self,
+        product_ids: np.ndarray,
+        category_ids: np.ndarray,
+        prices: np.ndarray,
+        created_at: np.ndarray,
+        stock_quantities: np.ndarray,
+        rating_sums: np.ndarray,
+        rating_counts: np.ndarray,
+        category_names: Dict[int, str]
+    ):
+        self.product_ids = product_ids
+        self.category_ids = category_ids
+        self.prices = prices
+        self.created_at = created_at  # Epoch seconds, NaN nếu không có
+        self.stock_quantities = stock_quantities
+        self.rating_sums = rating_sums
+        self.rating_counts = rating_counts
+        self.category_names = category_names
+        self.index = {int(pid): i for i, pid in enumerate(product_ids)}
+        # Điểm trung bình, 0 nếu chưa có đánh giá
+        self.rating_averages = np.divide(
+            rating_sums, rating_counts, out=np.zeros(len(product_ids), dtype=np.float64),
+            where=rating_counts > 0
+        )
+
+    # Các cột theo từng sản phẩm (cùng độ dài, cùng thứ tự dòng)
+    ROW_COLUMNS = (
+        "product_ids", "category_ids", "prices", "created_at", "stock_quantities", "rating_sums", "rating_counts"
+    )
+
+    def _replace(self, **changes: np.ndarray) -> "CatalogColumns":
+        """Tạo bản sao với một số cột được thay thế"""
+        arrays = {name: changes.get(name, getattr(self, name)) for name in self.ROW_COLUMNS}
+        return CatalogColumns(**arrays, category_names=self.category_names)
+
+    def ratings(self, product_id: int) -> Dict[str, Any]:
+        """Điểm trung bình và số lượt đánh giá của một sản phẩm trong snapshot"""
+        row = self.index.get(product_id)
+        if row is None:
+            return {"average_rating": 0.0, "rating_count": 0}
+        return {
+            "average_rating": round(float(self.rating_averages[row]), 2),
+            "rating_count": int(self.rating_counts[row])
+        }
+
+    def __len__(self) -> int:
+        return len(self.product_ids)
+
+    def mask(
+        self,
+        category_ids: Optional[Iterable[int]] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        product_ids: Optional[Iterable[int]] = None
+    ) -> np.ndarray:
+        """Tạo mask boolean cho các sản phẩm thỏa mãn bộ lọc (category_ids: danh mục và các danh mục con)"""
+        mask = np.ones(len(self.product_ids), dtype=bool)
+        if category_ids is not None:
+            mask &= np.isin(self.category_ids, np.fromiter(category_ids, dtype=np.int64))
+        if min_price is not None:
+            mask &= self.prices >= min_price
+        if max_price is not None:
+            mask &= self.prices <= max_price
+        if product_ids is not None:
+            mask &= np.isin(self.product_ids, np.fromiter(product_ids, dtype=np.int64))
+        return mask
+
+    def sorted_ids(self, mask: np.ndarray, order_by: str = "created_at", descending: bool = True) -> np.ndarray:
+        """
+        Sắp xếp ID sản phẩm thỏa mãn mask theo giá, điểm đánh giá hoặc thời gian tạo.
+        Khi sắp theo điểm đánh giá, số lượt đánh giá là khóa phụ; product_id là khóa cuối.
+        """
+        ids = self.product_ids[mask]
+        if order_by == "rating":
+            keys = (ids, self.rating_counts[mask], self.rating_averages[mask])
+        else:
+            keys = (ids, self.prices[mask] if order_by == "price" else self.created_at[mask])
+        if descending:
+            order = np.lexsort(tuple(-k for k in keys))
+        else:
+            order = np.lexsort(keys)
+        return ids[order]
+
+    def category_counts(self, mask: np.ndarray) -> List[Dict[str, Any]]:
+        """Đếm số sản phẩm theo từng danh mục"""
+        category_ids, counts = np.unique(self.category_ids[mask], return_counts=True)
+        facets = [
+            {
+                "category_id": int(cid),
+                "category_name": self.category_names.get(int(cid)),
+                "count": int(count)
+            }
+            for cid, count in zip(category_ids, counts)
+        ]
+        facets.sort(key=lambda x: x["count"], reverse=True)
+        return facets
+
+    def price_histogram(self, mask: np.ndarray, edges: List[float]) -> List[Dict[str, Any]]:
+        """Chia sản phẩm thỏa mãn mask vào các khoảng giá [edges[i], edges[i+1])"""
+        bins = np.append(np.asarray(edges, dtype=np.float64), np.inf)
+        counts, _ = np.histogram(self.prices[mask], bins=bins)
+        return [
+            {
+                "min_price": float(bins[i]),
+                "max_price": float(bins[i + 1]) if np.isfinite(bins[i + 1]) else None,
+                "count": int(count)
+            }
+            for i, count in enumerate(counts)
+        ]
+
+    def price_range(self, mask: np.ndarray) -> Dict[str, Optional[float]]:
+        """Giá nhỏ nhất và lớn nhất của các sản phẩm thỏa mãn mask"""
+        prices = self.prices[mask]
+        if len(prices) == 0:
+            return {"min": None, "max": None}
+        return {"min": float(prices.min()), "max": float(prices.max())}
+
+
+class CatalogSnapshot:
+    """
+    Snapshot trong bộ nhớ của các sản phẩm đang hoạt động, dùng cho faceted search.
+
+    Snapshot được tải bằng một truy vấn duy nhất (luôn từ primary) khi cần, được cập nhật
+    từng phần khi sản phẩm được tạo/sửa/xóa qua ProductService, và được tải lại toàn bộ sau
+    `ttl_seconds` để đồng bộ với các thay đổi từ worker khác.
+
+    Chỉ một thread tải lại tại một thời điểm; khi snapshot hết hạn, các request khác tiếp tục
+    dùng bản cũ thay vì cùng chạy truy vấn toàn bộ catalog. Mỗi cập nhật từng phần tăng
+    `_generation`: nếu có cập nhật trong lúc truy vấn tải lại đang chạy, kết quả tải lại có thể
+    thiếu cập nhật đó nên bị bỏ (giữ bản hiện tại, vốn đã có cập nhật) và được tải lại sau.
+    """
+
+    # Số lần thử tải lại khi liên tục có cập nhật chen vào
+    REBUILD_ATTEMPTS = 3
+
+    def __init__(self, ttl_seconds: int = settings.CATALOG_SNAPSHOT_TTL_SECONDS,
+                 price_edges: Optional[List[float]] = None):
+        self.ttl_seconds = ttl_seconds
+        self.price_edges = price_edges or [
+            float(edge) for edge in settings.CATALOG_PRICE_FACET_EDGES.split(",") if edge.strip()
+        ]
+        self._columns: Optional[CatalogColumns] = None
+        self._loaded_at = 0.0
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._rebuild_lock = threading.Lock()
+
+    def _expired(self) -> bool:
+        return time.monotonic() - self._loaded_at > self.ttl_seconds
+
+    def get(self, db: Session) -> CatalogColumns:
+        """
+        Lấy snapshot hiện tại. Nếu chưa có thì tải (các request đồng thời chờ một lần tải);
+        nếu đã hết hạn thì một request tải lại, các request khác dùng bản cũ.
+        """
+        columns = self._columns
+        if columns is not None and not self._expired():
+            return columns
+
+        if columns is None:
+            with self._rebuild_lock:
+                # Thread khác có thể vừa tải xong trong lúc chờ
+                columns = self._columns
+                if columns is None:
+                    columns = self._rebuild(db)
+            return columns
+
+        if not self._rebuild_lock.acquire(blocking=False):
+            return columns
+        try:
+            # Thread khác có thể vừa tải xong trước khi lấy được khóa
+            columns = self._columns
+            return columns if columns is not None and not self._expired() else self._rebuild(db)
+        finally:
+            self._rebuild_lock.release()
+
+    def rebuild(self, db: Session) -> CatalogColumns:
+        """Tải lại toàn bộ snapshot từ cơ sở dữ liệu"""
+        with self._rebuild_lock:
+            return self._rebuild(db)
+
+    def _rebuild(self, db: Session) -> CatalogColumns:
+        for _ in range(self.REBUILD_ATTEMPTS):
+            with self._lock:
+                started = self._generation
+            columns = self._load(db)
+            with self._lock:
+                if self._generation == started:
+                    self._columns = columns
+                    self._loaded_at = time.monotonic()
+                    return columns
+                if self._columns is not None:
+                    # Bản hiện tại đã có các cập nhật chen vào: giữ lại, lần sau tải lại
+                    return self._columns
+
+        # Vẫn có cập nhật chen vào: dùng bản vừa tải nhưng để hết hạn ngay, lần đọc sau tải lại
+        with self._lock:
+            if self._columns is None:
+                self._columns = columns
+                self._loaded_at = 0.0
+            return self._columns
+
+    def _load(self, db: Session) -> CatalogColumns:
+        # Snapshot dùng chung cho cả tiến trình: không dựng từ replica (có thể trễ so với
+        # các cập nhật từng phần đã áp dụng)
+        with use_primary(db):
+            rows = ProductRepository(db).get_catalog_columns()
+            categories = CategoryRepository(db).get_all()
+
+        return CatalogColumns(
+            product_ids=np.array([r.product_id for r in rows], dtype=np.int64),
+            category_ids=np.array([r.category_id for r in rows], dtype=np.int64),
+            prices=np.array([r.price for r in rows], dtype=np.float64),
+            created_at=np.array(
+                [r.created_at.timestamp() if r.created_at else np.nan for r in rows], dtype=np.float64
+            ),
+            stock_quantities=np.array([r.stock_quantity for r in rows], dtype=np.int64),
+            rating_sums=np.array([r.rating_sum or 0 for r in rows], dtype=np.float64),
+            rating_counts=np.array([r.rating_count or 0 for r in rows], dtype=np.int64),
+            category_names={c.category_id: c.name for c in categories}
+        )
+
+    def invalidate(self) -> None:
+        """Đánh dấu snapshot cần tải lại ở lần đọc tiếp theo"""
+        with self._lock:
+            self._generation += 1
+            self._columns = None
+
+    def upsert(self, product: Product) -> None:
+        """Cập nhật (hoặc thêm) một sản phẩm vào snapshot sau khi ghi vào DB"""
+        if not product.is_active:
+            self.remove(product.product_id)
+            return
+
+        with self._lock:
+            self._generation += 1
+            columns = self._columns
+            if columns is None:
+                return
+
+            values = (
+                product.category_id,
+                product.price,
+                product.created_at.timestamp() if product.created_at else np.nan,
+                product.stock_quantity
+            )
+            names = ("category_ids", "prices", "created_at", "stock_quantities")
+            row = columns.index.get(product.product_id)
+            if row is not None:
+                changes = {}
+                for name, value in zip(names, values):
+                    changes[name] = getattr(columns, name).copy()
+                    changes[name][row] = value
+            else:
+                # Sản phẩm mới chưa có đánh giá
+                changes = {name: np.append(getattr(columns, name), value) for name, value in zip(names, values)}
+                changes["product_ids"] = np.append(columns.product_ids, product.product_id)
+                changes["rating_sums"] = np.append(columns.rating_sums, 0.0)
+                changes["rating_counts"] = np.append(columns.rating_counts, 0)
+
+            self._columns = columns._replace(**changes)
+
+    def adjust_stock(self, delta_by_product: Dict[int, int]) -> None:
+        """
+        Cộng/trừ tồn kho của các sản phẩm theo lượng thay đổi đã commit sau khi đặt/hủy đơn hàng.
+        Dùng lượng thay đổi thay vì tồn kho tuyệt đối vì tồn kho đọc được có thể đã cũ
+        (checkout optimistic và hoàn kho khi hủy đều cập nhật bằng UPDATE tương đối).
+        """
+        with self._lock:
+            self._generation += 1
+            columns = self._columns
+            if columns is None:
+                return
+
+            stock_quantities = columns.stock_quantities.copy()
+            for product_id, delta in delta_by_product.items():
+                row = columns.index.get(product_id)
+                if row is not None:
+                    stock_quantities[row] = max(0, stock_quantities[row] + delta)
+
+            self._columns = columns._replace(stock_quantities=stock_quantities)
+
+    def adjust_rating(self, product_id: int, score_delta: float, count_delta: int) -> None:
+        """Cộng thay đổi tổng điểm / số lượt đánh giá của một sản phẩm sau khi đánh giá được commit"""
+        with self._lock:
+            self._generation += 1
+            columns = self._columns
+            if columns is None or product_id not in columns.index:
+                return
+
+            row = columns.index[product_id]
+            rating_sums = columns.rating_sums.copy()
+            rating_counts = columns.rating_counts.copy()
+            rating_sums[row] += score_delta
+            rating_counts[row] += count_delta
+            self._columns = columns._replace(rating_sums=rating_sums, rating_counts=rating_counts)
+
+    def remove(self, product_id: int) -> None:
+        """Xóa một sản phẩm khỏi snapshot (sản phẩm bị xóa mềm hoặc ngừng hoạt động)"""
+        with self._lock:
+            self._generation += 1
+            columns = self._columns
+            if columns is None or product_id not in columns.index:
+                return
+
+            row = columns.index[product_id]
+            self._columns = columns._replace(**{
+                name: np.delete(getattr(columns, name), row) for name in CatalogColumns.ROW_COLUMNS
+            })
+
+    def facets(
+        self,
+        columns: CatalogColumns,
+        category_ids: Optional[Iterable[int]] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        product_ids: Optional[Iterable[int]] = None
+    ) -> Dict[str, Any]:
+        """
+        Tính các facet cho bộ lọc hiện tại.
+
+        Số lượng theo danh mục được tính với mọi bộ lọc trừ danh mục, histogram giá
+        được tính với mọi bộ lọc trừ khoảng giá, để người dùng thấy được kết quả nếu
+        đổi lựa chọn của chính facet đó.
+        """
+        if product_ids is not None:
+            product_ids = list(product_ids)
+
+        category_mask = columns.mask(None, min_price, max_price, product_ids)
+        price_mask = columns.mask(category_ids, None, None, product_ids)
+
+        return {
+            "categories": columns.category_counts(category_mask),
+            "price_buckets": columns.price_histogram(price_mask, self.price_edges),
+            "price_range": columns.price_range(price_mask)
+        }
+
+
+# Snapshot dùng chung cho toàn bộ tiến trình
+catalog_snapshot = CatalogSnapshot()
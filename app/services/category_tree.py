@@ -0,0 +1,142 @@
+import threading
+import time
+from typing import Dict, Any, List, Optional, FrozenSet
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.response_cache import response_cache
+from app.models.product import Category
+from app.repositories.product_repository import CategoryRepository
+
+
+class CategoryHierarchy:
+    """
+    Cây danh mục dạng danh sách kề trong bộ nhớ, kèm tập tổ tiên/hậu duệ tính sẵn.
+
+    Được dựng từ một truy vấn duy nhất và không bị thay đổi sau khi tạo; khi danh mục
+    thay đổi, cache dựng một đối tượng mới.
+    """
+
+    def __init__(self, rows: List[Any]):
+        self.nodes: Dict[int, Dict[str, Any]] = {
+            r.category_id: {"id": r.category_id, "name": r.name, "description": r.description}
+            for r in rows
+        }
+        self.parents: Dict[int, Optional[int]] = {}
+        self.children: Dict[int, List[int]] = {cid: [] for cid in self.nodes}
+        for r in rows:
+            # parent_id trỏ tới danh mục không tồn tại thì coi như danh mục gốc
+            parent_id = r.parent_id if r.parent_id in self.nodes and r.parent_id != r.category_id else None
+            self.parents[r.category_id] = parent_id
+            if parent_id is not None:
+                self.children[parent_id].append(r.category_id)
+
+        for child_ids in self.children.values():
+            child_ids.sort(key=lambda cid: (self.nodes[cid]["name"], cid))
+
+        self.ancestors: Dict[int, FrozenSet[int]] = {cid: self._walk_up(cid) for cid in self.nodes}
+        self.roots = sorted(
+            (cid for cid, parent_id in self.parents.items() if parent_id is None),
+            key=lambda cid: (self.nodes[cid]["name"], cid)
+        )
+
+        # Hậu duệ của một danh mục (gồm chính nó) = các danh mục có nó trong tập tổ tiên
+        descendants: Dict[int, set] = {cid: {cid} for cid in self.nodes}
+        for cid, ancestor_ids in self.ancestors.items():
+            for ancestor_id in ancestor_ids:
+                descendants[ancestor_id].add(cid)
+        self.descendants: Dict[int, FrozenSet[int]] = {
+            cid: frozenset(ids) for cid, ids in descendants.items()
+        }
+
+    def _walk_up(self, category_id: int) -> FrozenSet[int]:
+        ancestors = []
+        parent_id = self.parents.get(category_id)
+        # Dừng nếu dữ liệu có chu trình
+        while parent_id is not None and parent_id != category_id and parent_id not in ancestors:
+            ancestors.append(parent_id)
+            parent_id = self.parents.get(parent_id)
+        return frozenset(ancestors)
+
+    def descendant_ids(self, category_id: int) -> FrozenSet[int]:
+        """ID của danh mục và mọi danh mục con cháu; chỉ chính nó nếu không có trong cây"""
+        return self.descendants.get(category_id, frozenset((category_id,)))
+
+    def to_tree(self) -> List[Dict[str, Any]]:
+        """Cây danh mục lồng nhau (id, name, children) bắt đầu từ các danh mục gốc"""
+        return [self._build_node(cid, set()) for cid in self.roots]
+
+    def _build_node(self, category_id: int, visited: set) -> Dict[str, Any]:
+        visited.add(category_id)
+        return {
+            "id": category_id,
+            "name": self.nodes[category_id]["name"],
+            "children": [
+                self._build_node(child_id, visited)
+                for child_id in self.children[category_id] if child_id not in visited
+            ]
+        }
+
+
+class CategoryTreeCache:
+    """
+    Cache cây danh mục cho toàn tiến trình.
+
+    Bị vô hiệu hóa ngay khi một transaction có ghi vào bảng categories được commit
+    (qua mapper event), và được dựng lại sau `ttl_seconds` để đồng bộ với worker khác.
+    """
+
+    def __init__(self, ttl_seconds: int = settings.CATEGORY_TREE_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._hierarchy: Optional[CategoryHierarchy] = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self, db: Session) -> CategoryHierarchy:
+        """Lấy cây danh mục hiện tại, dựng lại nếu chưa có hoặc đã hết hạn"""
+        hierarchy = self._hierarchy
+        if hierarchy is None or time.monotonic() - self._loaded_at > self.ttl_seconds:
+            hierarchy = self.rebuild(db)
+        return hierarchy
+
+    def rebuild(self, db: Session) -> CategoryHierarchy:
+        """Dựng lại cây danh mục từ cơ sở dữ liệu"""
+        hierarchy = CategoryHierarchy(CategoryRepository(db).get_hierarchy_rows())
+        with self._lock:
+            self._hierarchy = hierarchy
+            self._loaded_at = time.monotonic()
+        return hierarchy
+
+    def invalidate(self) -> None:
+        """Xóa cây đã cache, lần đọc tiếp theo sẽ dựng lại"""
+        with self._lock:
+            self._hierarchy = None
+        response_cache.invalidate("categories")
+
+
+# Cache cây danh mục dùng chung cho toàn bộ tiến trình
+category_tree_cache = CategoryTreeCache()
+
+
+def _mark_categories_changed(mapper, connection, target):
+    session = Session.object_session(target)
+    if session is not None:
+        session.info["categories_changed"] = True
+
+
+for _event_name in ("after_insert", "after_update", "after_delete"):
+    event.listen(Category, _event_name, _mark_categories_changed)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session):
+    # Chỉ vô hiệu hóa sau commit để lần dựng lại không đọc phải dữ liệu chưa commit
+    if session.info.pop("categories_changed", False):
+        category_tree_cache.invalidate()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_rollback(session):
+    session.info.pop("categories_changed", None)
@@ -0,0 +1,143 @@
+import logging
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Any, List, Tuple
+
+from app.core.config import settings
+from app.db.base import BatchSessionLocal
+from app.repositories.interaction_repository import ViewHistoryRepository, SearchHistoryRepository
+
+logger = logging.getLogger(__name__)
+
+VIEW_EVENT = "view"
+SEARCH_EVENT = "search"
+
+
+class BufferedEventWriter:
+    """
+    Ghi các sự kiện hành vi (lượt xem, lịch sử tìm kiếm) theo lô ở một background thread.
+
+    Request chỉ đưa sự kiện vào hàng đợi trong bộ nhớ (không chạm DB). Thread ghi gom sự kiện
+    và flush bằng một câu INSERT nhiều dòng cho mỗi loại khi đủ `batch_size` sự kiện hoặc sau
+    `flush_interval_ms`. Hàng đợi có giới hạn `max_queue`: khi đầy, sự kiện mới bị bỏ qua
+    (và được đếm) thay vì làm chậm request. `close` ghi nốt các sự kiện còn lại khi tắt ứng dụng.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = settings.EVENT_WRITER_BATCH_SIZE,
+        flush_interval_ms: int = settings.EVENT_WRITER_FLUSH_INTERVAL_MS,
+        max_queue: int = settings.EVENT_WRITER_MAX_QUEUE
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000.0
+        self._queue: "queue.Queue[Tuple[str, Dict[str, Any]]]" = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def record_view(self, user_id: int, product_id: int) -> None:
+        """Đưa một lượt xem sản phẩm vào hàng đợi ghi"""
+        self._enqueue(VIEW_EVENT, {
+            "user_id": user_id,
+            "product_id": product_id,
+            "view_timestamp": datetime.utcnow()
+        })
+
+    def record_search(self, user_id: int, query: str) -> None:
+        """Đưa một truy vấn tìm kiếm vào hàng đợi ghi"""
+        self._enqueue(SEARCH_EVENT, {
+            "user_id": user_id,
+            "query": query[:255],
+            "search_timestamp": datetime.utcnow()
+        })
+
+    def close(self, timeout: float = 10.0) -> None:
+        """Dừng thread ghi sau khi đã flush toàn bộ sự kiện còn trong hàng đợi"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def stats(self) -> Dict[str, int]:
+        """Số sự kiện đã ghi, bị bỏ qua, ghi lỗi và đang chờ"""
+        return {
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "pending": self._queue.qsize()
+        }
+
+    def _enqueue(self, kind: str, event: Dict[str, Any]) -> None:
+        self._ensure_started()
+        try:
+            self._queue.put_nowait((kind, event))
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped % 1000 == 1:
+                logger.warning(f"Hàng đợi sự kiện đầy, đã bỏ qua {self.dropped} sự kiện")
+
+    def _ensure_started(self) -> None:
+        # Thread được tạo khi có sự kiện đầu tiên, nên import module không sinh thread
+        if self._thread is not None and not self._stop.is_set():
+            return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="event-writer", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            batch = self._collect()
+            if batch:
+                self._flush(batch)
+            elif self._stop.is_set():
+                return
+
+    def _collect(self) -> List[Tuple[str, Dict[str, Any]]]:
+        """Lấy tối đa `batch_size` sự kiện, chờ không quá `flush_interval` kể từ sự kiện đầu tiên"""
+        batch = []
+        deadline = None
+        while len(batch) < self.batch_size:
+            if deadline is None:
+                # Chưa có sự kiện nào: chờ từng khoảng ngắn để kịp nhận tín hiệu dừng
+                timeout = self.flush_interval
+            else:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+            try:
+                batch.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                if batch or self._stop.is_set():
+                    break
+                continue
+            if deadline is None:
+                deadline = time.monotonic() + self.flush_interval
+        return batch
+
+    def _flush(self, batch: List[Tuple[str, Dict[str, Any]]]) -> None:
+        views = [event for kind, event in batch if kind == VIEW_EVENT]
+        searches = [event for kind, event in batch if kind == SEARCH_EVENT]
+
+        db = BatchSessionLocal()
+        try:
+            ViewHistoryRepository(db).add_views(views)
+            SearchHistoryRepository(db).add_searches(searches)
+            self.written += len(batch)
+        except Exception as e:
+            db.rollback()
+            self.failed += len(batch)
+            logger.error(f"Không thể ghi {len(batch)} sự kiện hành vi: {str(e)}")
+        finally:
+            db.close()
+
+
+# Event writer dùng chung cho toàn bộ tiến trình
+event_writer = BufferedEventWriter()
@@ -8,6 +8,14 @@ from app.repositories.order_repository import OrderRepository, OrderItemReposito
 from app.repositories.product_repository import ProductRepository
 from app.repositories.interaction_repository import CartRepository
 from app.repositories.user_repository import UserAddressRepository
+from app.db.routing import read_only
+from app.services.catalog_snapshot import catalog_snapshot
+from app.services.cart_summary import cart_summary_cache
+from app.services.sales_rollup import sales_rollup
+from app.core.response_cache import response_cache
+from app.core.config import settings
+from app.db.errors import is_transient_error
+from tenacity import Retrying, retry_if_exception, stop_after_attempt, wait_random_exponential
 
 class OrderService:
     """Service xử lý logic nghiệp vụ cho đơn hàng"""
@@ -20,6 +28,7 @@ class OrderService:
         self.cart_repo = CartRepository(db)
         self.address_repo = UserAddressRepository(db)
     
+    @read_only(user_arg="user_id")
     def get_orders_by_user(self, user_id: int, page: int = 1, page_size: int = 10) -> Dict[str, Any]:
         """
         Lấy danh sách đơn hàng của người dùng
@@ -41,8 +50,8 @@ class OrderService:
         # Tính toán offset cho phân trang
         skip = (page - 1) * page_size
         
-        # Lấy danh sách đơn hàng
-        orders = self.order_repo.get_by_user_id(user_id, skip=skip, limit=page_size)
+        # Lấy danh sách đơn hàng kèm số mặt hàng (một truy vấn)
+        orders = self.order_repo.get_by_user_id_with_item_counts(user_id, skip=skip, limit=page_size)
         
         # Đếm tổng số đơn hàng
         total_count = self.order_repo.count_by_user_id(user_id)
@@ -52,16 +61,14 @@ class OrderService:
         
         # Format kết quả
         formatted_orders = []
-        for order in orders:
-            order_items = self.order_item_repo.get_by_order_id(order.order_id)
-            
+        for order, item_count in orders:
             formatted_orders.append({
                 "order_id": order.order_id,
                 "order_date": order.order_date.isoformat(),
                 "status": order.status.value,
                 "total_amount": order.total_amount,
                 "payment_method": order.payment_method.value,
-                "item_count": len(order_items),
+                "item_count": item_count,
                 "shipping_address": order.shipping_address  # Đã lưu dưới dạng JSON
             })
         
@@ -75,6 +82,7 @@ class OrderService:
             }
         }
     
+    @read_only(user_arg="user_id")
     def get_order_details(self, order_id: int, user_id: Optional[int] = None) -> Dict[str, Any]:
         """
         Lấy chi tiết đơn hàng
@@ -100,24 +108,20 @@ class OrderService:
         if user_id is not None and order.user_id != user_id:
             return {"success": False, "message": "Bạn không có quyền xem đơn hàng này"}
         
-        # Lấy các mục trong đơn hàng
-        order_items = self.order_item_repo.get_by_order_id(order_id)
+        # Lấy các mục trong đơn hàng kèm tên sản phẩm và ảnh chính (một truy vấn)
+        order_lines = self.order_item_repo.get_lines_with_products(order_id)
         
         # Format kết quả
         formatted_items = []
-        for item in order_items:
-            # Lấy thông tin sản phẩm hiện tại (có thể không còn tồn tại)
-            product = self.product_repo.get_by_id(item.product_id)
-            
+        for item, product_name, image_url in order_lines:
             formatted_items.append({
                 "order_item_id": item.order_item_id,
                 "product_id": item.product_id,
-                "product_name": product.name if product else "Sản phẩm không còn tồn tại",
+                "product_name": product_name if product_name is not None else "Sản phẩm không còn tồn tại",
                 "quantity": item.quantity,
                 "price_at_purchase": item.price_at_purchase,
                 "subtotal": item.price_at_purchase * item.quantity,
-                "image_url": next((img.image_url for img in product.images if img.is_primary), 
-                                 (product.images[0].image_url if product and product.images else None)) if product else None
+                "image_url": image_url
             })
         
         return {
@@ -135,9 +139,25 @@ class OrderService:
             }
         }
     
-    def place_order(self, user_id: int, address_id: int, notes: Optional[str] = None) -> Dict[str, Any]:
+    def place_order(
+        self,
+        user_id: int,
+        address_id: int,
+        notes: Optional[str] = None,
+        stock_mode: Optional[str] = None
+    ) -> Dict[str, Any]:
         """
-        Đặt đơn hàng từ giỏ hàng hiện tại của người dùng
+        Đặt đơn hàng từ giỏ hàng hiện tại của người dùng.
+        
+        Toàn bộ sản phẩm được đọc bằng một truy vấn, kiểm tra tồn kho trong bộ nhớ, sau đó
+        tạo đơn, thêm chi tiết và giảm tồn kho bằng các câu lệnh theo tập hợp trong cùng một
+        transaction, nên số round trip không tăng theo số sản phẩm trong giỏ.
+        
+        Chế độ "pessimistic" khóa các sản phẩm (SELECT ... FOR UPDATE) ngay từ đầu transaction.
+        Chế độ "optimistic" không khóa trước: tồn kho được giữ bởi câu UPDATE có điều kiện ở cuối
+        transaction nên khóa dòng chỉ được giữ trong thời gian rất ngắn, phù hợp khi nhiều người
+        cùng mua một vài sản phẩm (flash sale). Deadlock/hết thời gian chờ khóa được thử lại
+        với backoff; hết hàng thì trả lỗi ngay, không thử lại.
         
         Parameters:
         -----------
@@ -147,109 +167,127 @@ class OrderService:
             ID của địa chỉ giao hàng
         notes : str, optional
             Ghi chú cho đơn hàng
+        stock_mode : str, optional
+            "pessimistic" hoặc "optimistic", mặc định CHECKOUT_STOCK_MODE
             
         Returns:
         --------
         Dict[str, Any]
             Kết quả đặt hàng
         """
-        # Bắt đầu transaction
+        mode = (stock_mode or settings.CHECKOUT_STOCK_MODE).lower()
         try:
-            # 1. Lấy giỏ hàng
-            cart_items = self.cart_repo.get_by_user_id(user_id)
-            if not cart_items:
-                return {"success": False, "message": "Giỏ hàng trống, không thể đặt hàng"}
-            
-            # 2. Lấy địa chỉ giao hàng
-            address = self.address_repo.get_by_id(address_id)
-            if not address or address.user_id != user_id:
-                return {"success": False, "message": "Địa chỉ giao hàng không hợp lệ"}
-            
-            # 3. Convert địa chỉ thành JSON để lưu
-            shipping_address = {
-                "address_id": address.address_id,
-                "street": address.street,
-                "city": address.city,
-                "state": address.state,
-                "country": address.country,
-                "postal_code": address.postal_code,
-                "phone": address.phone
-            }
-            
-            # 4. Kiểm tra tồn kho và tính tổng tiền
-            total_amount = 0.0
-            order_items_data = []
-            products_to_update = []
-            
-            for cart_item in cart_items:
-                # Kiểm tra và khóa tồn kho
-                if not self.product_repo.check_and_lock_stock(cart_item.product_id, cart_item.quantity):
-                    # Rollback transaction
-                    self.db.rollback()
-                    return {"success": False, "message": f"Sản phẩm (ID: {cart_item.product_id}) không đủ số lượng trong kho"}
-                
-                # Lấy thông tin sản phẩm
-                product = self.product_repo.get_by_id(cart_item.product_id)
-                if not product or not product.is_active:
-                    # Rollback transaction
-                    self.db.rollback()
-                    return {"success": False, "message": f"Sản phẩm (ID: {cart_item.product_id}) không còn tồn tại hoặc không hoạt động"}
-                
-                # Tính tiền cho mục này
-                item_total = product.price * cart_item.quantity
-                total_amount += item_total
-                
-                # Chuẩn bị dữ liệu order_item
-                order_items_data.append({
-                    "product_id": product.product_id,
-                    "quantity": cart_item.quantity,
-                    "price_at_purchase": product.price
-                })
-                
-                # Thêm vào danh sách sản phẩm cần cập nhật tồn kho
-                products_to_update.append((product.product_id, cart_item.quantity))
-            
-            # 5. Tạo đơn hàng
-            order_data = {
-                "user_id": user_id,
-                "order_date": datetime.utcnow(),
-                "total_amount": total_amount,
-                "status": OrderStatus.PENDING,
-                "payment_method": PaymentMethod.COD,  # Mặc định là COD
-                "shipping_address": shipping_address,
-                "notes": notes
-            }
-            
-            order = self.order_repo.create_order(order_data)
-            
-            # 6. Tạo chi tiết đơn hàng
-            for item_data in order_items_data:
-                item_data["order_id"] = order.order_id
-                self.order_item_repo.create_order_item(item_data)
-            
-            # 7. Cập nhật tồn kho
-            for product_id, quantity in products_to_update:
-                self.product_repo.decrease_stock(product_id, quantity)
-            
-            # 8. Xóa giỏ hàng
-            self.cart_repo.clear_cart(user_id)
-            
-            # 9. Commit transaction
-            self.db.commit()
-            
-            # 10. Trả về kết quả thành công
-            return {
-                "success": True,
-                "message": "Đặt hàng thành công",
-                "order_id": order.order_id,
-                "total_amount": total_amount
-            }
+            if mode == "optimistic":
+                retrying = Retrying(
+                    retry=retry_if_exception(is_transient_error),
+                    stop=stop_after_attempt(settings.CHECKOUT_MAX_ATTEMPTS),
+                    wait=wait_random_exponential(multiplier=0.005, max=settings.CHECKOUT_RETRY_MAX_WAIT_MS / 1000.0),
+                    before_sleep=lambda retry_state: self.db.rollback(),
+                    reraise=True
+                )
+                return retrying(self._checkout, user_id, address_id, notes, False)
+            return self._checkout(user_id, address_id, notes, True)
             
         except Exception as e:
             # Rollback nếu có lỗi
             self.db.rollback()
             return {"success": False, "message": f"Lỗi khi đặt hàng: {str(e)}"}
     
+    def _checkout(self, user_id: int, address_id: int, notes: Optional[str], lock_rows: bool) -> Dict[str, Any]:
+        """Một lần chạy transaction đặt hàng; lỗi cơ sở dữ liệu được ném ra để caller thử lại hoặc rollback"""
+        # 1. Lấy giỏ hàng
+        cart_items = self.cart_repo.get_by_user_id(user_id)
+        if not cart_items:
+            return {"success": False, "message": "Giỏ hàng trống, không thể đặt hàng"}
+        
+        # 2. Lấy địa chỉ giao hàng
+        address = self.address_repo.get_by_id(address_id)
+        if not address or address.user_id != user_id:
+            return {"success": False, "message": "Địa chỉ giao hàng không hợp lệ"}
+        
+        # 3. Convert địa chỉ thành JSON để lưu
+        shipping_address = {
+            "address_id": address.address_id,
+            "street": address.street,
+            "city": address.city,
+            "state": address.state,
+            "country": address.country,
+            "postal_code": address.postal_code,
+            "phone": address.phone
+        }
+        
+        # 4. Đọc toàn bộ sản phẩm trong giỏ bằng một truy vấn; chế độ pessimistic khóa các dòng
+        # (theo thứ tự product_id), chế độ optimistic chỉ đọc và dựa vào UPDATE có điều kiện ở bước 8
+        quantities = {}
+        for cart_item in cart_items:
+            quantities[cart_item.product_id] = quantities.get(cart_item.product_id, 0) + cart_item.quantity
+        if lock_rows:
+            products = self.product_repo.lock_for_checkout(sorted(quantities))
+        else:
+            products = self.product_repo.get_for_checkout(sorted(quantities))
+        products = {p.product_id: p for p in products}
+        
+        # 5. Kiểm tra tồn kho và tính tổng tiền trong bộ nhớ
+        total_amount = 0.0
+        order_items_data = []
+        for product_id, quantity in quantities.items():
+            product = products.get(product_id)
+            if not product or not product.is_active:
+                self.db.rollback()
+                return {"success": False, "message": f"Sản phẩm (ID: {product_id}) không còn tồn tại hoặc không hoạt động"}
+            if product.stock_quantity < quantity:
+                self.db.rollback()
+                return {"success": False, "message": f"Sản phẩm (ID: {product_id}) không đủ số lượng trong kho"}
+            
+            total_amount += product.price * quantity
+            order_items_data.append({
+                "product_id": product_id,
+                "quantity": quantity,
+                "price_at_purchase": product.price,
+                "created_at": datetime.utcnow()
+            })
+        
+        # 6. Tạo đơn hàng (flush để có order_id, chưa commit)
+        order_data = {
+            "user_id": user_id,
+            "order_date": datetime.utcnow(),
+            "total_amount": total_amount,
+            "status": OrderStatus.PENDING,
+            "payment_method": PaymentMethod.COD,  # Mặc định là COD
+            "shipping_address": shipping_address,
+            "notes": notes
+        }
+        order = self.order_repo.create_order(order_data, commit=False)
+        order_id = order.order_id
+        
+        # 7. Thêm chi tiết đơn hàng bằng một câu INSERT nhiều dòng
+        for item_data in order_items_data:
+            item_data["order_id"] = order_id
+        self.order_item_repo.bulk_insert(order_items_data)
+        
+        # 8. Giảm tồn kho bằng một câu UPDATE ... CASE (có điều kiện stock_quantity >= số lượng),
+        # nên kể cả khi không khóa trước cũng không thể bán quá số lượng tồn kho
+        if not self.product_repo.decrease_stock_bulk(quantities):
+            self.db.rollback()
+            return {"success": False, "message": "Một số sản phẩm không đủ số lượng trong kho"}
+        
+        # 9. Xóa giỏ hàng và commit toàn bộ trong một transaction
+        self.cart_repo.clear_cart(user_id, commit=False)
+        self.db.commit()
+        cart_summary_cache.set(user_id, 0, 0.0)
+        # Trừ tương đối: tồn kho đọc ở bước 4 có thể đã cũ (chế độ optimistic không khóa),
+        # còn số lượng đã trừ bởi UPDATE có điều kiện ở bước 8 thì chắc chắn đúng
+        catalog_snapshot.adjust_stock({product_id: -quantity for product_id, quantity in quantities.items()})
+        response_cache.invalidate(*(f"product:{product_id}" for product_id in quantities))
+        
+        # 10. Trả về kết quả thành công
+        return {
+            "success": True,
+            "message": "Đặt hàng thành công",
+            "order_id": order_id,
+            "total_amount": total_amount
+        }
+        
     def cancel_order(self, order_id: int, user_id: int) -> Dict[str, Any]:
         """
         Hủy đơn hàng nếu đơn hàng ở trạng thái PENDING
@@ -266,36 +304,43 @@ class OrderService:
         Dict[str, Any]
             Kết quả hủy đơn hàng
         """
-        # Lấy thông tin đơn hàng
-        order = self.order_repo.get_by_id(order_id)
-        if not order:
-            return {"success": False, "message": "Đơn hàng không tồn tại"}
-        
-        # Kiểm tra quyền 
-        if order.user_id != user_id:
-            return {"success": False, "message": "Bạn không có quyền hủy đơn hàng này"}
-        
-        # Kiểm tra trạng thái đơn hàng
-        if order.status != OrderStatus.PENDING:
-            return {"success": False, "message": f"Không thể hủy đơn hàng ở trạng thái {order.status.value}"}
-        
         try:
             # Bắt đầu transaction
             
+            # Khóa dòng đơn hàng trước khi kiểm tra trạng thái: hai yêu cầu hủy cùng lúc
+            # được tuần tự hóa, yêu cầu sau thấy đơn đã CANCELLED và không trừ doanh số lần nữa
+            order = self.order_repo.lock_by_id(order_id)
+            if not order:
+                self.db.rollback()
+                return {"success": False, "message": "Đơn hàng không tồn tại"}
+            
+            # Kiểm tra quyền 
+            if order.user_id != user_id:
+                self.db.rollback()
+                return {"success": False, "message": "Bạn không có quyền hủy đơn hàng này"}
+            
+            # Kiểm tra trạng thái đơn hàng
+            if order.status != OrderStatus.PENDING:
+                status = order.status.value
+                self.db.rollback()
+                return {"success": False, "message": f"Không thể hủy đơn hàng ở trạng thái {status}"}
+            
+            # 0. Trừ doanh số theo ngày nếu đơn đã được tổng hợp (khóa watermark trước khi đổi trạng thái)
+            sales_rollup.subtract_order(self.db, order_id)
+            
             # 1. Cập nhật trạng thái đơn hàng thành CANCELLED
-            order = self.order_repo.update_status(order_id, OrderStatus.CANCELLED)
+            order = self.order_repo.update_status(order_id, OrderStatus.CANCELLED, commit=False)
             
-            # 2. Hoàn trả số lượng tồn kho
-            order_items = self.order_item_repo.get_by_order_id(order_id)
-            for item in order_items:
-                product = self.product_repo.get_by_id(item.product_id)
-                if product:
-                    # Tăng số lượng tồn kho
-                    product.stock_quantity += item.quantity
-                    self.db.add(product)
+            # 2. Hoàn trả số lượng tồn kho (UPDATE tương đối, không ghi đè tồn kho đã đọc)
+            quantities: Dict[int, int] = {}
+            for item in self.order_item_repo.get_by_order_id(order_id):
+                quantities[item.product_id] = quantities.get(item.product_id, 0) + item.quantity
+            self.product_repo.increase_stock_bulk(quantities)
             
             # 3. Commit transaction
             self.db.commit()
+            catalog_snapshot.adjust_stock(quantities)
+            response_cache.invalidate(*(f"product:{product_id}" for product_id in quantities))
             
             # 4. Trả về kết quả thành công
             return {
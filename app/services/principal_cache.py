@@ -0,0 +1,137 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.user import User
+
+
+class Principal:
+    """Người dùng đã xác thực của một request: chỉ gồm các thông tin cần cho phân quyền"""
+
+    def __init__(self, user_id: int, is_admin: bool, version: int = 0):
+        self.user_id = user_id
+        self.is_admin = is_admin
+        # Thế hệ của cache trước khi tải người dùng (xem PrincipalCache.invalidate_user)
+        self.version = version
+
+    @classmethod
+    def from_user(cls, user: User, version: int = 0) -> "Principal":
+        return cls(user.user_id, bool(user.is_admin), version)
+
+
+class PrincipalCache:
+    """
+    Cache người dùng đã xác thực theo token (`jti`), để request có token hợp lệ không cần
+    truy vấn bảng users.
+
+    Mỗi lần người dùng bị vô hiệu hóa, bị xóa hoặc đổi quyền admin, bộ đếm thế hệ chung tăng
+    lên và được ghi lại cho người dùng đó. Principal mang thế hệ đọc được *trước* khi tải người
+    dùng từ cơ sở dữ liệu (`generation`), nên chỉ hợp lệ nếu được tải sau lần vô hiệu hóa gần
+    nhất; kể cả khi việc vô hiệu hóa chen vào giữa lúc tải và lúc `put`. Entry hết hạn sau
+    `ttl_seconds` (giới hạn độ trễ với thay đổi từ worker khác).
+
+    Số người dùng được ghi thế hệ cũng bị giới hạn bởi `max_entries`: khi bỏ bớt, thế hệ của
+    người dùng bị bỏ được nâng thành mức sàn chung (`_floor`), nên không principal cũ nào
+    được coi là hợp lệ trở lại (chỉ làm một số entry của người dùng khác hết hiệu lực sớm).
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: int = settings.PRINCIPAL_CACHE_TTL_SECONDS,
+        max_entries: int = settings.PRINCIPAL_CACHE_MAX_ENTRIES
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, Principal]]" = OrderedDict()
+        # user_id -> thế hệ của lần vô hiệu hóa gần nhất (theo thứ tự vô hiệu hóa)
+        self._versions: "OrderedDict[int, int]" = OrderedDict()
+        self._generation = 0
+        self._floor = 0
+        self._lock = threading.Lock()
+
+    def generation(self) -> int:
+        """Thế hệ hiện tại; đọc trước khi tải người dùng từ cơ sở dữ liệu rồi truyền cho `put`"""
+        with self._lock:
+            return self._generation
+
+    def _is_current(self, user_id: int, version: int) -> bool:
+        return version >= self._versions.get(user_id, self._floor)
+
+    def get(self, token_id: str, user_id: int) -> Optional[Principal]:
+        """Principal đã cache của token, None nếu chưa có, hết hạn hoặc đã bị vô hiệu hóa"""
+        with self._lock:
+            entry = self._entries.get(token_id)
+            if entry is None:
+                return None
+            expires_at, principal = entry
+            if (
+                expires_at < time.monotonic()
+                or principal.user_id != user_id
+                or not self._is_current(user_id, principal.version)
+            ):
+                del self._entries[token_id]
+                return None
+            self._entries.move_to_end(token_id)
+            return principal
+
+    def put(self, token_id: str, user: User, generation: int) -> Principal:
+        """
+        Cache người dùng vừa được tải từ cơ sở dữ liệu cho token. `generation` là giá trị của
+        `generation()` trước khi tải; nếu người dùng bị vô hiệu hóa sau đó thì không cache.
+        """
+        principal = Principal.from_user(user, generation)
+        with self._lock:
+            if not self._is_current(user.user_id, generation):
+                return principal
+            self._entries[token_id] = (time.monotonic() + self.ttl_seconds, principal)
+            self._entries.move_to_end(token_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return principal
+
+    def invalidate_user(self, user_id: int) -> None:
+        """Vô hiệu hóa mọi principal đã cache (hoặc đang được tải) của người dùng"""
+        with self._lock:
+            self._generation += 1
+            self._versions[user_id] = self._generation
+            self._versions.move_to_end(user_id)
+            while len(self._versions) > self.max_entries:
+                _, version = self._versions.popitem(last=False)
+                self._floor = max(self._floor, version)
+
+
+# Cache principal dùng chung cho toàn bộ tiến trình
+principal_cache = PrincipalCache()
+
+
+def _mark_principal_changed(session: Optional[Session], user_id: int) -> None:
+    if session is not None:
+        session.info.setdefault("principals_changed", set()).add(user_id)
+
+
+@event.listens_for(User, "after_update")
+def _user_updated(mapper, connection, target):
+    state = inspect(target)
+    if state.attrs.is_active.history.has_changes() or state.attrs.is_admin.history.has_changes():
+        _mark_principal_changed(Session.object_session(target), target.user_id)
+
+
+@event.listens_for(User, "after_delete")
+def _user_deleted(mapper, connection, target):
+    _mark_principal_changed(Session.object_session(target), target.user_id)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session):
+    for user_id in session.info.pop("principals_changed", ()):
+        principal_cache.invalidate_user(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_rollback(session):
+    session.info.pop("principals_changed", None)
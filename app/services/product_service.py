@@ -4,9 +4,17 @@ from sqlalchemy.orm import Session
 from app.repositories.product_repository import (
     ProductRepository, CategoryRepository, ProductImageRepository, TagRepository
 )
-from app.repositories.interaction_repository import ViewHistoryRepository
 from app.models.product import Product, Category, ProductImage
+from app.models.interaction import Rating
+from app.repositories.interaction_repository import RatingRepository
 from app.api.schemas.product import ProductCreate, ProductUpdate # Thêm import này
+from app.services.catalog_snapshot import catalog_snapshot
+from app.recommendations.serving.session import session_recommender
+from app.core.response_cache import response_cache
+from app.services.event_writer import event_writer
+from app.services.category_tree import category_tree_cache
+from app.services.cart_summary import cart_summary_cache
+from app.db.routing import read_only
 
 class ProductService:
     """Service xử lý logic nghiệp vụ liên quan đến sản phẩm"""
@@ -17,8 +25,8 @@ class ProductService:
         self.category_repo = CategoryRepository(db)
         self.image_repo = ProductImageRepository(db)
         self.tag_repo = TagRepository(db)
-        self.view_history_repo = ViewHistoryRepository(db)
     
+    @read_only(user_arg="user_id")
     def get_product_by_id(self, product_id: int, user_id: Optional[int] = None, allow_inactive: bool = False) -> Optional[Dict[str, Any]]:
         """
         Lấy thông tin chi tiết sản phẩm và ghi lại lượt xem nếu có user_id
@@ -37,7 +45,8 @@ class ProductService:
         Optional[Dict[str, Any]]
             Thông tin chi tiết sản phẩm
         """
-        product = self.product_repo.get_by_id(product_id)
+        # Sản phẩm, danh mục, ảnh và tags được tải trong hai truy vấn
+        product = self.product_repo.get_detail(product_id)
         
         if not product: # Sản phẩm không tồn tại
             return None
@@ -47,13 +56,14 @@ class ProductService:
         
         # Ghi lại lượt xem nếu người dùng đã đăng nhập và sản phẩm active (hoặc được phép lấy inactive)
         if user_id and product.is_active: # Chỉ ghi view cho sản phẩm active
-            self.view_history_repo.add_view(user_id, product_id)
+            # Ghi theo lô ở background, request không phải chờ transaction ghi
+            event_writer.record_view(user_id, product_id)
+            # Cập nhật phiên xem trong bộ nhớ cho gợi ý thời gian thực
+            session_recommender.record_view(user_id, product_id)
         
-        # Lấy ảnh sản phẩm
-        images = self.image_repo.get_by_product_id(product_id)
-        
-        # Lấy tags sản phẩm
-        tags = self.tag_repo.get_by_product_id(product_id)
+        # Thứ tự hiển thị giống ProductImageRepository.get_by_product_id
+        images = sorted(product.images, key=lambda img: (img.display_order or 0, not img.is_primary))
+        tags = product.tags
         
         # Tạo đối tượng kết quả
         result = {
@@ -77,7 +87,10 @@ class ProductService:
                     "display_order": getattr(img, 'display_order', 0)
                 } for img in images
             ],
-            "tags": [tag.name for tag in tags]
+            "tags": [tag.name for tag in tags],
+            "average_rating": round(product.rating_stats.average, 2) if product.rating_stats else 0.0,
+            "rating_count": product.rating_stats.rating_count if product.rating_stats else 0,
+            "rating_histogram": product.rating_stats.histogram if product.rating_stats else {star: 0 for star in range(1, 6)}
         }
         
         return result
@@ -102,7 +115,7 @@ class ProductService:
         search_query : str, optional
             Từ khóa tìm kiếm
         category_id : int, optional
-            ID danh mục cần lọc
+            ID danh mục cần lọc (gồm cả các danh mục con)
         min_price, max_price : float, optional
             Khoảng giá cần lọc
         order_by : str
@@ -122,11 +135,14 @@ class ProductService:
         # Tính toán offset cho phân trang
         skip = (page - 1) * page_size
         
+        # Lọc theo danh mục gồm cả các danh mục con
+        category_ids = self._expand_category(category_id)
+        
         # Lấy danh sách sản phẩm thỏa mãn điều kiện lọc
         products = self.product_repo.get_multi_mananger(
             skip=skip,
             limit=page_size,
-            category_id=category_id,
+            category_ids=category_ids,
             search_query=search_query,
             min_price=min_price,
             max_price=max_price,
@@ -136,7 +152,7 @@ class ProductService:
         
         # Đếm tổng số sản phẩm thỏa mãn điều kiện (không tính phân trang)
         total_count = self.product_repo.get_count_mananger(
-            category_id=category_id,
+            category_ids=category_ids,
             search_query=search_query,
             min_price=min_price,
             max_price=max_price
@@ -147,9 +163,7 @@ class ProductService:
         
         # Ghi lại lịch sử tìm kiếm nếu có user_id và search_query
         if user_id and search_query:
-            from app.repositories.interaction_repository import SearchHistoryRepository
-            search_repo = SearchHistoryRepository(self.db)
-            search_repo.add_search(user_id, search_query)
+            event_writer.record_search(user_id, search_query)
         
         # Format kết quả
         result = {
@@ -184,6 +198,7 @@ class ProductService:
         
         return result
     
+    @read_only(user_arg="user_id")
     def search_products(
         self,
         search_query: Optional[str] = None,
@@ -194,64 +209,78 @@ class ProductService:
         descending: bool = True,
         page: int = 1,
         page_size: int = 20,
-        user_id: Optional[int] = None
+        user_id: Optional[int] = None,
+        include_facets: bool = True
     ) -> Dict[str, Any]:
         """
-        Tìm kiếm sản phẩm với các bộ lọc khác nhau
+        Tìm kiếm sản phẩm với các bộ lọc khác nhau.
+        Việc lọc, đếm và tính facet được thực hiện trên snapshot dạng cột trong bộ nhớ,
+        chỉ truy vấn DB để lấy thông tin các sản phẩm của trang hiện tại.
         
         Parameters:
         -----------
         search_query : str, optional
             Từ khóa tìm kiếm
         category_id : int, optional
-            ID danh mục cần lọc
+            ID danh mục cần lọc (gồm cả các danh mục con)
         min_price, max_price : float, optional
             Khoảng giá cần lọc
         order_by : str
-            Trường để sắp xếp (price, name, created_at)
+            Trường để sắp xếp (price, name, created_at, rating)
         descending : bool
             Sắp xếp giảm dần hay không
         page, page_size : int
             Tham số phân trang
         user_id : int, optional
             ID người dùng (để ghi lại lịch sử tìm kiếm)
+        include_facets : bool
+            Có trả về số lượng theo danh mục và histogram giá hay không
             
         Returns:
         --------
         Dict[str, Any]
-            Kết quả tìm kiếm với phân trang
+            Kết quả tìm kiếm với phân trang (và facets nếu được yêu cầu)
         """
         # Tính toán offset cho phân trang
         skip = (page - 1) * page_size
         
-        # Lấy danh sách sản phẩm thỏa mãn điều kiện lọc
-        products = self.product_repo.get_multi(
-            skip=skip,
-            limit=page_size,
-            category_id=category_id,
-            search_query=search_query,
-            min_price=min_price,
-            max_price=max_price,
-            order_by=order_by,
-            descending=descending
-        )
+        # Lấy snapshot sản phẩm đang hoạt động
+        catalog = catalog_snapshot.get(self.db)
         
-        # Đếm tổng số sản phẩm thỏa mãn điều kiện (không tính phân trang)
-        total_count = self.product_repo.get_count(
-            category_id=category_id,
-            search_query=search_query,
-            min_price=min_price,
-            max_price=max_price
-        )
+        # Lọc theo danh mục gồm cả các danh mục con
+        category_ids = self._expand_category(category_id)
+        
+        # Từ khóa tìm kiếm vẫn được so khớp trong DB để giữ nguyên collation của MySQL
+        matched_ids = self.product_repo.get_active_ids_by_name(search_query) if search_query else None
+        
+        # Lọc và đếm tổng số sản phẩm thỏa mãn điều kiện trên snapshot
+        mask = catalog.mask(category_ids, min_price, max_price, matched_ids)
+        total_count = int(mask.sum())
+        
+        if order_by == "name":
+            # Sắp xếp theo tên cần collation của DB
+            products = self.product_repo.get_multi(
+                skip=skip,
+                limit=page_size,
+                category_ids=category_ids,
+                search_query=search_query,
+                min_price=min_price,
+                max_price=max_price,
+                order_by=order_by,
+                descending=descending
+            )
+        else:
+            # Sắp xếp và phân trang trên snapshot, sau đó chỉ lấy các sản phẩm của trang
+            page_ids = catalog.sorted_ids(mask, order_by, descending)[skip:skip + page_size].tolist()
+            products_by_id = {p.product_id: p for p in self.product_repo.get_by_ids(page_ids)}
+            products = [products_by_id[pid] for pid in page_ids if pid in products_by_id]
         
         # Tính tổng số trang
         total_pages = (total_count + page_size - 1) // page_size if total_count > 0 else 0
         
         # Ghi lại lịch sử tìm kiếm nếu có user_id và search_query
         if user_id and search_query:
-            from app.repositories.interaction_repository import SearchHistoryRepository
-            search_repo = SearchHistoryRepository(self.db)
-            search_repo.add_search(user_id, search_query)
+            event_writer.record_search(user_id, search_query)
         
         # Format kết quả
         result = {
@@ -263,7 +292,9 @@ class ProductService:
                     "category_id": p.category_id,
                     "category_name": p.category.name if p.category else None,
                     "image_url": next((img.image_url for img in p.images if img.is_primary), 
-                                    (p.images[0].image_url if p.images else None))
+                                    (p.images[0].image_url if p.images else None)),
+                    # Điểm đánh giá lấy từ snapshot, không truy vấn thêm cho từng sản phẩm
+                    **catalog.ratings(p.product_id)
                 } for p in products
             ],
             "pagination": {
@@ -282,8 +313,18 @@ class ProductService:
             }
         }
         
+        if include_facets:
+            result["facets"] = catalog_snapshot.facets(
+                catalog,
+                category_ids=category_ids,
+                min_price=min_price,
+                max_price=max_price,
+                product_ids=matched_ids
+            )
+        
         return result
     
+    @read_only
     def get_categories(self) -> List[Dict[str, Any]]:
         """
         Lấy danh sách tất cả danh mục sản phẩm theo cấu trúc phẳng
@@ -301,13 +342,32 @@ class ProductService:
             {
                 "id": category.category_id,
                 "name": category.name,
-                "description": category.description
+                "description": category.description,
+                "parent_id": category.parent_id
             }
             for category in categories
         ]
         
         return result
 
+    @read_only
+    def get_category_tree(self) -> List[Dict[str, Any]]:
+        """
+        Lấy cây danh mục sản phẩm (dựng từ một truy vấn và được cache trong bộ nhớ)
+        
+        Returns:
+        --------
+        List[Dict[str, Any]]
+            Các danh mục gốc, mỗi danh mục có danh sách `children` lồng nhau
+        """
+        return category_tree_cache.get(self.db).to_tree()
+    
+    def _expand_category(self, category_id: Optional[int]) -> Optional[List[int]]:
+        """Danh sách ID của danh mục và các danh mục con cháu (None nếu không lọc theo danh mục)"""
+        if category_id is None:
+            return None
+        return sorted(category_tree_cache.get(self.db).descendant_ids(category_id))
+
     # Thêm các phương thức CRUD cho Product
     def create_product(self, product_data: ProductCreate) -> Product:
         """Tạo sản phẩm mới."""
@@ -316,7 +376,10 @@ class ProductService:
         category = self.category_repo.get_by_id(product_dict["category_id"])
         if not category:
             raise ValueError(f"Category with id {product_dict['category_id']} not found")
-        return self.product_repo.create_product(product_dict)
+        product = self.product_repo.create_product(product_dict)
+        catalog_snapshot.upsert(product)
+        response_cache.invalidate("products")
+        return product
 
     def update_product(self, product_id: int, product_data: ProductUpdate) -> Optional[Product]:
         """Cập nhật thông tin sản phẩm."""
@@ -331,8 +394,37 @@ class ProductService:
             category = self.category_repo.get_by_id(product_dict["category_id"])
             if not category:
                 raise ValueError(f"Category with id {product_dict['category_id']} not found")
-        return self.product_repo.update_product(product_id, product_dict)
+        product = self.product_repo.update_product(product_id, product_dict)
+        if product:
+            catalog_snapshot.upsert(product)
+            response_cache.invalidate("products", f"product:{product_id}")
+            # Tổng tiền giỏ hàng đã cache phụ thuộc giá và trạng thái sản phẩm
+            if "price" in product_dict or "is_active" in product_dict:
+                cart_summary_cache.clear()
+        return product
+
+    def rate_product(self, user_id: int, product_id: int, score: int, comment: Optional[str] = None) -> Rating:
+        """
+        Tạo hoặc cập nhật đánh giá của người dùng cho sản phẩm.
+        Bảng tổng hợp đánh giá được cập nhật trong cùng transaction; snapshot catalog và
+        response cache của sản phẩm được cập nhật sau khi commit.
+        """
+        if not 1 <= score <= 5:
+            raise ValueError("Điểm đánh giá phải từ 1 đến 5")
+        if not self.product_repo.get_by_id(product_id):
+            raise ValueError(f"Product with id {product_id} not found")
+        
+        rating, old_score = RatingRepository(self.db).create_or_update_rating(user_id, product_id, score, comment)
+        if old_score != score:
+            catalog_snapshot.adjust_rating(product_id, score - (old_score or 0), 1 if old_score is None else 0)
+            response_cache.invalidate("products", f"product:{product_id}")
+        return rating
 
     def delete_product(self, product_id: int) -> Optional[Product]:
         """Xóa mềm sản phẩm."""
-        return self.product_repo.delete_product(product_id)
+        product = self.product_repo.delete_product(product_id)
+        if product:
+            catalog_snapshot.remove(product_id)
+            response_cache.invalidate("products", f"product:{product_id}")
+            cart_summary_cache.clear()
+        return product
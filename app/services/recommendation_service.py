@@ -1,4 +1,5 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterator
+import numpy as np
 from sqlalchemy.orm import Session
 
 from app.recommendations.repositories.recommendation_repository import (
@@ -7,6 +8,16 @@ from app.recommendations.repositories.recommendation_repository import (
 from app.repositories.product_repository import ProductRepository
 from app.repositories.interaction_repository import ViewHistoryRepository
 from app.repositories.training_history_repository import TrainingHistoryRepository
+from app.recommendations.serving.popularity import popularity_engine
+from app.recommendations.serving.session import session_recommender
+from app.recommendations.serving.fold_in import fold_in_recommender
+from app.recommendations.serving.reranker import reranker
+from app.recommendations.serving.diversity import mmr_rerank
+from app.recommendations.serving.model_store import model_store
+from app.services.catalog_snapshot import catalog_snapshot
+from app.core.config import settings
+from app.db.routing import read_only
+from app.services.principal_cache import Principal
 
 class RecommendationService:
     """Service xử lý logic nghiệp vụ cho việc gợi ý sản phẩm (Module 3)"""
@@ -19,7 +30,13 @@ class RecommendationService:
         self.view_history_repo = ViewHistoryRepository(db)
         self.training_history_repo = TrainingHistoryRepository(db)
     
-    def get_similar_products(self, product_id: int, limit: int = 10) -> Dict[str, Any]:
+    @read_only
+    def get_similar_products(
+        self,
+        product_id: int,
+        limit: int = 10,
+        mmr_lambda: Optional[float] = None
+    ) -> Dict[str, Any]:
         """
         Lấy danh sách sản phẩm tương tự với một sản phẩm cụ thể.
         Chức năng này được hiển thị trên trang chi tiết sản phẩm.
@@ -30,6 +47,9 @@ class RecommendationService:
             ID của sản phẩm cần tìm các sản phẩm tương tự
         limit : int
             Số lượng sản phẩm tương tự tối đa cần trả về
+        mmr_lambda : float, optional
+            Hệ số λ của MMR (1.0 = chỉ theo độ tương tự, nhỏ hơn = đa dạng hơn),
+            mặc định là SIMILAR_MMR_LAMBDA
             
         Returns:
         --------
@@ -44,178 +64,377 @@ class RecommendationService:
                 "message": "Sản phẩm không tồn tại hoặc không còn hoạt động"
             }
         
-        # Lấy danh sách ID sản phẩm tương tự từ repository
-        similar_products_with_scores = self.product_similarity_repo.get_similar_products(product_id, limit)
+        # Lấy dư ứng viên để bước MMR có đủ lựa chọn
+        similar_products_with_scores = self.product_similarity_repo.get_similar_products(
+            product_id, max(limit, settings.SIMILAR_MMR_CANDIDATES)
+        )
         
-        # Nếu không có sản phẩm tương tự, trả về danh sách trống
-        if not similar_products_with_scores:
-            return {
-                "success": True,
-                "product_id": product_id,
-                "product_name": product.name,
-                "similar_products": []
-            }
-        
-        # Lấy ID của các sản phẩm tương tự
-        similar_product_ids = [p_id for p_id, _ in similar_products_with_scores]
-        
-        # Lấy thông tin chi tiết của các sản phẩm tương tự
-        similar_products_details = self.product_repo.get_by_ids(similar_product_ids)
-        
-        # Tạo map để nhanh chóng tra cứu điểm tương tự theo product_id
-        similarity_scores = {p_id: score for p_id, score in similar_products_with_scores}
-        
-        # Format kết quả
-        formatted_products = []
-        for product in similar_products_details:
-            # Lấy ảnh chính của sản phẩm
-            primary_image = next((img.image_url for img in product.images if img.is_primary), 
-                               (product.images[0].image_url if product.images else None))
-            
-            formatted_products.append({
-                "product_id": product.product_id,
-                "name": product.name,
-                "price": product.price,
-                "similarity_score": similarity_scores.get(product.product_id, 0),
-                "image_url": primary_image
-            })
-        
-        # Sắp xếp lại theo điểm tương tự
-        formatted_products.sort(key=lambda x: x["similarity_score"], reverse=True)
+        # Chỉ giữ các sản phẩm đang hoạt động rồi đa dạng hóa kết quả
+        columns = catalog_snapshot.get(self.db)
+        candidates = [(p_id, score) for p_id, score in similar_products_with_scores if p_id in columns.index]
+        ranked = self._diversify(
+            candidates, columns, limit,
+            settings.SIMILAR_MMR_LAMBDA if mmr_lambda is None else mmr_lambda
+        )
         
         return {
             "success": True,
             "product_id": product_id,
             "product_name": product.name,
-            "similar_products": formatted_products[:limit]
+            "similar_products": self._format_ranked_products(ranked, score_key="similarity_score")
         }
     
-    def get_personalized_recommendations(self, user_id: int, limit: int = 20) -> Dict[str, Any]:
+    def _diversify(self, candidates: List[tuple], columns, limit: int, mmr_lambda: float) -> List[tuple]:
+        """Sắp xếp lại ứng viên bằng MMR trên item factors; giữ nguyên thứ tự nếu chưa có mô hình"""
+        model = model_store.get()
+        if model is None or mmr_lambda >= 1.0 or len(candidates) <= 1:
+            return candidates[:limit]
+        
+        relevance = np.array([score for _, score in candidates], dtype=np.float64)
+        # Sản phẩm chưa có trong mô hình dùng vector 0 (không bị phạt trùng lặp)
+        vectors = np.zeros((len(candidates), model.unit_factors.shape[1]), dtype=np.float32)
+        for i, (p_id, _) in enumerate(candidates):
+            row = model.index.get(p_id)
+            if row is not None:
+                vectors[i] = model.unit_factors[row]
+        categories = columns.category_ids[[columns.index[p_id] for p_id, _ in candidates]]
+        
+        selected = mmr_rerank(
+            relevance, vectors, limit, mmr_lambda,
+            categories=categories, max_per_category=settings.SIMILAR_MAX_PER_CATEGORY or None
+        )
+        return [candidates[i] for i in selected]
+    
+    @read_only(user_arg="principal")
+    def get_personalized_recommendations(
+        self,
+        principal: Principal,
+        limit: int = 20,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None
+    ) -> Dict[str, Any]:
         """
         Lấy danh sách sản phẩm được gợi ý cá nhân hóa cho người dùng.
         
         Parameters:
         -----------
-        user_id : int
-            ID của người dùng cần lấy gợi ý
+        principal : Principal
+            Người dùng đã xác thực cần lấy gợi ý (không truy vấn lại bảng users)
         limit : int
             Số lượng sản phẩm gợi ý tối đa cần trả về
+        min_price : float, optional
+            Giá tối thiểu của sản phẩm được gợi ý
+        max_price : float, optional
+            Giá tối đa của sản phẩm được gợi ý
             
         Returns:
         --------
         Dict[str, Any]
             Danh sách sản phẩm được gợi ý và thông tin liên quan
         """
-        # Lấy đối tượng User đầy đủ từ repository
-        from app.repositories.user_repository import UserRepository
-        user_repo = UserRepository(self.db)
-        user = user_repo.get_by_id(user_id)
+        user_id = principal.user_id
         
-        if not user:
-            return {
-                "success": False,
-                "message": "Không tìm thấy thông tin người dùng"
-            }
-
-        # Lấy danh sách ID sản phẩm được gợi ý từ repository
+        # Lấy dư ứng viên vì bước re-rank sẽ loại bớt (hết hàng, ngoài khoảng giá...)
+        candidate_count = limit * settings.RERANK_OVERFETCH
         
-        recommended_products_with_scores = self.user_recommendation_repo.get_recommendations_for_user(user, limit)
+        # Lấy danh sách ID sản phẩm được gợi ý từ repository
+        recommended_products_with_scores = self.user_recommendation_repo.get_recommendations_for_user(user_id, candidate_count)
         
-        # Nếu không có gợi ý, thử sử dụng chiến lược fallback
+        # Người dùng mới chưa có trong lần huấn luyện gần nhất: tính gợi ý bằng fold-in
         if not recommended_products_with_scores:
-            return self._get_fallback_recommendations(user, limit)
+            recommended_products_with_scores = fold_in_recommender.recommend(self.db, user_id, candidate_count)
         
-        # Lấy ID của các sản phẩm được gợi ý
-        recommended_product_ids = [p_id for p_id, _ in recommended_products_with_scores]
+        # Gợi ý từ phiên xem hiện tại (trong bộ nhớ, không truy vấn DB)
+        session_products_with_scores = session_recommender.recommend(user_id, candidate_count)
         
-        # Lấy thông tin chi tiết của các sản phẩm được gợi ý
-        recommended_products_details = self.product_repo.get_by_ids(recommended_product_ids)
+        # Nếu không có gợi ý, thử sử dụng chiến lược fallback
+        if not recommended_products_with_scores and not session_products_with_scores:
+            return self._get_fallback_recommendations(user_id, limit, min_price, max_price)
         
-        # Tạo map để nhanh chóng tra cứu điểm gợi ý theo product_id
-        recommendation_scores = {p_id: score for p_id, score in recommended_products_with_scores}
+        if session_products_with_scores:
+            ranked = self._blend_session_scores(
+                recommended_products_with_scores, session_products_with_scores, candidate_count
+            )
+            recommendation_type = "personalized_session" if recommended_products_with_scores else "session"
+        else:
+            ranked = recommended_products_with_scores
+            recommendation_type = "personalized"
         
-        # Format kết quả
-        formatted_recommendations = []
-        for product in recommended_products_details:
-            # Lấy ảnh chính của sản phẩm
-            primary_image = next((img.image_url for img in product.images if img.is_primary), 
-                               (product.images[0].image_url if product.images else None))
-            
-            formatted_recommendations.append({
-                "product_id": product.product_id,
-                "name": product.name,
-                "price": product.price,
-                "recommendation_score": recommendation_scores.get(product.product_id, 0),
-                "image_url": primary_image
-            })
+        ranked = self._rerank(
+            ranked, limit, min_price=min_price, max_price=max_price,
+            max_per_category=settings.RERANK_MAX_PER_CATEGORY or None
+        )
         
         return {
             "success": True,
-            "user_id": user.user_id,
-            "recommendations": formatted_recommendations,
-            "recommendation_type": "personalized"
+            "user_id": user_id,
+            "recommendations": self._format_ranked_products(ranked),
+            "recommendation_type": recommendation_type
         }
     
-    def _get_fallback_recommendations(self, user, limit: int = 20) -> Dict[str, Any]:
+    def _blend_session_scores(
+        self,
+        trained: List[tuple],
+        session: List[tuple],
+        limit: int
+    ) -> List[tuple]:
+        """
+        Trộn gợi ý đã huấn luyện với gợi ý theo phiên
+        
+        Điểm huấn luyện được chuẩn hóa về [0, 1] theo điểm cao nhất, điểm phiên là cosine;
+        điểm cuối cùng = (1 - w) * huấn luyện + w * phiên với w = SESSION_BLEND_WEIGHT.
+        """
+        weight = settings.SESSION_BLEND_WEIGHT
+        max_trained = max((abs(score) for _, score in trained), default=0.0) or 1.0
+        
+        blended: Dict[int, float] = {}
+        for product_id, score in trained:
+            blended[product_id] = (1 - weight) * score / max_trained
+        for product_id, score in session:
+            blended[product_id] = blended.get(product_id, 0.0) + weight * score
+        
+        return sorted(blended.items(), key=lambda x: x[1], reverse=True)[:limit]
+    
+    def _rerank(
+        self,
+        candidates: List[tuple],
+        limit: int,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        max_per_category: Optional[int] = None,
+        exclude: Optional[set] = None
+    ) -> List[tuple]:
+        """
+        Áp dụng quy tắc nghiệp vụ (đang bán, còn hàng, khoảng giá, giới hạn theo danh mục)
+        rồi bù bằng sản phẩm phổ biến để đủ đúng `limit` sản phẩm
+        """
+        columns = catalog_snapshot.get(self.db)
+        rules = dict(min_price=min_price, max_price=max_price, max_per_category=max_per_category, exclude=exclude)
+        
+        fallback = popularity_engine.top(self.db, kind="popular", limit=limit * settings.RERANK_OVERFETCH)
+        ranked = reranker.rerank(columns, candidates, limit, fallback=fallback, **rules)
+        
+        # Bộ lọc quá chặt (ví dụ: khoảng giá hẹp): bù từ toàn bộ bảng xếp hạng
+        if len(ranked) < limit:
+            fallback = popularity_engine.top(self.db, kind="popular", limit=len(columns))
+            ranked = reranker.rerank(columns, candidates, limit, fallback=fallback, **rules)
+        
+        return ranked
+    
+    def _get_fallback_recommendations(
+        self,
+        user_id: int,
+        limit: int = 20,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None
+    ) -> Dict[str, Any]:
         """
         Chiến lược dự phòng khi không có gợi ý cá nhân hóa
         
         Parameters:
         -----------
-        user : User
-            Đối tượng User cần lấy gợi ý dự phòng
+        user_id : int
+            ID của người dùng cần lấy gợi ý dự phòng
         limit : int
             Số lượng sản phẩm gợi ý tối đa cần trả về
+        min_price, max_price : float, optional
+            Khoảng giá của sản phẩm được gợi ý
             
         Strategy:
         1. Lấy lịch sử xem gần đây của người dùng
-        2. Nếu có, lấy sản phẩm được xem gần nhất và tìm các sản phẩm tương tự
-        3. Nếu không, trả về các sản phẩm mới nhất
+        2. Nếu có, lấy các sản phẩm trending trong danh mục của sản phẩm được xem gần nhất
+        3. Bổ sung bằng các sản phẩm phổ biến nhất (tra cứu trong bộ nhớ, không truy vấn thêm)
         """
         # Lấy lịch sử xem gần đây của người dùng
-        recent_views = self.view_history_repo.get_by_user_id(user.user_id, limit=5)
+        recent_views = self.view_history_repo.get_by_user_id(user_id, limit=5)
+        viewed_ids = {view.product_id for view in recent_views}
+        
+        ranked: List[tuple] = []
+        based_on = None
         
-        # Nếu người dùng đã xem sản phẩm
+        # Nếu người dùng đã xem sản phẩm: ưu tiên sản phẩm trending cùng danh mục
         if recent_views:
-            # Lấy sản phẩm được xem gần nhất
-            most_recent_view = recent_views[0]
+            columns = catalog_snapshot.get(self.db)
+            row = columns.index.get(recent_views[0].product_id)
+            if row is not None:
+                based_on = recent_views[0].product_id
+                ranked = popularity_engine.top(
+                    self.db, kind="trending", limit=limit * settings.RERANK_OVERFETCH,
+                    category_id=int(columns.category_ids[row]), exclude=viewed_ids
+                )
+        
+        # Lọc theo quy tắc nghiệp vụ và bổ sung bằng các sản phẩm phổ biến nhất
+        ranked = self._rerank(ranked, limit, min_price=min_price, max_price=max_price, exclude=viewed_ids)
+        
+        result = {
+            "success": True,
+            "user_id": user_id,
+            "recommendations": self._format_ranked_products(ranked),
+            "recommendation_type": "trending_in_category" if based_on else "popular"
+        }
+        if based_on:
+            result["based_on_product_id"] = based_on
+        return result
+    
+    @read_only
+    def get_trending_products(
+        self,
+        kind: str = "trending",
+        category_id: Optional[int] = None,
+        limit: int = 20
+    ) -> Dict[str, Any]:
+        """
+        Lấy danh sách sản phẩm trending/phổ biến, dùng cho người dùng ẩn danh và trang chủ
+        
+        Parameters:
+        -----------
+        kind : str
+            'trending' (chu kỳ bán rã ngắn) hoặc 'popular' (chu kỳ bán rã dài)
+        category_id : int, optional
+            Chỉ lấy sản phẩm trong danh mục này
+        limit : int
+            Số lượng sản phẩm tối đa cần trả về
+            
+        Returns:
+        --------
+        Dict[str, Any]
+            Danh sách sản phẩm kèm điểm phổ biến
+        """
+        ranked = popularity_engine.top(self.db, kind=kind, limit=limit, category_id=category_id)
+        
+        return {
+            "success": True,
+            "category_id": category_id,
+            "recommendations": self._format_ranked_products(ranked),
+            "recommendation_type": kind
+        }
+    
+    def iter_batch_recommendations(
+        self,
+        user_ids: List[int],
+        limit: int = 20,
+        chunk_size: int = 500
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Sinh gợi ý cho nhiều người dùng (chiến dịch email/push), từng người một
+        
+        Ứng viên của mỗi người dùng đi qua cùng bước re-rank với `/personalized` (đang bán,
+        còn hàng, giới hạn theo danh mục, bù bằng sản phẩm phổ biến cho đủ `limit`), dùng
+        snapshot catalog và bảng xếp hạng trong bộ nhớ. Mỗi nhóm `chunk_size` người dùng tốn
+        ba truy vấn: kiểm tra người dùng tồn tại, lấy danh sách gợi ý, và lấy thông tin các sản
+        phẩm chưa từng xuất hiện ở nhóm trước (thông tin sản phẩm được dùng lại giữa các người
+        dùng). Người dùng chưa có trong lần huấn luyện gần nhất được tính bằng fold-in
+        (thêm một truy vấn tương tác cho mỗi người), nếu không có tương tác thì nhận sản phẩm
+        phổ biến.
+        
+        Parameters:
+        -----------
+        user_ids : List[int]
+            Danh sách ID người dùng
+        limit : int
+            Số lượng gợi ý tối đa cho mỗi người dùng
+        chunk_size : int
+            Số người dùng được xử lý trong mỗi nhóm truy vấn
+            
+        Yields:
+        -------
+        Dict[str, Any]
+            Kết quả gợi ý của từng người dùng, theo thứ tự của `user_ids`
+        """
+        from app.repositories.user_repository import UserRepository
+        user_repo = UserRepository(self.db)
+        products: Dict[int, Optional[Dict[str, Any]]] = {}
+        candidate_count = limit * settings.RERANK_OVERFETCH
+        
+        for start in range(0, len(user_ids), chunk_size):
+            chunk = list(dict.fromkeys(user_ids[start:start + chunk_size]))
+            existing = set(user_repo.get_existing_ids(chunk))
+            recommendations = self.user_recommendation_repo.get_recommendations_for_users(
+                list(existing), candidate_count
+            )
             
-            # Lấy các sản phẩm tương tự với sản phẩm đã xem gần nhất
-            similar_products_result = self.get_similar_products(most_recent_view.product_id, limit)
+            # Re-rank như /personalized: trong bộ nhớ, không truy vấn thêm
+            ranked_by_user: Dict[int, tuple] = {}
+            for user_id in existing:
+                candidates = recommendations.get(user_id) or fold_in_recommender.recommend(
+                    self.db, user_id, candidate_count
+                )
+                if candidates:
+                    ranked = self._rerank(
+                        candidates, limit, max_per_category=settings.RERANK_MAX_PER_CATEGORY or None
+                    )
+                    ranked_by_user[user_id] = (ranked, "personalized")
+                else:
+                    ranked_by_user[user_id] = (self._rerank([], limit), "popular")
             
-            if similar_products_result.get("success") and similar_products_result.get("similar_products"):
-                return {
+            # Chỉ lấy thông tin các sản phẩm chưa có trong cache của lần gọi này
+            wanted = {product_id for ranked, _ in ranked_by_user.values() for product_id, _ in ranked}
+            missing = [product_id for product_id in wanted if product_id not in products]
+            for product in self.product_repo.get_by_ids_with_images(missing):
+                products[product.product_id] = self._format_product_summary(product)
+            for product_id in missing:
+                products.setdefault(product_id, None)
+            
+            for user_id in chunk:
+                if user_id not in existing:
+                    yield {
+                        "success": False,
+                        "user_id": user_id,
+                        "message": "Không tìm thấy thông tin người dùng"
+                    }
+                    continue
+                
+                ranked, recommendation_type = ranked_by_user[user_id]
+                items = []
+                for product_id, score in ranked:
+                    product = products.get(product_id)
+                    if product is not None:
+                        items.append({**product, "recommendation_score": score})
+                
+                yield {
                     "success": True,
-                    "user_id": user.user_id,
-                    "recommendations": similar_products_result.get("similar_products"),
-                    "recommendation_type": "based_on_history",
-                    "based_on_product_id": most_recent_view.product_id,
-                    "based_on_product_name": similar_products_result.get("product_name")
+                    "user_id": user_id,
+                    "recommendations": items,
+                    "recommendation_type": recommendation_type
                 }
+    
+    def _format_product_summary(self, product) -> Dict[str, Any]:
+        """Thông tin tóm tắt của sản phẩm dùng trong danh sách gợi ý"""
+        # Lấy ảnh chính của sản phẩm
+        primary_image = next((img.image_url for img in product.images if img.is_primary), 
+                           (product.images[0].image_url if product.images else None))
         
-        # Fallback: Lấy sản phẩm mới nhất
-        latest_products = self.product_repo.get_multi(limit=limit, order_by="created_at", descending=True)
+        return {
+            "product_id": product.product_id,
+            "name": product.name,
+            "price": product.price,
+            "image_url": primary_image
+        }
+    
+    def _format_ranked_products(self, ranked: List[tuple], score_key: str = "recommendation_score") -> List[Dict[str, Any]]:
+        """Lấy thông tin sản phẩm cho danh sách (product_id, điểm) và giữ nguyên thứ tự xếp hạng"""
+        products = self.product_repo.get_by_ids([product_id for product_id, _ in ranked])
+        product_map = {p.product_id: p for p in products}
         
-        # Format kết quả
-        formatted_latest = []
-        for product in latest_products:
+        formatted = []
+        for product_id, score in ranked:
+            product = product_map.get(product_id)
+            if not product:
+                continue
+            
             # Lấy ảnh chính của sản phẩm
             primary_image = next((img.image_url for img in product.images if img.is_primary), 
                                (product.images[0].image_url if product.images else None))
             
-            formatted_latest.append({
+            formatted.append({
                 "product_id": product.product_id,
                 "name": product.name,
                 "price": product.price,
+                score_key: score,
                 "image_url": primary_image
             })
         
-        return {
-            "success": True,
-            "user_id": user.user_id,
-            "recommendations": formatted_latest,
-            "recommendation_type": "latest_products"
-        }
+        return formatted
     
     def trigger_training_job(self, admin_id: str) -> Dict[str, Any]:
         """
@@ -234,8 +453,9 @@ class RecommendationService:
         try:
             from app.recommendations.training.job import TrainingJob
             
-            # Gọi job huấn luyện với admin_id
-            result = TrainingJob.run_manual(admin_id=admin_id, db=self.db)
+            # Gọi job huấn luyện với admin_id; job tự lấy session từ pool batch
+            # để không giữ kết nối của pool API trong suốt quá trình huấn luyện
+            result = TrainingJob.run_manual(admin_id=admin_id)
             
             return {
                 "success": True,
@@ -0,0 +1,108 @@
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.base import BatchSessionLocal
+from app.repositories.order_repository import SalesRollupRepository
+
+logger = logging.getLogger(__name__)
+
+
+class SalesRollupAggregator:
+    """
+    Cộng dồn doanh số của các đơn hàng mới vào bảng theo ngày (sản phẩm, danh mục).
+
+    Mỗi lô xử lý tối đa `batch_size` đơn có order_id lớn hơn watermark và được đặt trước
+    thời điểm hiện tại `lag_seconds` giây (để các transaction đặt hàng có order_id nhỏ hơn
+    kịp commit), rồi cộng vào bảng và dời watermark trong cùng một transaction. Watermark
+    được khóa (FOR UPDATE) trong suốt lô, nên việc hủy đơn (`subtract_order`) không chen vào giữa.
+    """
+
+    def __init__(
+        self,
+        lag_seconds: int = settings.SALES_ROLLUP_LAG_SECONDS,
+        batch_size: int = settings.SALES_ROLLUP_BATCH_SIZE
+    ):
+        self.lag_seconds = lag_seconds
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+
+    def run(self, db: Optional[Session] = None) -> int:
+        """
+        Xử lý các đơn hàng mới cho tới khi bắt kịp, trả về số đơn (theo khoảng order_id) đã xử lý
+
+        Parameters:
+        -----------
+        db : Session, optional
+            Session dùng để ghi; mặc định mở session batch riêng
+        """
+        own_session = db is None
+        db = db or BatchSessionLocal()
+        processed = 0
+        try:
+            with self._lock:
+                while True:
+                    batch = self._run_batch(db)
+                    if batch == 0:
+                        break
+                    processed += batch
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Lỗi khi tổng hợp doanh số theo ngày: {str(e)}")
+        finally:
+            if own_session:
+                db.close()
+
+        if processed:
+            logger.info(f"Đã tổng hợp doanh số cho {processed} đơn hàng mới")
+        return processed
+
+    def _run_batch(self, db: Session) -> int:
+        repo = SalesRollupRepository(db)
+        watermark = repo.lock_watermark()
+        after_order_id = watermark.last_order_id
+        placed_before = datetime.utcnow() - timedelta(seconds=self.lag_seconds)
+
+        upto_order_id = repo.get_batch_upper_bound(after_order_id, placed_before, self.batch_size)
+        if upto_order_id is None:
+            db.rollback()
+            return 0
+
+        product_rows, category_rows = repo.aggregate_orders(after_order_id, upto_order_id)
+        repo.add_rows(product_rows, category_rows)
+        watermark.last_order_id = upto_order_id
+        db.commit()
+        return upto_order_id - after_order_id
+
+    def rebuild(self, db: Optional[Session] = None) -> int:
+        """Xóa bảng doanh số và tổng hợp lại toàn bộ đơn hàng (khi cần sửa dữ liệu)"""
+        own_session = db is None
+        db = db or BatchSessionLocal()
+        try:
+            SalesRollupRepository(db).clear()
+            db.commit()
+            return self.run(db)
+        finally:
+            if own_session:
+                db.close()
+
+    @staticmethod
+    def subtract_order(db: Session, order_id: int) -> None:
+        """
+        Trừ phần đóng góp của một đơn hàng bị hủy nếu đơn đã được tổng hợp.
+        Chạy trong transaction hủy đơn của caller (không commit); caller phải gọi trước khi
+        đổi trạng thái đơn để khóa watermark trước aggregator.
+        """
+        repo = SalesRollupRepository(db)
+        if order_id > repo.lock_watermark().last_order_id:
+            return
+        product_rows, category_rows = repo.aggregate_order(order_id)
+        repo.add_rows(product_rows, category_rows, sign=-1)
+
+
+# Aggregator dùng chung cho toàn bộ tiến trình
+sales_rollup = SalesRollupAggregator()
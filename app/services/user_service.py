@@ -1,13 +1,10 @@
 from typing import List, Optional
-from passlib.context import CryptContext
 from sqlalchemy.orm import Session
 
 from app.repositories.user_repository import UserRepository, UserAddressRepository
 from app.models.user import User, UserAddress
 from app.api.schemas.user import UserCreate, UserUpdate, AddressCreate, AddressUpdate
-
-# Password hashing context
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from app.core.security import password_hasher
 
 class UserService:
     def __init__(self, db: Session):
@@ -29,32 +26,59 @@ class UserService:
 
     def authenticate_user(self, email: str, password: str) -> Optional[User]:
         """
-        Xác thực người dùng với email và password
+        Xác thực người dùng với email và password (băm ngay trên thread hiện tại)
+        """
+        user = self.get_by_email(email)
+        if not user:
+            return None
+        valid, new_hash = password_hasher.verify_and_update(password, user.password_hash)
+        return self._after_verify(user, valid, new_hash)
+
+    async def authenticate_user_async(self, email: str, password: str) -> Optional[User]:
+        """
+        Xác thực người dùng, bcrypt chạy trong thread pool để không chặn event loop.
+        Ném PasswordHasherBusy nếu hàng đợi băm đã đầy.
         """
         user = self.get_by_email(email)
-        if not user or not self.verify_password(password, user.password_hash):
+        if not user:
             return None
+        valid, new_hash = await password_hasher.verify_and_update_async(password, user.password_hash)
+        return self._after_verify(user, valid, new_hash)
+
+    def _after_verify(self, user: User, valid: bool, new_hash: Optional[str]) -> Optional[User]:
+        if not valid:
+            return None
+        # Hash cũ dùng cost factor khác cấu hình hiện tại: lưu hash mới vừa tính được
+        if new_hash:
+            user = self.user_repository.update_user(user.user_id, {"password_hash": new_hash})
+            password_hasher.record_rehash()
         return user
 
     def verify_password(self, plain_password: str, hashed_password: str) -> bool:
         """
         Kiểm tra mật khẩu khớp với hash
         """
-        return pwd_context.verify(plain_password, hashed_password)
+        return password_hasher.verify_and_update(plain_password, hashed_password)[0]
 
     def get_password_hash(self, password: str) -> str:
         """
         Tạo hash từ mật khẩu
         """
-        return pwd_context.hash(password)
+        return password_hasher.hash(password)
 
     def create_user(self, user_data: UserCreate) -> User:
         """
         Tạo người dùng mới
         """
-        # Tạo hash mật khẩu
-        hashed_password = self.get_password_hash(user_data.password)
-        
+        return self._create_user(user_data, self.get_password_hash(user_data.password))
+
+    async def create_user_async(self, user_data: UserCreate) -> User:
+        """
+        Tạo người dùng mới, mật khẩu được băm trong thread pool
+        """
+        return self._create_user(user_data, await password_hasher.hash_async(user_data.password))
+
+    def _create_user(self, user_data: UserCreate, hashed_password: str) -> User:
         # Chuẩn bị dữ liệu người dùng
         user_dict = user_data.dict(exclude={"password"})
         user_dict["password_hash"] = hashed_password
@@ -76,6 +100,20 @@ class UserService:
         if "password" in user_dict:
             user_dict["password_hash"] = self.get_password_hash(user_dict.pop("password"))
         
+        return self._update_user(user_id, user_dict)
+
+    async def update_user_async(self, user_id: int, user_data: UserUpdate) -> Optional[User]:
+        """
+        Cập nhật thông tin người dùng, mật khẩu mới (nếu có) được băm trong thread pool
+        """
+        user_dict = user_data.dict(exclude_unset=True)
+        
+        if "password" in user_dict:
+            user_dict["password_hash"] = await password_hasher.hash_async(user_dict.pop("password"))
+        
+        return self._update_user(user_id, user_dict)
+
+    def _update_user(self, user_id: int, user_dict: dict) -> Optional[User]:
         # Map full_name to name for the database model
         if "full_name" in user_dict:
             user_dict["name"] = user_dict.pop("full_name")
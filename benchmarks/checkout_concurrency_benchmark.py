@@ -0,0 +1,141 @@
+"""
+Benchmark: concurrent checkout on a few hot products (flash sale).
+
+Runs OrderService.place_order from several threads, each as a different user buying the
+same hot products, once with the pessimistic (SELECT ... FOR UPDATE) stock mode and once
+with the optimistic (conditional UPDATE + retry) mode. Reports orders/sec and how many
+checkouts succeeded, ran out of stock, hit a deadlock / lock wait timeout, or were aborted.
+
+The benchmark creates real orders and changes stock (stock of the hot products is reset
+before each mode), so run it against a disposable copy of the database configured in settings.
+Each thread needs its own user with at least one address.
+
+Usage:
+    python benchmarks/checkout_concurrency_benchmark.py --product-ids 1 2 --threads 16 --orders-per-thread 50
+"""
+import argparse
+import threading
+import time
+from collections import Counter
+
+from sqlalchemy import event
+
+import common  # noqa: F401  (sys.path + model registration)
+
+from app.db.base import SessionLocal, engine
+from app.db.errors import is_deadlock, is_transient_error
+from app.models.product import Product
+from app.models.user import UserAddress
+from app.repositories.interaction_repository import CartRepository
+from app.services.order_service import OrderService
+
+
+def load_buyers(count: int):
+    """(user_id, address_id) của `count` người dùng có địa chỉ giao hàng"""
+    db = SessionLocal()
+    try:
+        rows = db.query(UserAddress.user_id, UserAddress.address_id).order_by(UserAddress.user_id).all()
+    finally:
+        db.close()
+    buyers = {}
+    for user_id, address_id in rows:
+        buyers.setdefault(user_id, address_id)
+    if len(buyers) < count:
+        raise SystemExit(f"Cần {count} người dùng có địa chỉ, chỉ tìm thấy {len(buyers)}")
+    return list(buyers.items())[:count]
+
+
+def reset_stock(product_ids, stock: int) -> None:
+    db = SessionLocal()
+    try:
+        db.query(Product).filter(Product.product_id.in_(product_ids)).update(
+            {Product.stock_quantity: stock}, synchronize_session=False
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def run_mode(mode: str, buyers, product_ids, orders_per_thread: int, quantity: int):
+    outcomes = Counter()
+    db_errors = Counter()
+    lock = threading.Lock()
+
+    def on_error(context):
+        # Đếm cả các lỗi đã được thử lại thành công (chế độ optimistic)
+        exc = context.sqlalchemy_exception
+        if exc is not None and is_transient_error(exc):
+            with lock:
+                db_errors["deadlock" if is_deadlock(exc) else "lock_timeout"] += 1
+
+    def worker(user_id: int, address_id: int):
+        for _ in range(orders_per_thread):
+            db = SessionLocal()
+            try:
+                cart = CartRepository(db)
+                cart.clear_cart(user_id)
+                for product_id in product_ids:
+                    cart.add_item(user_id, product_id, quantity)
+                result = OrderService(db).place_order(user_id, address_id, stock_mode=mode)
+            finally:
+                db.close()
+
+            if result["success"]:
+                outcome = "success"
+            elif "không đủ" in result["message"]:
+                outcome = "out_of_stock"
+            else:
+                outcome = "aborted"
+            with lock:
+                outcomes[outcome] += 1
+
+    event.listen(engine, "handle_error", on_error)
+    threads = [threading.Thread(target=worker, args=buyer) for buyer in buyers]
+    start = time.perf_counter()
+    try:
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    finally:
+        event.remove(engine, "handle_error", on_error)
+    elapsed = time.perf_counter() - start
+
+    attempts = sum(outcomes.values())
+    return {
+        "orders_per_sec": outcomes["success"] / elapsed,
+        "success": outcomes["success"],
+        "out_of_stock": outcomes["out_of_stock"],
+        "aborted": outcomes["aborted"],
+        "abort_rate": outcomes["aborted"] / attempts if attempts else 0.0,
+        "deadlocks": db_errors["deadlock"],
+        "lock_timeouts": db_errors["lock_timeout"],
+        "seconds": elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--product-ids", type=int, nargs="+", required=True)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--orders-per-thread", type=int, default=50)
+    parser.add_argument("--quantity", type=int, default=1)
+    parser.add_argument("--stock", type=int, default=None,
+                        help="Tồn kho ban đầu của mỗi sản phẩm (mặc định đủ cho mọi đơn hàng)")
+    parser.add_argument("--modes", nargs="+", default=["pessimistic", "optimistic"])
+    args = parser.parse_args()
+
+    buyers = load_buyers(args.threads)
+    stock = args.stock if args.stock is not None else args.threads * args.orders_per_thread * args.quantity
+
+    print(f"{'mode':<14}{'orders/s':>10}{'success':>9}{'no stock':>10}{'aborted':>9}"
+          f"{'abort %':>9}{'deadlocks':>11}{'lock t/o':>10}")
+    for mode in args.modes:
+        reset_stock(args.product_ids, stock)
+        r = run_mode(mode, buyers, args.product_ids, args.orders_per_thread, args.quantity)
+        print(f"{mode:<14}{r['orders_per_sec']:>10.1f}{r['success']:>9}{r['out_of_stock']:>10}{r['aborted']:>9}"
+              f"{r['abort_rate'] * 100:>8.1f}%{r['deadlocks']:>11}{r['lock_timeouts']:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Helpers shared by the benchmark scripts: counting database round trips and timing calls.
+"""
+import statistics
+import sys
+import os
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Any
+
+from sqlalchemy import event
+
+# Add the parent directory to sys.path to allow importing from the app package
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Import all models to ensure they're registered with SQLAlchemy
+from app.models import user, product, order, interaction, recommendation  # noqa: E402,F401
+
+
+class QueryCounter:
+    """Đếm số câu lệnh SQL (round trip) được gửi qua một engine"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+    @contextmanager
+    def track(self):
+        event.listen(self.engine, "before_cursor_execute", self._before_cursor_execute)
+        try:
+            yield self
+        finally:
+            event.remove(self.engine, "before_cursor_execute", self._before_cursor_execute)
+
+
+def measure(engine, func: Callable[[], Any], iterations: int, warmup: int = 3) -> Dict[str, float]:
+    """
+    Chạy `func` nhiều lần, trả về số round trip mỗi lần gọi và độ trễ (ms) p50/p95/trung bình
+    """
+    for _ in range(warmup):
+        func()
+
+    counter = QueryCounter(engine)
+    durations = []
+    with counter.track():
+        for _ in range(iterations):
+            start = time.perf_counter()
+            func()
+            durations.append((time.perf_counter() - start) * 1000)
+
+    durations.sort()
+    return {
+        "round_trips": counter.count / iterations,
+        "p50_ms": statistics.median(durations),
+        "p95_ms": durations[min(len(durations) - 1, int(len(durations) * 0.95))],
+        "mean_ms": statistics.fmean(durations),
+    }
+
+
+def print_results(results: Dict[str, Dict[str, float]]) -> None:
+    """In bảng kết quả của các phương án"""
+    print(f"{'variant':<34}{'round trips':>12}{'p50 ms':>10}{'p95 ms':>10}{'mean ms':>10}")
+    for name, r in results.items():
+        print(f"{name:<34}{r['round_trips']:>12.1f}{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}{r['mean_ms']:>10.2f}")
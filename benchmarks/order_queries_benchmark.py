@@ -0,0 +1,95 @@
+"""
+Benchmark and query-count check: order history and order details.
+
+Compares the previous per-order / per-line loading (item count query per order, product
+query plus lazy image load per line item) with OrderService.get_orders_by_user and
+OrderService.get_order_details, against the database configured in settings.
+
+With --check the script exits with status 1 if either service call needs more round trips
+than the fixed budget, so it can be run in CI to keep both endpoints O(1) in queries.
+Pick a user with several orders and an order with several line items, otherwise the
+before/after numbers are the same.
+
+Usage:
+    python benchmarks/order_queries_benchmark.py --user-id 2 --order-id 10 --iterations 100 --check
+"""
+import argparse
+import sys
+
+from common import measure, print_results
+
+from app.db.base import SessionLocal, engine
+from app.repositories.order_repository import OrderRepository, OrderItemRepository
+from app.repositories.product_repository import ProductRepository
+from app.services.order_service import OrderService
+
+# Số round trip tối đa: danh sách = trang đơn hàng + đếm tổng; chi tiết = đơn hàng + các dòng
+MAX_LIST_ROUND_TRIPS = 2
+MAX_DETAIL_ROUND_TRIPS = 2
+
+
+def list_per_order(db, user_id: int):
+    """Cách tải cũ: đếm mặt hàng bằng một truy vấn cho mỗi đơn hàng"""
+    orders = OrderRepository(db).get_by_user_id(user_id, skip=0, limit=10)
+    OrderRepository(db).count_by_user_id(user_id)
+    return [(order, len(OrderItemRepository(db).get_by_order_id(order.order_id))) for order in orders]
+
+
+def detail_per_line(db, order_id: int):
+    """Cách tải cũ: một truy vấn sản phẩm và một lần tải ảnh cho mỗi dòng"""
+    OrderRepository(db).get_by_id(order_id)
+    lines = []
+    for item in OrderItemRepository(db).get_by_order_id(order_id):
+        product = ProductRepository(db).get_by_id(item.product_id)
+        image = product.images[0].image_url if product and product.images else None
+        lines.append((item, product.name if product else None, image))
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--user-id", type=int, required=True)
+    parser.add_argument("--order-id", type=int, required=True)
+    parser.add_argument("--iterations", type=int, default=100)
+    parser.add_argument("--check", action="store_true", help="Thoát với mã 1 nếu vượt quá số round trip cho phép")
+    args = parser.parse_args()
+
+    def run(loader):
+        # Session mới cho mỗi lần gọi, giống một request
+        def call():
+            db = SessionLocal()
+            try:
+                loader(db)
+            finally:
+                db.close()
+        return call
+
+    results = {
+        "order list per-order (before)": measure(
+            engine, run(lambda db: list_per_order(db, args.user_id)), args.iterations
+        ),
+        "get_orders_by_user (after)": measure(
+            engine, run(lambda db: OrderService(db).get_orders_by_user(args.user_id)), args.iterations
+        ),
+        "order detail per-line (before)": measure(
+            engine, run(lambda db: detail_per_line(db, args.order_id)), args.iterations
+        ),
+        "get_order_details (after)": measure(
+            engine, run(lambda db: OrderService(db).get_order_details(args.order_id)), args.iterations
+        ),
+    }
+    print_results(results)
+
+    if args.check:
+        failures = []
+        if results["get_orders_by_user (after)"]["round_trips"] > MAX_LIST_ROUND_TRIPS:
+            failures.append(f"get_orders_by_user > {MAX_LIST_ROUND_TRIPS} round trips")
+        if results["get_order_details (after)"]["round_trips"] > MAX_DETAIL_ROUND_TRIPS:
+            failures.append(f"get_order_details > {MAX_DETAIL_ROUND_TRIPS} round trips")
+        for failure in failures:
+            print(f"FAIL: {failure}")
+        sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
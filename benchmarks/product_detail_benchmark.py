@@ -0,0 +1,61 @@
+"""
+Benchmark: product detail loading.
+
+Compares the previous per-relationship loading of ProductService.get_product_by_id
+(product, lazy category, images, tags through a second product query) with the
+eager-loaded ProductRepository.get_detail, against the database configured in settings.
+
+Usage:
+    python benchmarks/product_detail_benchmark.py --product-id 1 --iterations 200
+"""
+import argparse
+
+from common import measure, print_results
+
+from app.db.base import SessionLocal, engine
+from app.models.product import Product
+from app.repositories.product_repository import ProductRepository, ProductImageRepository, TagRepository
+from app.services.product_service import ProductService
+
+
+def load_per_relationship(db, product_id: int):
+    """Cách tải cũ: mỗi quan hệ một truy vấn"""
+    product = db.query(Product).filter(Product.product_id == product_id).first()
+    category_name = product.category.name if product.category else None
+    images = ProductImageRepository(db).get_by_product_id(product_id)
+    tags = [tag.name for tag in TagRepository(db).get_by_product_id(product_id)]
+    return product, category_name, images, tags
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--product-id", type=int, required=True)
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    def run(loader):
+        # Session mới cho mỗi lần gọi, giống một request
+        def call():
+            db = SessionLocal()
+            try:
+                loader(db)
+            finally:
+                db.close()
+        return call
+
+    results = {
+        "per-relationship (before)": measure(
+            engine, run(lambda db: load_per_relationship(db, args.product_id)), args.iterations
+        ),
+        "get_detail (after)": measure(
+            engine, run(lambda db: ProductRepository(db).get_detail(args.product_id)), args.iterations
+        ),
+        "ProductService.get_product_by_id": measure(
+            engine, run(lambda db: ProductService(db).get_product_by_id(args.product_id)), args.iterations
+        ),
+    }
+    print_results(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+Benchmark: per-item serialization cost of the hot list endpoints.
+
+Builds payloads shaped like the service output of GET /products (ProductSearchResult),
+GET /recommendations/personalized (PersonalizedRecommendationsResult) and GET /cart
+(CartResponse), with Decimal prices as they come from the Numeric columns, and compares:
+
+  response_model  FastAPI's path when an endpoint returns a dict: validate the dict into the
+                  response model, then dump it to JSON bytes
+  lean_response   app.core.serialization: project the dict onto the model fields, then write
+                  it with orjson (or json when orjson is not installed)
+
+No database is needed. With --check the script exits with status 1 if the two paths produce
+different JSON for any payload.
+
+Usage:
+    python benchmarks/serialization_benchmark.py --items 20 100 1000 --iterations 200 --check
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+from decimal import Decimal
+
+from common import print_results  # noqa: F401  (thêm thư mục gốc vào sys.path)
+
+from pydantic import TypeAdapter
+
+from app.api.schemas.cart import CartResponse
+from app.api.schemas.product import ProductSearchResult
+from app.api.schemas.recommendation import PersonalizedRecommendationsResult
+from app.core.serialization import dumps, shape_for
+
+
+def search_payload(n: int):
+    return {
+        "items": [
+            {
+                "product_id": i,
+                "name": f"Sản phẩm {i}",
+                "price": Decimal("199000.00") + i,
+                "category_id": i % 12 + 1,
+                "category_name": f"Danh mục {i % 12 + 1}",
+                "image_url": f"https://cdn.example.com/products/{i}.jpg",
+                "average_rating": 4.25,
+                "rating_count": i % 50
+            } for i in range(1, n + 1)
+        ],
+        "pagination": {"page": 1, "page_size": n, "total_count": n * 10, "total_pages": 10},
+        "filters": {
+            "search_query": None, "category_id": None, "min_price": None, "max_price": None,
+            "order_by": "created_at", "descending": True
+        },
+        "facets": {
+            "categories": [{"category_id": c, "category_name": f"Danh mục {c}", "count": 10} for c in range(1, 13)],
+            "price_buckets": [
+                {"min_price": Decimal(low), "max_price": Decimal(low * 2) if low else Decimal(100000), "count": 5}
+                for low in (0, 100000, 200000, 500000)
+            ] + [{"min_price": Decimal(1000000), "max_price": None, "count": 1}],
+            "price_range": {"min": Decimal("99000.00"), "max": Decimal("5990000.00")}
+        }
+    }
+
+
+def personalized_payload(n: int):
+    return {
+        "success": True,
+        "user_id": 42,
+        "recommendations": [
+            {
+                "product_id": i,
+                "name": f"Sản phẩm {i}",
+                "price": Decimal("349000.00") + i,
+                "recommendation_score": 1.0 / i,
+                "image_url": f"https://cdn.example.com/products/{i}.jpg"
+            } for i in range(1, n + 1)
+        ],
+        "recommendation_type": "personalized"
+    }
+
+
+def cart_payload(n: int):
+    items = [
+        {
+            "cart_item_id": i,
+            "product_id": i,
+            "name": f"Sản phẩm {i}",
+            "price": Decimal("120000.00"),
+            "quantity": 2,
+            "subtotal": Decimal("240000.00"),
+            "image_url": None,
+            "stock_quantity": 10,
+            "is_in_stock": True
+        } for i in range(1, n + 1)
+    ]
+    return {"items": items, "total_amount": Decimal("240000.00") * n, "item_count": n}
+
+
+PAYLOADS = {
+    "search": (ProductSearchResult, search_payload),
+    "personalized": (PersonalizedRecommendationsResult, personalized_payload),
+    "cart": (CartResponse, cart_payload),
+}
+
+
+def time_per_item(func, n: int, iterations: int, warmup: int = 5) -> float:
+    """Thời gian trung vị (µs) cho mỗi phần tử của danh sách"""
+    for _ in range(warmup):
+        func()
+    durations = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start)
+    return statistics.median(durations) * 1e6 / n
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, nargs="+", default=[20, 100, 1000])
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--check", action="store_true", help="Thoát với mã 1 nếu hai cách cho JSON khác nhau")
+    args = parser.parse_args()
+
+    mismatches = []
+    print(f"{'payload':<16}{'items':>8}{'response_model µs/item':>26}{'lean_response µs/item':>25}{'speedup':>10}")
+    for name, (model, build) in PAYLOADS.items():
+        adapter = TypeAdapter(model)
+        shape = shape_for(model)
+        for n in args.items:
+            content = build(n)
+
+            def validated():
+                return adapter.dump_json(adapter.validate_python(content))
+
+            def lean():
+                return dumps(shape(content))
+
+            if json.loads(validated()) != json.loads(lean()):
+                mismatches.append(f"{name} ({n} items)")
+
+            before = time_per_item(validated, n, args.iterations)
+            after = time_per_item(lean, n, args.iterations)
+            print(f"{name:<16}{n:>8}{before:>26.2f}{after:>25.2f}{before / after:>9.1f}x")
+
+    if mismatches:
+        print(f"JSON khác nhau: {', '.join(mismatches)}")
+        if args.check:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
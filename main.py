@@ -3,7 +3,10 @@ from fastapi.middleware.cors import CORSMiddleware
 
 from app.api.api import api_router
 from app.core.config import settings
-from app.db.init_db import create_first_admin
+from app.core.security import password_hasher
+from app.db.base import async_engine, async_replica_engine
+from app.db.init_db import create_first_admin, init_rating_stats, init_sales_rollup, scheduler
+from app.services.event_writer import event_writer
 
 # Tạo ứng dụng FastAPI
 app = FastAPI(
@@ -32,6 +35,25 @@ app.include_router(api_router)
 async def startup_event():
     # Tạo tài khoản admin đầu tiên nếu cần
     create_first_admin()
+    # Khởi tạo tổng hợp đánh giá từ dữ liệu cũ nếu cần
+    init_rating_stats()
+    # Lên lịch tổng hợp doanh số theo ngày (lần đầu chạy ngay, nền)
+    init_sales_rollup()
+
+# Sự kiện tắt ứng dụng
+@app.on_event("shutdown")
+async def shutdown_event():
+    # Ghi nốt các lượt xem / tìm kiếm còn trong hàng đợi
+    event_writer.close()
+    # Chờ các lượt băm mật khẩu đang chạy
+    password_hasher.close()
+    # Dừng các job định kỳ
+    if scheduler.running:
+        scheduler.shutdown(wait=False)
+    # Đóng các kết nối của engine async
+    await async_engine.dispose()
+    if async_replica_engine is not None:
+        await async_replica_engine.dispose()
 
 @app.get("/")
 async def root():
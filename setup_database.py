@@ -25,8 +25,8 @@ def init_full_db():
         # Import all models to ensure they're registered with SQLAlchemy
         from app.models.user import User, UserAddress
         from app.models.product import Product, ProductImage, Category, Tag, product_tag
-        from app.models.order import Order, OrderItem
-        from app.models.interaction import ViewHistory, SearchHistory, Rating, CartItem
+        from app.models.order import Order, OrderItem, ProductSalesDaily, CategorySalesDaily, SalesRollupWatermark
+        from app.models.interaction import ViewHistory, SearchHistory, Rating, CartItem, ProductRatingStats
         from app.models.recommendation import ProductSimilarity, UserRecommendation, TrainingHistory
         
         logger.info("Creating database if it doesn't exist...")
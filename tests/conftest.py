@@ -0,0 +1,123 @@
+"""
+Cấu hình chung cho test: cơ sở dữ liệu SQLite tạm và các hàm tạo dữ liệu mẫu.
+
+Biến môi trường phải được đặt trước khi import `app`, vì engine và settings được tạo
+ngay khi import module.
+"""
+import os
+import sys
+import tempfile
+import uuid
+
+_TMP_DIR = tempfile.mkdtemp(prefix="ecom-ai-tests-")
+os.environ["DATABASE_URI"] = f"sqlite:///{os.path.join(_TMP_DIR, 'app.db')}"
+os.environ["RECOMMENDATION_MODEL_DIR"] = os.path.join(_TMP_DIR, "models")
+os.environ.pop("DATABASE_REPLICA_URI", None)
+os.environ.pop("REDIS_URL", None)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+import pytest  # noqa: E402
+
+from app.models import user, product, order, interaction, recommendation  # noqa: E402,F401
+from app.db.base import Base, engine, SessionLocal  # noqa: E402
+from app.models.order import Order, OrderItem  # noqa: E402
+from app.models.product import Category, Product, ProductImage  # noqa: E402
+from app.models.user import User  # noqa: E402
+from app.api.dependencies.auth import create_access_token  # noqa: E402
+from app.services.catalog_snapshot import catalog_snapshot  # noqa: E402
+from app.recommendations.serving.model_store import model_store  # noqa: E402
+
+
+@pytest.fixture(scope="session", autouse=True)
+def _schema():
+    Base.metadata.create_all(bind=engine)
+    yield
+    engine.dispose()
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture(scope="session")
+def client():
+    # Không dùng `with TestClient(...)` để bỏ qua startup (tạo admin, scheduler, backfill)
+    from fastapi.testclient import TestClient
+    import main
+
+    return TestClient(main.app)
+
+
+def make_user(db, is_admin: bool = False) -> User:
+    """Tạo người dùng với email ngẫu nhiên"""
+    user = User(
+        name="Test",
+        email=f"{uuid.uuid4().hex[:12]}@example.com",
+        password_hash="x",
+        is_admin=is_admin
+    )
+    db.add(user)
+    db.commit()
+    return user
+
+
+def make_products(db, count: int, stock: int = 100) -> list:
+    """Tạo `count` sản phẩm active (kèm ảnh chính) trong một danh mục mới"""
+    category = Category(name=f"Cat {uuid.uuid4().hex[:8]}")
+    db.add(category)
+    db.flush()
+    products = [
+        Product(
+            name=f"Product {uuid.uuid4().hex[:8]}",
+            description="Sản phẩm dùng cho test",
+            price=100000.0 + i,
+            category_id=category.category_id,
+            stock_quantity=stock,
+            is_active=True
+        ) for i in range(count)
+    ]
+    db.add_all(products)
+    db.flush()
+    for p in products:
+        db.add(ProductImage(product_id=p.product_id, image_url=f"http://img/{p.product_id}.jpg", is_primary=True))
+    db.commit()
+    # Snapshot catalog được dựng lại để thấy các sản phẩm mới
+    catalog_snapshot.invalidate()
+    return products
+
+
+def make_order(db, user_id: int, products: list, quantity: int = 1) -> Order:
+    """Tạo đơn hàng gồm một dòng cho mỗi sản phẩm"""
+    order_ = Order(
+        user_id=user_id,
+        total_amount=sum(p.price * quantity for p in products),
+        shipping_address={"street": "1 A", "city": "HN"}
+    )
+    db.add(order_)
+    db.flush()
+    for p in products:
+        db.add(OrderItem(order_id=order_.order_id, product_id=p.product_id, quantity=quantity, price_at_purchase=p.price))
+    db.commit()
+    return order_
+
+
+def auth_headers(user_id: int) -> dict:
+    """Header Authorization với token của người dùng"""
+    return {"Authorization": f"Bearer {create_access_token({'sub': str(user_id)})}"}
+
+
+def publish_two_clusters(first: list, second: list) -> None:
+    """Công bố mô hình với hai nhóm sản phẩm có item factors gần như trực giao, như sau một lần huấn luyện"""
+    product_ids = [p.product_id for p in first + second]
+    factors = np.array(
+        [[1.0, 0.05 * i] for i in range(len(first))] + [[0.05 * i, 1.0] for i in range(len(second))],
+        dtype=np.float32
+    )
+    model_store.publish({"item_factors": factors, "reverse_product_map": dict(enumerate(product_ids))})
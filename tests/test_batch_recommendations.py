@@ -0,0 +1,65 @@
+import json
+
+from conftest import auth_headers, make_products, make_user, publish_two_clusters
+from app.models.interaction import ViewHistory
+from app.models.recommendation import UserRecommendation
+from app.recommendations.serving.popularity import popularity_engine
+from app.services.catalog_snapshot import catalog_snapshot
+
+
+def _batch(client, db, user_ids, limit):
+    admin = make_user(db, is_admin=True)
+    response = client.post(
+        "/api/recommendations/batch", json={"user_ids": user_ids, "limit": limit},
+        headers=auth_headers(admin.user_id)
+    )
+    assert response.status_code == 200
+    return {row["user_id"]: row for row in map(json.loads, response.text.splitlines())}
+
+
+def test_batch_requires_admin(client, db):
+    body = {"user_ids": [1], "limit": 5}
+    assert client.post("/api/recommendations/batch", json=body).status_code == 401
+    headers = auth_headers(make_user(db).user_id)
+    assert client.post("/api/recommendations/batch", json=body, headers=headers).status_code == 403
+
+
+def test_batch_reranks_like_personalized(client, db):
+    products = make_products(db, 6)
+    sold_out, inactive, kept = products[:3]
+    sold_out.stock_quantity = 0
+    inactive.is_active = False
+    user = make_user(db)
+    for rank, product in enumerate((sold_out, inactive, kept), start=1):
+        db.add(UserRecommendation(
+            user_id=user.user_id, product_id=product.product_id, recommendation_score=1.0 / rank, rank=rank
+        ))
+    db.commit()
+    catalog_snapshot.invalidate()
+    popularity_engine.invalidate()
+
+    result = _batch(client, db, [user.user_id], limit=4)[user.user_id]
+    recommended = [item["product_id"] for item in result["recommendations"]]
+    assert result["recommendation_type"] == "personalized"
+    # Hết hàng / ngừng bán bị loại, danh sách được bù bằng sản phẩm phổ biến cho đủ `limit`
+    assert recommended[0] == kept.product_id
+    assert len(recommended) == 4
+    assert sold_out.product_id not in recommended and inactive.product_id not in recommended
+
+
+def test_batch_folds_in_new_users_and_falls_back_to_popular(client, db):
+    first, second = make_products(db, 4), make_products(db, 4)
+    publish_two_clusters(first, second)
+    popularity_engine.invalidate()
+    new_user, no_history = make_user(db), make_user(db)
+    db.add(ViewHistory(user_id=new_user.user_id, product_id=second[0].product_id))
+    db.commit()
+
+    results = _batch(client, db, [new_user.user_id, no_history.user_id, 10 ** 9], limit=3)
+
+    folded = results[new_user.user_id]
+    assert folded["recommendation_type"] == "personalized"
+    assert {item["product_id"] for item in folded["recommendations"]} <= {p.product_id for p in second[1:]}
+    assert results[no_history.user_id]["recommendation_type"] == "popular"
+    assert len(results[no_history.user_id]["recommendations"]) == 3
+    assert results[10 ** 9]["success"] is False
@@ -0,0 +1,142 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+from conftest import auth_headers, make_order, make_products, make_user
+from app.db.base import SessionLocal
+from app.models.interaction import CartItem
+from app.repositories import upsert_statement
+from app.repositories.interaction_repository import CartRepository
+from app.services.cart_service import CartService
+
+
+def cart_quantities(user_id: int) -> dict:
+    with SessionLocal() as session:
+        return {item.product_id: item.quantity for item in CartRepository(session).get_by_user_id(user_id)}
+
+
+def count_commits(session) -> list:
+    commits = []
+    event.listen(session, "after_commit", lambda s: commits.append(1))
+    return commits
+
+
+def test_upsert_and_delete_are_written_in_one_commit(db):
+    user = make_user(db)
+    kept, removed, added = make_products(db, 3)
+    for product in (kept, removed):
+        CartRepository(db).add_item(user.user_id, product.product_id, 1)
+
+    commits = count_commits(db)
+    result = CartService(db).bulk_update_cart(user.user_id, [
+        {"product_id": kept.product_id, "quantity": 4, "action": "set"},
+        {"product_id": removed.product_id, "quantity": 0, "action": "remove"},
+        {"product_id": added.product_id, "quantity": 2, "action": "add"},
+    ])
+
+    assert result["success"] and result["failed_items"] == []
+    assert len(commits) == 1
+    assert cart_quantities(user.user_id) == {kept.product_id: 4, added.product_id: 2}
+    assert result["cart"]["item_count"] == 2
+
+
+def test_actions_are_applied_in_request_order(db):
+    user = make_user(db)
+    first, second, third = make_products(db, 3)
+    CartRepository(db).add_item(user.user_id, first.product_id, 2)
+
+    CartService(db).bulk_update_cart(user.user_id, [
+        # add cộng vào số lượng hiện có, set sau đó ghi đè, add tiếp theo cộng vào giá trị vừa set
+        {"product_id": first.product_id, "quantity": 3, "action": "add"},
+        {"product_id": first.product_id, "quantity": 1, "action": "set"},
+        {"product_id": first.product_id, "quantity": 2, "action": "add"},
+        # remove rồi add lại bắt đầu từ 0
+        {"product_id": second.product_id, "quantity": 5, "action": "add"},
+        {"product_id": second.product_id, "quantity": 0, "action": "remove"},
+        {"product_id": second.product_id, "quantity": 1, "action": "add"},
+        # add rồi set <= 0 là xóa, sản phẩm chưa có trong giỏ thì không ghi gì
+        {"product_id": third.product_id, "quantity": 2, "action": "add"},
+        {"product_id": third.product_id, "quantity": 0, "action": "set"},
+    ])
+
+    assert cart_quantities(user.user_id) == {first.product_id: 3, second.product_id: 1}
+
+
+def test_invalid_items_are_reported_while_the_rest_are_updated(db):
+    user = make_user(db)
+    ok, low_stock, inactive = make_products(db, 3, stock=5)
+    inactive.is_active = False
+    db.commit()
+
+    result = CartService(db).bulk_update_cart(user.user_id, [
+        {"product_id": ok.product_id, "quantity": 2, "action": "add"},
+        {"product_id": low_stock.product_id, "quantity": 6, "action": "add"},
+        {"product_id": inactive.product_id, "quantity": 1, "action": "add"},
+        {"product_id": 10 ** 9, "quantity": 1, "action": "add"},
+    ])
+
+    assert result["success"]
+    assert sorted(item["product_id"] for item in result["failed_items"]) == sorted(
+        [low_stock.product_id, inactive.product_id, 10 ** 9]
+    )
+    assert cart_quantities(user.user_id) == {ok.product_id: 2}
+
+    nothing_valid = CartService(db).bulk_update_cart(user.user_id, [
+        {"product_id": low_stock.product_id, "quantity": 6, "action": "set"},
+    ])
+    assert not nothing_valid["success"]
+    assert [item["product_id"] for item in nothing_valid["failed_items"]] == [low_stock.product_id]
+    assert cart_quantities(user.user_id) == {ok.product_id: 2}
+
+
+def test_reorder_adds_order_items_to_the_cart(client, db):
+    user = make_user(db)
+    products = make_products(db, 2)
+    CartRepository(db).add_item(user.user_id, products[0].product_id, 1)
+    order = make_order(db, user.user_id, products, quantity=2)
+
+    response = client.post(f"/api/cart/reorder/{order.order_id}", headers=auth_headers(user.user_id))
+
+    assert response.status_code == 200
+    assert response.json()["success"]
+    assert cart_quantities(user.user_id) == {products[0].product_id: 3, products[1].product_id: 2}
+
+
+def test_reorder_of_another_users_order_is_rejected(client, db):
+    owner, other = make_user(db), make_user(db)
+    order = make_order(db, owner.user_id, make_products(db, 2))
+
+    response = client.post(f"/api/cart/reorder/{order.order_id}", headers=auth_headers(other.user_id))
+
+    assert response.status_code == 200
+    assert response.json() == {"success": False, "message": "Đơn hàng không tồn tại", "cart": None, "failed_items": []}
+    assert cart_quantities(other.user_id) == {}
+
+
+def test_upsert_statement_round_trip_on_sqlite(db):
+    assert db.get_bind().dialect.name == "sqlite"
+    user = make_user(db)
+    existing, new = make_products(db, 2)
+    created = datetime.utcnow() - timedelta(days=1)
+    db.add(CartItem(user_id=user.user_id, product_id=existing.product_id, quantity=1,
+                    created_at=created, updated_at=created))
+    db.commit()
+
+    now = datetime.utcnow()
+    db.execute(upsert_statement(
+        db, CartItem,
+        [{"user_id": user.user_id, "product_id": product.product_id, "quantity": 7,
+          "created_at": now, "updated_at": now} for product in (existing, new)],
+        [CartItem.user_id, CartItem.product_id],
+        lambda new_row: {"quantity": new_row.quantity, "updated_at": new_row.updated_at}
+    ))
+    db.commit()
+
+    with SessionLocal() as session:
+        rows = {item.product_id: item for item in session.query(CartItem).filter(CartItem.user_id == user.user_id)}
+    assert {product_id: row.quantity for product_id, row in rows.items()} == {
+        existing.product_id: 7, new.product_id: 7
+    }
+    # Dòng đã có chỉ cập nhật các cột trong `update`, không tạo dòng trùng khóa
+    assert rows[existing.product_id].created_at == created
+    assert rows[existing.product_id].updated_at == now
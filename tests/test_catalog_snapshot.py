@@ -0,0 +1,113 @@
+import numpy as np
+from sqlalchemy import create_engine
+
+from conftest import make_products
+from app.db.base import Base, SessionLocal
+from app.db.routing import use_replica
+from app.models.product import Product
+from app.repositories.product_repository import ProductRepository
+from app.services.catalog_snapshot import CatalogColumns, CatalogSnapshot
+
+
+def _columns():
+    # Bốn sản phẩm: hai trong danh mục 1, hai trong danh mục 2
+    return CatalogColumns(
+        product_ids=np.array([1, 2, 3, 4], dtype=np.int64),
+        category_ids=np.array([1, 1, 2, 2], dtype=np.int64),
+        prices=np.array([50.0, 150.0, 150.0, 900.0]),
+        created_at=np.array([1.0, 2.0, 3.0, 4.0]),
+        stock_quantities=np.array([5, 0, 5, 5], dtype=np.int64),
+        rating_sums=np.array([0.0, 9.0, 4.0, 0.0]),
+        rating_counts=np.array([0, 2, 1, 0], dtype=np.int64),
+        category_names={1: "A", 2: "B"}
+    )
+
+
+def test_facets_exclude_their_own_filter():
+    snapshot = CatalogSnapshot(price_edges=[0.0, 100.0, 500.0])
+    facets = snapshot.facets(_columns(), category_ids=[1], min_price=100.0)
+
+    # Đếm theo danh mục: áp dụng bộ lọc giá, bỏ bộ lọc danh mục
+    assert facets["categories"] == [
+        {"category_id": 2, "category_name": "B", "count": 2},
+        {"category_id": 1, "category_name": "A", "count": 1}
+    ]
+    # Histogram giá: áp dụng bộ lọc danh mục, bỏ bộ lọc giá
+    assert facets["price_buckets"] == [
+        {"min_price": 0.0, "max_price": 100.0, "count": 1},
+        {"min_price": 100.0, "max_price": 500.0, "count": 1},
+        {"min_price": 500.0, "max_price": None, "count": 0}
+    ]
+    assert facets["price_range"] == {"min": 50.0, "max": 150.0}
+
+
+def test_sorted_ids_by_rating_uses_count_as_tiebreak():
+    columns = _columns()
+    mask = np.ones(4, dtype=bool)
+    assert list(columns.sorted_ids(mask, "rating")) == [2, 3, 4, 1]
+    assert list(columns.sorted_ids(mask, "price", descending=False)) == [1, 2, 3, 4]
+
+
+def test_upsert_and_remove_update_the_loaded_snapshot(db):
+    first, second = make_products(db, 2)
+    snapshot = CatalogSnapshot()
+    columns = snapshot.get(db)
+    assert first.product_id in columns.index
+
+    first.price = 1.0
+    snapshot.upsert(first)
+    updated = snapshot.get(db)
+    assert updated.prices[updated.index[first.product_id]] == 1.0
+    # Bản cũ không bị sửa (copy-on-write)
+    assert columns.prices[columns.index[first.product_id]] != 1.0
+
+    snapshot.remove(second.product_id)
+    assert second.product_id not in snapshot.get(db).index
+
+    second.is_active = False
+    snapshot.upsert(second)
+    assert second.product_id not in snapshot.get(db).index
+
+
+def test_rebuild_discards_result_when_updated_during_query(db, monkeypatch):
+    product = make_products(db, 1, stock=10)[0]
+    snapshot = CatalogSnapshot()
+    snapshot.get(db)
+    load = ProductRepository.get_catalog_columns
+
+    def load_then_checkout(repo):
+        rows = load(repo)
+        # Một checkout commit và cập nhật snapshot trong lúc truy vấn tải lại đang chạy
+        monkeypatch.setattr(ProductRepository, "get_catalog_columns", load)
+        snapshot.adjust_stock({product.product_id: -3})
+        return rows
+
+    monkeypatch.setattr(ProductRepository, "get_catalog_columns", load_then_checkout)
+    columns = snapshot.rebuild(db)
+    assert columns.stock_quantities[columns.index[product.product_id]] == 7
+
+
+def test_expired_snapshot_is_served_stale_while_another_thread_rebuilds(db, monkeypatch):
+    make_products(db, 1)
+    snapshot = CatalogSnapshot(ttl_seconds=0)
+    columns = snapshot.get(db)
+
+    monkeypatch.setattr(ProductRepository, "get_catalog_columns", lambda repo: (_ for _ in ()).throw(AssertionError))
+    with snapshot._rebuild_lock:
+        assert snapshot.get(db) is columns
+
+
+def test_rebuild_reads_the_primary_inside_read_only_blocks(db, tmp_path):
+    product = make_products(db, 1)[0]
+    replica = create_engine(f"sqlite:///{tmp_path / 'replica'}.db")
+    Base.metadata.create_all(bind=replica)
+    # Session mới chưa ghi gì: các SELECT trong `use_replica` được gửi tới replica (rỗng)
+    reader = SessionLocal(info={"replica_bind": replica})
+    try:
+        with use_replica(reader):
+            assert reader.get(Product, product.product_id) is None
+            columns = CatalogSnapshot().get(reader)
+    finally:
+        reader.close()
+        replica.dispose()
+    assert product.product_id in columns.index
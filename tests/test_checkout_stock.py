@@ -0,0 +1,50 @@
+from conftest import make_products, make_user
+from app.db.base import SessionLocal
+from app.models.interaction import CartItem
+from app.models.product import Product
+from app.models.user import UserAddress
+from app.services.catalog_snapshot import catalog_snapshot
+from app.services.order_service import OrderService
+
+
+def _buyer_with_cart(db, product_id: int, quantity: int = 1):
+    user = make_user(db)
+    address = UserAddress(user_id=user.user_id, street="1 A", city="HN", country="VN", postal_code="100000")
+    db.add(address)
+    db.add(CartItem(user_id=user.user_id, product_id=product_id, quantity=quantity))
+    db.commit()
+    return user.user_id, address.address_id
+
+
+def _snapshot_stock(db, product_id: int) -> int:
+    columns = catalog_snapshot.get(db)
+    return int(columns.stock_quantities[columns.index[product_id]])
+
+
+def test_optimistic_checkouts_with_stale_reads_keep_snapshot_stock_exact(db):
+    product_id = make_products(db, 1, stock=10)[0].product_id
+    first = _buyer_with_cart(db, product_id)
+    second = _buyer_with_cart(db, product_id)
+    assert _snapshot_stock(db, product_id) == 10
+
+    # Session của người mua thứ hai đã đọc tồn kho 10 trước khi người thứ nhất đặt hàng,
+    # giống hai checkout optimistic chạy song song
+    stale = SessionLocal()
+    try:
+        # Giữ tham chiếu để identity map (weak) không bỏ đối tượng đã đọc
+        stale_product = stale.get(Product, product_id)
+        assert stale_product.stock_quantity == 10
+
+        first_db = SessionLocal()
+        try:
+            assert OrderService(first_db).place_order(*first, stock_mode="optimistic")["success"]
+        finally:
+            first_db.close()
+
+        assert OrderService(stale).place_order(*second, stock_mode="optimistic")["success"]
+    finally:
+        stale.close()
+
+    db.expire_all()
+    assert db.get(Product, product_id).stock_quantity == 8
+    assert _snapshot_stock(db, product_id) == 8
@@ -0,0 +1,54 @@
+import uuid
+
+import pytest
+
+from app.core.config import settings
+from app.core.rate_limit import LoginRateLimiter, MemoryRateLimitBackend
+from app.core.security import password_hasher
+from app.models.user import User
+
+
+@pytest.fixture
+def limiter(monkeypatch):
+    monkeypatch.setattr(settings, "LOGIN_RATE_LIMIT_IP_ATTEMPTS", 1000)
+    monkeypatch.setattr(settings, "LOGIN_RATE_LIMIT_EMAIL_ATTEMPTS", 3)
+    limiter = LoginRateLimiter(MemoryRateLimitBackend(1000))
+    monkeypatch.setattr("app.api.endpoints.auth.login_rate_limiter", limiter)
+    return limiter
+
+
+@pytest.fixture
+def account(db):
+    email = f"{uuid.uuid4().hex[:12]}@example.com"
+    db.add(User(name="Test", email=email, password_hash=password_hasher.hash("secret123")))
+    db.commit()
+    return email
+
+
+def _login(client, email, password):
+    return client.post("/api/auth/login", data={"username": email, "password": password})
+
+
+def test_successful_logins_do_not_count_against_email_limit(client, limiter, account):
+    for _ in range(settings.LOGIN_RATE_LIMIT_EMAIL_ATTEMPTS + 2):
+        assert _login(client, account, "secret123").status_code == 200
+    assert limiter.failures == 0
+
+
+def test_failed_logins_lock_the_email(client, limiter, account):
+    for _ in range(settings.LOGIN_RATE_LIMIT_EMAIL_ATTEMPTS):
+        assert _login(client, account, "wrong").status_code == 401
+
+    # Cả mật khẩu đúng cũng bị chặn khi email đã có quá nhiều lần sai
+    response = _login(client, account, "secret123")
+    assert response.status_code == 429
+    assert int(response.headers["retry-after"]) > 0
+    assert limiter.rejected == {"ip": 0, "email": 1}
+
+
+def test_every_attempt_counts_against_the_ip(client, limiter, account, monkeypatch):
+    monkeypatch.setattr(settings, "LOGIN_RATE_LIMIT_IP_ATTEMPTS", 2)
+    assert _login(client, account, "secret123").status_code == 200
+    assert _login(client, account, "secret123").status_code == 200
+    assert _login(client, account, "secret123").status_code == 429
+    assert limiter.rejected["ip"] == 1
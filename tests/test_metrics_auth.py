@@ -0,0 +1,12 @@
+import pytest
+
+from conftest import auth_headers, make_user
+
+PATHS = ["/api/metrics/db-pool", "/api/metrics/event-writer", "/api/metrics/password-hasher", "/api/metrics/login-rate-limit"]
+
+
+@pytest.mark.parametrize("path", PATHS)
+def test_metrics_require_admin(client, db, path):
+    assert client.get(path).status_code == 401
+    assert client.get(path, headers=auth_headers(make_user(db).user_id)).status_code == 403
+    assert client.get(path, headers=auth_headers(make_user(db, is_admin=True).user_id)).status_code == 200
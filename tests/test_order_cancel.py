@@ -0,0 +1,39 @@
+from conftest import make_order, make_products, make_user
+from app.db.base import SessionLocal
+from app.models.order import Order, OrderStatus, ProductSalesDaily
+from app.models.product import Product
+from app.services.order_service import OrderService
+from app.services.sales_rollup import SalesRollupAggregator
+
+
+def _units_sold(db, product_id: int) -> int:
+    return sum(row.units for row in db.query(ProductSalesDaily).filter(ProductSalesDaily.product_id == product_id))
+
+
+def test_cancel_with_stale_pending_read_subtracts_rollup_and_restocks_once(db):
+    product = make_products(db, 1, stock=10)[0]
+    user = make_user(db)
+    order_id = make_order(db, user.user_id, [product], quantity=2).order_id
+    SalesRollupAggregator(lag_seconds=0).run(db)
+    assert _units_sold(db, product.product_id) == 2
+
+    # Session của yêu cầu hủy thứ hai đã đọc đơn ở trạng thái PENDING trước khi yêu cầu thứ nhất commit
+    stale = SessionLocal()
+    try:
+        # Giữ tham chiếu để identity map (weak) không bỏ đối tượng đã đọc
+        stale_order = stale.get(Order, order_id)
+        assert stale_order.status == OrderStatus.PENDING
+
+        first_db = SessionLocal()
+        try:
+            assert OrderService(first_db).cancel_order(order_id, user.user_id)["success"]
+        finally:
+            first_db.close()
+
+        assert not OrderService(stale).cancel_order(order_id, user.user_id)["success"]
+    finally:
+        stale.close()
+
+    db.expire_all()
+    assert _units_sold(db, product.product_id) == 0
+    assert db.get(Product, product.product_id).stock_quantity == 12
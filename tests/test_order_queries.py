@@ -0,0 +1,41 @@
+import pytest
+
+from conftest import make_order, make_products, make_user
+from benchmarks.common import QueryCounter
+from app.db.base import engine
+from app.services.order_service import OrderService
+
+N = 12
+
+
+@pytest.fixture
+def orders(db):
+    user = make_user(db)
+    products = make_products(db, N)
+    order_ids = [make_order(db, user.user_id, products).order_id for _ in range(N)]
+    return user.user_id, order_ids
+
+
+def test_order_history_page_is_two_round_trips(db, orders):
+    user_id, _ = orders
+    db.expire_all()
+
+    with QueryCounter(engine).track() as counter:
+        result = OrderService(db).get_orders_by_user(user_id, page=1, page_size=N)
+
+    assert len(result["items"]) == N
+    assert all(order["item_count"] == N for order in result["items"])
+    assert counter.count <= 2
+
+
+def test_order_details_is_two_round_trips(db, orders):
+    user_id, order_ids = orders
+    db.expire_all()
+
+    with QueryCounter(engine).track() as counter:
+        result = OrderService(db).get_order_details(order_ids[0], user_id)
+
+    items = result["order"]["items"]
+    assert len(items) == N
+    assert all(item["image_url"] for item in items)
+    assert counter.count <= 2
@@ -0,0 +1,30 @@
+from conftest import make_products
+from app.recommendations.repositories.recommendation_repository import PopularitySignalRepository
+from app.recommendations.serving.popularity import PopularityEngine
+
+
+def test_expired_rankings_are_served_stale_while_another_thread_recomputes(db, monkeypatch):
+    make_products(db, 2)
+    engine = PopularityEngine(ttl_seconds=0)
+    rankings = engine.get(db)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("truy vấn gộp không được chạy khi đang có thread tính lại")
+
+    monkeypatch.setattr(PopularitySignalRepository, "get_daily_signals", fail)
+    with engine._rebuild_lock:
+        assert engine.get(db) is rankings
+
+
+def test_expired_rankings_are_recomputed_by_one_request(db, monkeypatch):
+    make_products(db, 2)
+    engine = PopularityEngine(ttl_seconds=0)
+    rankings = engine.get(db)
+
+    calls = []
+    load = PopularitySignalRepository.get_daily_signals
+    monkeypatch.setattr(
+        PopularitySignalRepository, "get_daily_signals", lambda repo, **kw: calls.append(1) or load(repo, **kw)
+    )
+    assert engine.get(db) is not rankings
+    assert len(calls) == 1
@@ -0,0 +1,54 @@
+from conftest import auth_headers, make_user
+from app.services.principal_cache import PrincipalCache, principal_cache
+
+
+def test_deactivated_user_is_rejected_while_principal_is_cached(client, db):
+    user = make_user(db)
+    headers = auth_headers(user.user_id)
+    assert client.get("/api/cart/", headers=headers).status_code == 200
+
+    user.is_active = False
+    db.commit()
+
+    assert client.get("/api/cart/", headers=headers).status_code == 401
+
+
+def test_admin_flag_change_is_seen_while_principal_is_cached(client, db):
+    user = make_user(db)
+    headers = auth_headers(user.user_id)
+    assert client.get("/api/metrics/db-pool", headers=headers).status_code == 403
+
+    user.is_admin = True
+    db.commit()
+    assert client.get("/api/metrics/db-pool", headers=headers).status_code == 200
+
+    user.is_admin = False
+    db.commit()
+    assert client.get("/api/metrics/db-pool", headers=headers).status_code == 403
+
+
+def test_invalidation_during_load_is_not_cached(db):
+    user = make_user(db, is_admin=True)
+    # Thế hệ được đọc trước khi tải; người dùng bị đổi quyền trước khi `put`
+    generation = principal_cache.generation()
+    principal_cache.invalidate_user(user.user_id)
+
+    assert principal_cache.put("race-token", user, generation).is_admin
+    assert principal_cache.get("race-token", user.user_id) is None
+
+
+def test_pruned_versions_never_revalidate_stale_principals(db):
+    cache = PrincipalCache(ttl_seconds=60, max_entries=2)
+    users = [make_user(db) for _ in range(3)]
+
+    generation = cache.generation()
+    for user in users:
+        cache.invalidate_user(user.user_id)
+    assert len(cache._versions) == 2
+
+    # Phiên bản của người dùng đầu tiên đã bị bỏ nhưng principal tải trước đó vẫn không được cache
+    cache.put("stale", users[0], generation)
+    assert cache.get("stale", users[0].user_id) is None
+
+    cache.put("fresh", users[0], cache.generation())
+    assert cache.get("fresh", users[0].user_id) is not None
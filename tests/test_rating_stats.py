@@ -0,0 +1,77 @@
+from conftest import make_products, make_user
+from app.db.base import SessionLocal
+from app.models.interaction import ProductRatingStats, Rating
+from app.repositories.interaction_repository import ProductRatingStatsRepository
+from app.services.catalog_snapshot import catalog_snapshot
+from app.services.product_service import ProductService
+
+COLUMNS = ("rating_sum", "rating_count", "count_1", "count_2", "count_3", "count_4", "count_5")
+
+
+def _stats(db, product_id: int):
+    db.expire_all()
+    row = db.get(ProductRatingStats, product_id)
+    return tuple(getattr(row, name) for name in COLUMNS)
+
+
+def _assert_matches_rebuild(db, product_id: int):
+    incremental = _stats(db, product_id)
+    ProductRatingStatsRepository(db).rebuild_all()
+    assert _stats(db, product_id) == incremental
+
+
+def test_new_edited_and_same_score_ratings_match_rebuild(db):
+    product_id = make_products(db, 1)[0].product_id
+    first, second = make_user(db), make_user(db)
+    service = ProductService(db)
+
+    service.rate_product(first.user_id, product_id, 5)
+    service.rate_product(second.user_id, product_id, 2)
+    assert _stats(db, product_id) == (7, 2, 0, 1, 0, 0, 1)
+    _assert_matches_rebuild(db, product_id)
+
+    # Sửa điểm: chuyển giữa các cột histogram, số lượt không đổi
+    service.rate_product(first.user_id, product_id, 3)
+    assert _stats(db, product_id) == (5, 2, 0, 1, 1, 0, 0)
+    _assert_matches_rebuild(db, product_id)
+
+    # Cùng điểm (chỉ đổi bình luận): tổng hợp không đổi
+    service.rate_product(first.user_id, product_id, 3, comment="Tạm được")
+    assert _stats(db, product_id) == (5, 2, 0, 1, 1, 0, 0)
+    _assert_matches_rebuild(db, product_id)
+
+
+def test_rating_updates_the_catalog_snapshot(db):
+    product_id = make_products(db, 1)[0].product_id
+    assert catalog_snapshot.get(db).ratings(product_id) == {"average_rating": 0.0, "rating_count": 0}
+
+    service = ProductService(db)
+    service.rate_product(make_user(db).user_id, product_id, 4)
+    service.rate_product(make_user(db).user_id, product_id, 5)
+    assert catalog_snapshot.get(db).ratings(product_id) == {"average_rating": 4.5, "rating_count": 2}
+
+
+def test_edit_after_stale_read_uses_the_latest_score(db):
+    product_id = make_products(db, 1)[0].product_id
+    user = make_user(db)
+    ProductService(db).rate_product(user.user_id, product_id, 5)
+
+    # Session thứ hai đã đọc đánh giá (điểm 5) trước khi lần sửa khác được commit
+    stale = SessionLocal()
+    try:
+        # Giữ tham chiếu để identity map (weak) không bỏ đối tượng đã đọc
+        stale_rating = stale.query(Rating).filter(Rating.user_id == user.user_id, Rating.product_id == product_id).one()
+        assert stale_rating.score == 5
+
+        other = SessionLocal()
+        try:
+            ProductService(other).rate_product(user.user_id, product_id, 3)
+        finally:
+            other.close()
+
+        ProductService(stale).rate_product(user.user_id, product_id, 4)
+    finally:
+        stale.close()
+
+    assert _stats(db, product_id) == (4, 1, 0, 0, 0, 1, 0)
+    _assert_matches_rebuild(db, product_id)
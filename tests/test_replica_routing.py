@@ -0,0 +1,113 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.db.base import Base
+from app.db.routing import ReplicaRouter, RoutingSession, read_only, use_replica
+from app.models.user import User
+
+
+class _UserReader:
+    def __init__(self, db):
+        self.db = db
+
+    @read_only(user_arg="user_id")
+    def name(self, target_id: int, user_id=None, for_update: bool = False) -> str:
+        query = self.db.query(User).filter(User.user_id == target_id)
+        if for_update:
+            query = query.with_for_update()
+        return query.one().name
+
+
+@pytest.fixture
+def make_session(tmp_path, monkeypatch):
+    # Hai file SQLite: cùng dữ liệu nhưng khác tên, để biết truy vấn đã đọc từ đâu
+    engines = {}
+    for name in ("primary", "replica"):
+        engines[name] = create_engine(f"sqlite:///{tmp_path / name}.db")
+        Base.metadata.create_all(bind=engines[name])
+        with engines[name].begin() as conn:
+            conn.execute(User.__table__.insert(), [
+                {"user_id": user_id, "name": name, "email": f"{user_id}@example.com", "password_hash": "x"}
+                for user_id in (1, 2)
+            ])
+
+    monkeypatch.setattr(RoutingSession, "router", ReplicaRouter(60))
+    factory = sessionmaker(bind=engines["primary"], class_=RoutingSession, info={"replica_bind": engines["replica"]})
+    sessions = []
+
+    def make():
+        sessions.append(factory())
+        return sessions[-1]
+
+    yield make
+    for session in sessions:
+        session.close()
+    for engine in engines.values():
+        engine.dispose()
+
+
+def test_read_only_reads_hit_the_replica(make_session):
+    db = make_session()
+    assert _UserReader(db).name(1, user_id=1) == "replica"
+    # Ngoài @read_only mọi truy vấn đi vào primary
+    db.expunge_all()
+    assert db.get(User, 1).name == "primary"
+
+
+def test_read_after_write_by_same_user_goes_to_primary(make_session):
+    writer = make_session()
+    writer.info["user_id"] = 1
+    writer.get(User, 1).name = "primary-updated"
+    writer.commit()
+
+    assert _UserReader(make_session()).name(1, user_id=1) == "primary-updated"
+    # Người dùng khác vẫn đọc từ replica
+    assert _UserReader(make_session()).name(1, user_id=2) == "replica"
+
+
+def test_for_update_always_goes_to_primary(make_session):
+    assert _UserReader(make_session()).name(2, user_id=2, for_update=True) == "primary"
+
+
+def test_use_replica_does_not_leak_user_id(make_session):
+    db = make_session()
+    _UserReader(db).name(1, user_id=1)
+    assert "user_id" not in db.info
+
+    db.info["user_id"] = 2
+    with use_replica(db, 1):
+        assert db.info["user_id"] == 1
+    assert db.info["user_id"] == 2
+
+
+class _SharedStore:
+    """Thay cho Redis trong test: một kho khóa dùng chung giữa các router"""
+
+    def __init__(self):
+        self.keys = {}
+
+    def set(self, key, value, ex=None):
+        self.keys[key] = value
+
+    def exists(self, key):
+        return int(key in self.keys)
+
+
+def test_write_on_one_worker_is_sticky_on_another(make_session, monkeypatch):
+    store = _SharedStore()
+    workers = [ReplicaRouter(60), ReplicaRouter(60)]
+    for router in workers:
+        router._redis = store
+
+    # Worker A nhận request ghi của người dùng 1
+    monkeypatch.setattr(RoutingSession, "router", workers[0])
+    writer = make_session()
+    writer.info["user_id"] = 1
+    writer.get(User, 1).name = "primary-updated"
+    writer.commit()
+
+    # Worker B đọc cho người dùng 1 từ primary, người dùng khác vẫn từ replica
+    monkeypatch.setattr(RoutingSession, "router", workers[1])
+    assert _UserReader(make_session()).name(1, user_id=1) == "primary-updated"
+    assert _UserReader(make_session()).name(1, user_id=2) == "replica"
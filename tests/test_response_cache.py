@@ -0,0 +1,56 @@
+from conftest import auth_headers, make_products, make_user, publish_two_clusters
+from app.api.schemas.product import ProductUpdate
+from app.services.product_service import ProductService
+
+
+def test_miss_then_hit_and_not_modified_on_matching_etag(client, db):
+    path = f"/api/products/{make_products(db, 1)[0].product_id}"
+
+    first = client.get(path)
+    assert first.headers["x-cache"] == "MISS"
+    second = client.get(path)
+    assert second.headers["x-cache"] == "HIT"
+    assert second.content == first.content
+    assert second.headers["etag"] == first.headers["etag"]
+
+    not_modified = client.get(path, headers={"If-None-Match": first.headers["etag"]})
+    assert not_modified.status_code == 304
+    assert not_modified.content == b""
+    assert client.get(path, headers={"If-None-Match": '"other"'}).status_code == 200
+
+
+def test_product_update_bumps_product_and_search_namespaces(client, db):
+    product = make_products(db, 1)[0]
+    detail = f"/api/products/{product.product_id}"
+    search = f"/api/products?category_id={product.category_id}"
+    for path in (detail, search):
+        client.get(path)
+        assert client.get(path).headers["x-cache"] == "HIT"
+
+    ProductService(db).update_product(product.product_id, ProductUpdate(price=1.0))
+
+    for path in (detail, search):
+        response = client.get(path)
+        assert response.headers["x-cache"] == "MISS"
+    assert client.get(detail).json()["price"] == 1.0
+
+
+def test_model_publish_bumps_recommendation_namespace(client, db):
+    first, second = make_products(db, 3), make_products(db, 3)
+    publish_two_clusters(first, second)
+    path = f"/api/recommendations/similar/{first[0].product_id}"
+    client.get(path)
+    assert client.get(path).headers["x-cache"] == "HIT"
+
+    publish_two_clusters(first, second)
+    assert client.get(path).headers["x-cache"] == "MISS"
+
+
+def test_authenticated_product_detail_bypasses_the_cache(client, db):
+    path = f"/api/products/{make_products(db, 1)[0].product_id}"
+    client.get(path)
+    assert client.get(path).headers["x-cache"] == "HIT"
+
+    response = client.get(path, headers=auth_headers(make_user(db).user_id))
+    assert response.status_code == 200
+    assert "x-cache" not in response.headers
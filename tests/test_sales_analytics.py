@@ -0,0 +1,23 @@
+from conftest import auth_headers, make_user
+
+
+def test_sales_analytics_require_admin(client, db):
+    for path in ("/api/analytics/best-sellers", "/api/analytics/sales-trend"):
+        assert client.get(path).status_code == 401
+        assert client.get(path, headers=auth_headers(make_user(db).user_id)).status_code == 403
+        assert client.get(path, headers=auth_headers(make_user(db, is_admin=True).user_id)).status_code == 200
+        # Khách vẫn bị chặn sau khi admin đã xem báo cáo
+        assert client.get(path).status_code == 401
+
+
+def test_demoted_admin_loses_access_to_sales_analytics(client, db):
+    admin = make_user(db, is_admin=True)
+    headers = auth_headers(admin.user_id)
+    for path in ("/api/analytics/best-sellers", "/api/analytics/sales-trend"):
+        assert client.get(path, headers=headers).status_code == 200
+
+    admin.is_admin = False
+    db.commit()
+
+    for path in ("/api/analytics/best-sellers", "/api/analytics/sales-trend"):
+        assert client.get(path, headers=headers).status_code == 403
@@ -0,0 +1,104 @@
+import json
+from decimal import Decimal
+from typing import List, Optional
+
+import pytest
+from fastapi.exceptions import ResponseValidationError
+from pydantic import BaseModel, ConfigDict, Field
+
+import conftest  # noqa: F401  (đặt biến môi trường trước khi import app)
+from app.api.schemas.cart import CartResponse
+from app.api.schemas.product import ProductSearchResult
+from app.api.schemas.recommendation import PersonalizedRecommendationsResult
+from app.core.serialization import lean_response, shape_for
+
+
+def search_payload():
+    return {
+        "items": [
+            {"product_id": i, "name": f"Sản phẩm {i}", "price": Decimal("199000.00") + i, "category_id": 1,
+             "category_name": "Danh mục 1", "image_url": None, "average_rating": 4, "rating_count": i}
+            for i in range(1, 4)
+        ],
+        "pagination": {"page": 1, "page_size": 3, "total_count": 3, "total_pages": 1},
+        "filters": {"search_query": "áo", "category_id": None, "min_price": 0.0, "max_price": None,
+                    "order_by": "created_at", "descending": True},
+        "facets": {
+            "categories": [{"category_id": 1, "category_name": "Danh mục 1", "count": 3}],
+            "price_buckets": [{"min_price": Decimal(0), "max_price": None, "count": 3}],
+            "price_range": {"min": Decimal("199001.00"), "max": Decimal("199003.00")}
+        }
+    }
+
+
+def personalized_payload():
+    return {
+        "success": True,
+        "user_id": 42,
+        "recommendations": [
+            {"product_id": i, "name": f"Sản phẩm {i}", "price": Decimal("349000.00"),
+             "recommendation_score": 1.0 / i, "image_url": None}
+            for i in range(1, 4)
+        ],
+        "recommendation_type": "personalized"
+    }
+
+
+def cart_payload():
+    return {
+        "items": [
+            {"cart_item_id": 1, "product_id": 1, "name": "Sản phẩm 1", "price": Decimal("120000.00"), "quantity": 2,
+             "subtotal": Decimal("240000.00"), "image_url": None, "stock_quantity": 10, "is_in_stock": True}
+        ],
+        "total_amount": Decimal("240000.00"),
+        "item_count": 1
+    }
+
+
+@pytest.mark.parametrize("model, build", [
+    (ProductSearchResult, search_payload),
+    (CartResponse, cart_payload),
+    (PersonalizedRecommendationsResult, personalized_payload),
+])
+def test_lean_response_matches_response_model_validation(model, build):
+    content = build()
+
+    response = lean_response(model, content)
+
+    assert json.loads(response.body) == model.model_validate(content).model_dump(mode="json")
+
+
+class _Aliased(BaseModel):
+    model_config = ConfigDict(populate_by_name=True)
+
+    item_id: int = Field(alias="itemId")
+    label: Optional[str] = Field(default=None, alias="displayLabel")
+    price: float = Field(serialization_alias="unitPrice")
+
+
+class _AliasedList(BaseModel):
+    entries: List[_Aliased]
+
+
+@pytest.mark.parametrize("entry", [
+    {"itemId": 1, "displayLabel": "A", "price": Decimal("1.50")},
+    {"item_id": 1, "label": "A", "price": 1.5},
+    {"itemId": 1, "price": 2},
+])
+def test_field_aliases_are_read_and_written_like_response_model(entry):
+    content = {"entries": [entry]}
+
+    assert json.loads(lean_response(_AliasedList, content).body) == (
+        _AliasedList.model_validate(content).model_dump(mode="json", by_alias=True)
+    )
+
+
+def test_missing_required_field_raises_response_validation_error():
+    content = cart_payload()
+    del content["items"][0]["quantity"]
+
+    with pytest.raises(ResponseValidationError) as exc_info:
+        lean_response(CartResponse, content)
+
+    assert [error["loc"] for error in exc_info.value.errors()] == [("items", 0, "quantity")]
+    assert shape_for(CartResponse)(cart_payload())["item_count"] == 1
@@ -0,0 +1,42 @@
+from conftest import auth_headers, make_products, make_user, publish_two_clusters
+from app.recommendations.serving.session import session_recommender
+
+
+def test_product_views_change_personalized_recommendations_without_retrain(client, db):
+    first, second = make_products(db, 4), make_products(db, 4)
+    publish_two_clusters(first, second)
+    user = make_user(db)
+    headers = auth_headers(user.user_id)
+
+    before = client.get("/api/recommendations/personalized?limit=3", headers=headers)
+    assert before.status_code == 200
+    assert "session" not in before.json()["recommendation_type"]
+
+    # Xem một sản phẩm qua HTTP với token: lượt xem phải vào phiên của người dùng
+    assert client.get(f"/api/products/{first[0].product_id}", headers=headers).status_code == 200
+
+    after = client.get("/api/recommendations/personalized?limit=3", headers=headers).json()
+    assert after["recommendation_type"] in ("session", "personalized_session")
+    recommended = [item["product_id"] for item in after["recommendations"]]
+    assert recommended
+    assert set(recommended) <= {p.product_id for p in first[1:]}
+
+
+def test_invalid_token_on_product_detail_is_served_as_guest(client, db):
+    products = make_products(db, 1)
+    response = client.get(f"/api/products/{products[0].product_id}", headers={"Authorization": "Bearer invalid"})
+    # Token không hợp lệ trên endpoint công khai: vẫn trả về sản phẩm như với khách
+    assert response.status_code == 200
+
+
+def test_cached_product_detail_still_records_signed_in_views(client, db):
+    product_id = make_products(db, 1)[0].product_id
+    # Khách xem trước: response được cache
+    assert client.get(f"/api/products/{product_id}").headers["x-cache"] == "MISS"
+    assert client.get(f"/api/products/{product_id}").headers["x-cache"] == "HIT"
+
+    user = make_user(db)
+    response = client.get(f"/api/products/{product_id}", headers=auth_headers(user.user_id))
+    assert response.status_code == 200
+    assert "x-cache" not in response.headers
+    assert [pid for pid, _ in session_recommender.recent_views(user.user_id)] == [product_id]